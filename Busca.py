@@ -0,0 +1,46 @@
+import streamlit as st
+from controllers.auth import conectar
+from controllers import busca_fts # Busca textual (FTS5) de OS, clientes e chassis
+
+def app(): # <--- Todo o código da página deve estar aqui dentro
+    st.title("🔎 Buscar Ordens de Serviço")
+
+    termo = st.text_input("Número da OS, cliente, CPF, telefone, modelo ou chassi (pode ser só o início das palavras):",
+                          key="busca_termo")
+
+    if not busca_fts.montar_consulta_fts(termo):
+        st.info("Digite um termo para buscar. Ex.: 'joao silv', '2609' ou o final do chassi.")
+        return
+
+    # Consultor só encontra as próprias OS
+    consultor_id = st.session_state.usuario["id"] if st.session_state.usuario["permissao"] == "consultor" else None
+
+    # Volta para a primeira página quando o termo muda
+    if st.session_state.get("busca_termo_anterior") != termo:
+        st.session_state.busca_termo_anterior = termo
+        st.session_state.busca_pagina = 1
+    pagina = st.session_state.busca_pagina
+
+    conn = conectar()
+    total = busca_fts.contar_resultados(conn, termo, consultor_id=consultor_id)
+    df_resultados = busca_fts.buscar_os(conn, termo, pagina=pagina, consultor_id=consultor_id)
+    conn.close()
+
+    if df_resultados.empty:
+        st.info("Nenhuma Ordem de Serviço encontrada para este termo.")
+        return
+
+    total_paginas = (total + busca_fts.RESULTADOS_POR_PAGINA - 1) // busca_fts.RESULTADOS_POR_PAGINA
+    st.caption(f"{total} resultado(s) — página {pagina} de {total_paginas}, do mais relevante para o menos relevante. "
+               "Inclui as OS faturadas já arquivadas (situação 'Arquivada').")
+    st.dataframe(df_resultados, use_container_width=True, hide_index=True)
+
+    col_nav1, _, col_nav2 = st.columns([1, 3, 1])
+    with col_nav1:
+        if st.button("⬅️ Anterior", disabled=pagina <= 1, key="busca_pagina_anterior"):
+            st.session_state.busca_pagina -= 1
+            st.rerun()
+    with col_nav2:
+        if st.button("Próxima ➡️", disabled=pagina >= total_paginas, key="busca_pagina_proxima"):
+            st.session_state.busca_pagina += 1
+            st.rerun()
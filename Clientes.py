@@ -1,8 +1,13 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
-from controllers.auth import conectar
-from controllers import db_utils # Para get_or_create_cliente, delete_record
+from sqlalchemy import select, update, or_
+from controllers import banco # Consultas em SQLAlchemy Core (SQLite ou servidor)
+from controllers import tabelas
+from controllers import db_utils # Para get_or_create_cliente, excluir_registros
+from controllers import db_pool # Gravações pela fila de escrita
+from controllers import busca_clientes # Busca e listagem paginada (a tabela pode ter dezenas de milhares de clientes)
+from controllers import duplicados_clientes # Detecção de clientes duplicados por blocos e mesclagem
 from datetime import datetime # Para o TEMP_CPF
 
 def app(): # <--- Todo o código da página deve estar aqui dentro
@@ -13,9 +18,7 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
     _PERMITIR_EXCLUSAO_CLIENTES = False # <--- Mude para True para ativar o botão de excluir Clientes
     # --- FIM CONTROLE ---
 
-
-    conn = conectar()
-    cursor = conn.cursor()
+    cliente = tabelas.cliente
 
     # Formulário de cadastro de cliente
     st.subheader("➕ Cadastrar Novo Cliente")
@@ -33,11 +36,10 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
                 # Controle de Duplicidade por Nome (se CPF não fornecido)
                 cpf_to_insert_check = cpf.strip() if cpf else None
                 if not cpf_to_insert_check:
-                    cursor.execute("""
-                        SELECT id, nome, cpf FROM Cliente 
-                        WHERE nome = ? AND (cpf IS NULL OR cpf LIKE 'TEMP_CPF_%')
-                    """, (nome.strip(),))
-                    existing_clients_without_cpf = cursor.fetchall()
+                    existing_clients_without_cpf = banco.linhas(
+                        select(cliente.c.id, cliente.c.nome, cliente.c.cpf)
+                        .where(cliente.c.nome == nome.strip(), or_(cliente.c.cpf.is_(None), cliente.c.cpf.like('TEMP_CPF_%')))
+                    )
 
                     if existing_clients_without_cpf:
                         st.warning(f"Já existe(m) cliente(s) com o nome '{nome.strip()}' sem CPF definido. "
@@ -47,8 +49,7 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
                         st.stop()
 
                 try:
-                    db_utils.get_or_create_cliente(cursor, nome, cpf, telefone)
-                    conn.commit()
+                    db_pool.escrever(lambda conn_escrita: db_utils.get_or_create_cliente(conn_escrita.cursor(), nome, cpf, telefone))
                     st.success(f"Cliente '{nome}' cadastrado com sucesso!")
                     st.rerun()
                 except sqlite3.IntegrityError as e:
@@ -56,21 +57,44 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
                         st.error(f"Erro: Já existe um cliente com este CPF/Nome temporário. Detalhes: {e}")
                     else:
                         st.error(f"Erro de integridade ao cadastrar cliente: {e}")
-                    conn.rollback()
                 except Exception as e:
                     st.error(f"Ocorreu um erro inesperado ao cadastrar cliente: {e}")
-                    conn.rollback()
-                finally:
-                    conn.close()
 
 
     # Visualizar e Editar Clientes
     st.subheader("📋 Clientes Cadastrados")
 
-    conn = conectar()
-    query_clientes = "SELECT id, nome, cpf, telefone FROM Cliente ORDER BY nome"
-    df_clientes = pd.read_sql_query(query_clientes, conn)
-    conn.close()
+    # Só a página atual é carregada e editada (paginação por keyset em (nome, id), como nas OS em aberto)
+    col_filtro1, col_filtro2 = st.columns([3, 1])
+    with col_filtro1:
+        termo_busca = st.text_input("Buscar (nome, CPF ou telefone):", key="clientes_busca").strip()
+    with col_filtro2:
+        tamanho_pagina = st.selectbox("Por página:", busca_clientes.TAMANHOS_PAGINA, index=1, key="clientes_tamanho_pagina")
+
+    # Busca ou tamanho de página mudou: volta para a primeira página
+    assinatura_filtros = (termo_busca, tamanho_pagina)
+    if st.session_state.get("clientes_assinatura_filtros") != assinatura_filtros:
+        st.session_state.clientes_assinatura_filtros = assinatura_filtros
+        st.session_state.clientes_cursores = [None]
+    cursores_pagina = st.session_state.clientes_cursores
+
+    with banco.conectar() as conexao:
+        df_clientes, tem_proxima_pagina = busca_clientes.query_clientes_pagina(
+            conexao, tamanho_pagina, apos=cursores_pagina[-1], termo=termo_busca)
+        total_clientes = busca_clientes.contar_clientes(conexao, termo=termo_busca)
+
+    numero_pagina = len(cursores_pagina)
+    col_nav1, col_nav2, col_nav3 = st.columns([1, 3, 1])
+    with col_nav1:
+        if st.button("⬅️ Anterior", disabled=numero_pagina == 1, key="clientes_pagina_anterior"):
+            cursores_pagina.pop()
+            st.rerun()
+    with col_nav2:
+        st.caption(f"Página {numero_pagina} — {total_clientes} cliente(s)" + (" encontrados." if termo_busca else " cadastrados."))
+    with col_nav3:
+        if st.button("Próxima ➡️", disabled=not tem_proxima_pagina, key="clientes_pagina_proxima"):
+            cursores_pagina.append(busca_clientes.chave_keyset(df_clientes))
+            st.rerun()
 
     if not df_clientes.empty:
         st.write("Edite as informações diretamente na tabela. Pressione Enter ou clique fora para aplicar as alterações.")
@@ -88,14 +112,13 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
             column_config=column_config_dict,
             num_rows="fixed", # Cadastro via formulário
             hide_index=True,
-            key="clientes_data_editor"
+            key=f"clientes_data_editor_{numero_pagina}"
         )
 
         # Lógica para salvar alterações
         if st.button("Salvar Alterações dos Clientes"):
             changes_made = False
-            conn = conectar()
-            cursor = conn.cursor()
+            atualizacoes = [] # (id, nome, cpf, telefone) dos clientes alterados
 
             for idx, edited_row in edited_df.iterrows():
                 original_row = df_clientes[df_clientes['id'] == edited_row['id']].iloc[0]
@@ -112,7 +135,6 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
 
                     if not new_nome:
                         st.error(f"Erro: Nome do cliente (ID: {cliente_id}) não pode ser vazio.")
-                        conn.rollback()
                         continue
 
                     # Lógica para CPF opcional/único (na edição)
@@ -124,35 +146,111 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
                             cpf_to_update = f"TEMP_CPF_{new_nome.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
                             st.warning(f"CPF do cliente '{new_nome}' (ID: {cliente_id}) está vazio ou temporário. Usando novo CPF temporário: {cpf_to_update}")
                     
+                    atualizacoes.append((int(cliente_id), new_nome, cpf_to_update, new_telefone))
+
+            # Um job só na fila de escrita; cada cliente no seu SAVEPOINT, então um CPF repetido
+            # não desfaz as outras alterações
+            def atualizar_clientes(conn_escrita):
+                resultados = [] # (id, nome, cpf, linhas alteradas, erro)
+                for cliente_id, new_nome, cpf_to_update, new_telefone in atualizacoes:
+                    conn_escrita.execute("SAVEPOINT cliente")
                     try:
-                        cursor.execute("UPDATE Cliente SET nome = ?, cpf = ?, telefone = ? WHERE id = ?",
-                                       (new_nome, cpf_to_update, new_telefone, cliente_id))
-                        if cursor.rowcount > 0:
-                            changes_made = True
-                        else:
-                            st.warning(f"Nenhuma alteração aplicada para cliente ID: {cliente_id}.")
-                    except sqlite3.IntegrityError:
-                        st.error(f"Erro: CPF '{cpf_to_update}' já existe para outro cliente. Não foi possível atualizar o cliente '{new_nome}'.")
-                        conn.rollback()
-                        continue
-                    except Exception as e:
-                        st.error(f"Ocorreu um erro inesperado ao atualizar cliente: {e}")
-                        conn.rollback()
-                        continue
+                        alteradas = conn_escrita.execute(*banco.compilar(
+                            update(cliente).where(cliente.c.id == cliente_id)
+                            .values(nome=new_nome, cpf=cpf_to_update, telefone=new_telefone)
+                        )).rowcount
+                        resultados.append((cliente_id, new_nome, cpf_to_update, alteradas, None))
+                    except sqlite3.Error as e:
+                        conn_escrita.execute("ROLLBACK TO cliente")
+                        resultados.append((cliente_id, new_nome, cpf_to_update, 0, e))
+                    conn_escrita.execute("RELEASE cliente")
+                return resultados
+
+            try:
+                resultados = db_pool.escrever(atualizar_clientes) if atualizacoes else []
+            except Exception as e:
+                st.error(f"Ocorreu um erro inesperado ao atualizar clientes: {e}")
+                resultados = []
 
-            conn.commit()
+            for cliente_id, new_nome, cpf_to_update, alteradas, erro in resultados:
+                if isinstance(erro, sqlite3.IntegrityError):
+                    st.error(f"Erro: CPF '{cpf_to_update}' já existe para outro cliente. Não foi possível atualizar o cliente '{new_nome}'.")
+                elif erro is not None:
+                    st.error(f"Ocorreu um erro inesperado ao atualizar cliente: {erro}")
+                elif alteradas > 0:
+                    changes_made = True
+                else:
+                    st.warning(f"Nenhuma alteração aplicada para cliente ID: {cliente_id}.")
 
             if changes_made:
                 st.success("Alterações nos clientes salvas com sucesso! Recarregando...")
-                conn.close()
                 st.rerun()
             else:
                 st.info("Nenhuma alteração a ser salva nos clientes.")
-                conn.close()
                 
+    elif termo_busca:
+        st.info("Nenhum cliente encontrado para a busca.")
     else:
         st.info("Nenhum cliente cadastrado ainda. Use o formulário acima para adicionar um.")
 
+    # --- Clientes duplicados (APENAS SUPERVISOR) ---
+    if st.session_state.usuario["permissao"] == "supervisor":
+        with st.expander("🔁 Possíveis clientes duplicados"):
+            st.caption("Compara só clientes com nomes de som parecido (ex.: 'JOAO SILVA' e 'João da Silva'). "
+                       "Ao mesclar, as OS passam para o cliente mantido (o com CPF real; depois o com mais OS) e os outros são excluídos.")
+            if st.button("Procurar duplicados", key="clientes_procurar_duplicados"):
+                with st.spinner("Procurando clientes duplicados..."):
+                    duplicados_clientes.atualizar_chaves()
+                    st.session_state.clientes_duplicados = duplicados_clientes.candidatos()
+
+            if "clientes_duplicados" in st.session_state:
+                df_duplicados, blocos_pulados = st.session_state.clientes_duplicados
+                if blocos_pulados:
+                    st.info(f"{blocos_pulados} grupo(s) de nomes muito comuns (mais de {duplicados_clientes.MAX_BLOCO} clientes) não foram comparados.")
+                if df_duplicados.empty:
+                    st.success("Nenhum cliente duplicado encontrado.")
+                else:
+                    df_duplicados_edicao = df_duplicados.copy()
+                    df_duplicados_edicao.insert(0, "mesclar", False)
+                    edited_duplicados = st.data_editor(
+                        df_duplicados_edicao,
+                        column_config={
+                            "mesclar": st.column_config.CheckboxColumn("Mesclar?"),
+                            "semelhanca": st.column_config.ProgressColumn("Semelhança", min_value=0, max_value=1, format="%.2f"),
+                            "id_a": "ID", "nome_a": "Cliente", "cpf_a": "CPF", "os_a": "OS",
+                            "id_b": "ID do parecido", "nome_b": "Parecido com", "cpf_b": "CPF do parecido", "os_b": "OS do parecido",
+                        },
+                        disabled=list(df_duplicados.columns),
+                        hide_index=True,
+                        key="clientes_duplicados_editor"
+                    )
+                    if st.button("Mesclar Selecionados", key="clientes_mesclar_duplicados"):
+                        grupos, pares_recusados = duplicados_clientes.agrupar(edited_duplicados[edited_duplicados["mesclar"]])
+                        for id_a, id_b in pares_recusados:
+                            st.warning(f"Os clientes ID {id_a} e ID {id_b} não foram mesclados: juntá-los uniria CPFs "
+                                       "diferentes no mesmo grupo (CPFs diferentes são pessoas diferentes).")
+                        if not grupos and not pares_recusados:
+                            st.warning("Marque pelo menos um par para mesclar.")
+                        elif grupos:
+                            try:
+                                resultados = duplicados_clientes.mesclar(grupos)
+                            except Exception as e:
+                                st.error(f"Ocorreu um erro inesperado ao mesclar clientes: {e}")
+                                resultados = []
+                            erros = [(manter_id, erro) for manter_id, _, _, erro in resultados if erro is not None]
+                            for manter_id, erro in erros:
+                                st.error(f"Não foi possível mesclar no cliente ID {manter_id}: {erro}")
+                            if resultados:
+                                del st.session_state.clientes_duplicados # A lista mudou; procure de novo
+                            if resultados and not erros:
+                                mesclados = sum(len(remover_ids) for _, remover_ids, _, _ in resultados)
+                                movidas = sum(movidas for _, _, movidas, _ in resultados)
+                                if pares_recusados: # Sem recarregar, para os avisos acima continuarem visíveis
+                                    st.success(f"{mesclados} cliente(s) mesclado(s), {movidas} OS transferida(s).")
+                                else:
+                                    st.success(f"{mesclados} cliente(s) mesclado(s), {movidas} OS transferida(s). Recarregando...")
+                                    st.rerun()
+
     # --- Lógica para Deletar Clientes ---
     st.markdown("---")
     st.subheader("🗑️ Excluir Clientes")
@@ -162,40 +260,29 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
         if _PERMITIR_EXCLUSAO_CLIENTES: # O botão só aparece se essa flag for True
             if not df_clientes.empty:
                 clientes_para_excluir_nomes = st.multiselect(
-                    "Selecione o(s) nome(s) do(s) cliente(s) para excluir:",
+                    "Selecione o(s) nome(s) do(s) cliente(s) para excluir (da página listada acima):",
                     df_clientes['nome'].tolist(),
                     key="multiselect_delete_cliente"
                 )
 
                 if st.button("Excluir Cliente(s) Selecionado(s)", key="delete_cliente_button"):
                     if clientes_para_excluir_nomes:
-                        conn = conectar()
-                        deleted_count = 0
-                        for cliente_name in clientes_para_excluir_nomes:
-                            cursor = conn.cursor()
-                            cursor.execute("SELECT id FROM Cliente WHERE nome = ?", (cliente_name,))
-                            cliente_id_to_delete = cursor.fetchone()
-                            
-                            if cliente_id_to_delete:
-                                # Verificar se o cliente tem OSs associadas (FOREIGN KEY constraint)
-                                cursor.execute("SELECT COUNT(*) FROM OrdemDeServico WHERE cliente_id = ?", (cliente_id_to_delete[0],))
-                                os_count = cursor.fetchone()[0]
-                                if os_count > 0:
-                                    st.error(f"Erro: Cliente '{cliente_name}' não pode ser excluído porque possui {os_count} Ordem(ns) de Serviço associada(s). Exclua as OSs primeiro.")
-                                    conn.rollback()
-                                    continue
-                                
-                                if db_utils.delete_record(conn, "Cliente", cliente_id_to_delete[0]):
-                                    deleted_count += 1
-                                else:
-                                    st.error(f"Falha ao excluir cliente '{cliente_name}'.")
-                            else:
-                                st.warning(f"Cliente '{cliente_name}' não encontrado no banco de dados para exclusão.")
+                        ids_por_nome = dict(zip(df_clientes['nome'], df_clientes['id']))
+                        nomes_por_id = {int(ids_por_nome[cliente_name]): cliente_name for cliente_name in clientes_para_excluir_nomes}
+                        # Todos os clientes selecionados num job só da fila de escrita (um commit). Cliente com
+                        # OS associada é recusado pela FOREIGN KEY e só ele fica.
+                        erros = db_utils.excluir_registros("Cliente", list(nomes_por_id))
+                        for cliente_id, erro in erros.items():
+                            if isinstance(erro, sqlite3.IntegrityError):
+                                st.error(f"Erro: Cliente '{nomes_por_id[cliente_id]}' não pode ser excluído porque possui Ordem(ns) de Serviço associada(s). Exclua as OSs primeiro.")
+                            elif erro is not None:
+                                st.error(f"Falha ao excluir cliente '{nomes_por_id[cliente_id]}': {erro}")
+                        deleted_count = sum(erro is None for erro in erros.values())
                         
-                        conn.close()
                         if deleted_count > 0:
                             st.success(f"{deleted_count} Cliente(s) excluído(s) com sucesso!")
-                            st.rerun()
+                            if deleted_count == len(erros): # Com falhas, não recarrega: as mensagens sumiriam
+                                st.rerun()
                         else:
                             st.info("Nenhuma cliente foi excluída.")
                     else:
@@ -1,6 +1,7 @@
 import streamlit as st
 import sqlite3
 from controllers.auth import conectar
+from controllers import db_pool # Gravações pela fila de escrita
 
 def app(): # <--- Todo o código da página deve estar aqui dentro
     st.title("⚙️ Configurações do Perfil")
@@ -76,8 +77,7 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
                 query_update = f"UPDATE Consultor SET {', '.join(set_clauses)} WHERE id = ?"
                 params_update = list(fields_to_update.values()) + [usuario_id_db]
                 
-                cursor.execute(query_update, params_update)
-                conn.commit()
+                db_pool.escrever(lambda conn_escrita: conn_escrita.execute(query_update, params_update))
                 st.success("Perfil atualizado com sucesso! Recarregando...")
 
                 # Atualizar st.session_state.usuario para refletir as mudanças
@@ -93,10 +93,8 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
                     st.error("Erro: Este e-mail já está em uso por outro consultor.")
                 else:
                     st.error(f"Erro de integridade ao atualizar perfil: {e}")
-                conn.rollback()
             except Exception as e:
                 st.error(f"Ocorreu um erro inesperado ao atualizar perfil: {e}")
-                conn.rollback()
             finally:
                 conn.close()
     
@@ -3,6 +3,7 @@ import sqlite3
 import pandas as pd
 from controllers.auth import conectar
 from controllers import db_utils # Para get_consultor_id_by_name, get_consultor_name_by_id, delete_record
+from controllers import db_pool # Gravações pela fila de escrita
 
 
 def app(): # <--- A função app não aceita mais 'mode'
@@ -25,17 +26,15 @@ def app(): # <--- A função app não aceita mais 'mode'
             if submitted:
                 if nome_novo and email_novo and senha_nova:
                     try:
-                        cursor.execute("INSERT INTO Consultor (nome, email, senha, permissao) VALUES (?, ?, ?, ?)",
-                                       (nome_novo, email_novo, senha_nova, permissao_nova))
-                        conn.commit()
+                        db_pool.escrever(lambda conn_escrita: conn_escrita.execute(
+                            "INSERT INTO Consultor (nome, email, senha, permissao) VALUES (?, ?, ?, ?)",
+                            (nome_novo, email_novo, senha_nova, permissao_nova)))
                         st.success(f"Consultor '{nome_novo}' cadastrado com sucesso!")
                         st.rerun() # Recarrega para atualizar a lista
                     except sqlite3.IntegrityError:
                         st.error("Erro: Já existe um consultor com este e-mail.")
-                        conn.rollback()
                     except Exception as e:
                         st.error(f"Ocorreu um erro inesperado ao cadastrar consultor: {e}")
-                        conn.rollback()
                 else:
                     st.warning("Preencha todos os campos obrigatórios para o consultor.")
     else:
@@ -81,7 +80,6 @@ def app(): # <--- A função app não aceita mais 'mode'
                         if c_id_to_delete:
                             if c_id_to_delete == st.session_state.usuario['id']:
                                 st.error(f"Erro: Você não pode excluir sua própria conta de usuário.")
-                                conn.rollback()
                                 continue
                             
                             # Verificar se o consultor tem OSs associadas (FOREIGN KEY constraint)
@@ -89,18 +87,17 @@ def app(): # <--- A função app não aceita mais 'mode'
                             os_count = cursor.fetchone()[0]
                             if os_count > 0:
                                 st.error(f"Erro: Consultor '{c_name}' não pode ser excluído porque possui {os_count} Ordem(ns) de Serviço associada(s).")
-                                conn.rollback()
                                 continue
 
-                            if db_utils.delete_record(conn, "Consultor", c_id_to_delete):
+                            erro = db_utils.delete_record("Consultor", c_id_to_delete)
+                            if erro is None:
                                 deleted_count += 1
                                 st.info(f"Consultor '{c_name}' excluído.")
                             else:
-                                st.error(f"Falha ao excluir consultor '{c_name}'.")
+                                st.error(f"Falha ao excluir consultor '{c_name}': {erro}")
                         else:
                             st.warning(f"Consultor '{c_name}' não encontrado no banco de dados para exclusão.")
                     
-                    conn.commit()
                     if deleted_count > 0:
                         st.success(f"{deleted_count} Consultor(es) excluído(s) com sucesso! Recarregando...")
                         st.rerun()
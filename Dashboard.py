@@ -1,28 +1,77 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from controllers.auth import conectar
-from controllers import db_utils # Para get_consultor_id_by_name e get_consultor_name_by_id
+from sqlalchemy import select, func
+from controllers import banco # Consultas em SQLAlchemy Core (SQLite ou servidor)
+from controllers import tabelas
+from controllers import dinheiro # Formatação de centavos em R$
+from controllers import cache_consultas # Cache versionado pelas revisões das tabelas
+from controllers import cache_dimensoes # Estatísticas do cache de dimensões
+from controllers import consultas_paralelas # Consultas independentes em paralelo
 import plotly.express as px # Necessário para os gráficos
 
+ordem, cliente, modelo, consultor, status = (tabelas.ordem_servico, tabelas.cliente, tabelas.modelo,
+                                             tabelas.consultor, tabelas.status)
+resumo = tabelas.resumo_os_aberto
+maquina = tabelas.maquina
+
+# --- Funções auxiliares para dados de Consultores (Cacheando para performance) ---
+@cache_consultas.versionado(["Consultor"], ttl_s=600)
+def get_consultores_data_for_dashboard():
+    consultores_db = banco.linhas(select(consultor.c.id, consultor.c.nome).order_by(consultor.c.nome))
+    consultores_map = {nome: id for id, nome in consultores_db}
+    consultores_nomes = [nome for id, nome in consultores_db]
+    return consultores_map, consultores_nomes
+
+
+# KPIs e pizza de status vêm de 'resumo_os_aberto' (mantida por triggers): O(#status), sem varrer as OS.
+# O envelhecimento (+30 dias) é uma faixa no índice parcial de data_abertura das OS em aberto.
+CONDICAO_MAIS_30_DIAS = ordem.c.data_abertura < banco.agora_mais("-30 days")
+
+
+# Compartilhado entre sessões até alguma OS mudar; o TTL curto cobre a virada do "+30 dias"
+@cache_consultas.versionado(["OrdemDeServico", "Status"], ttl_s=60)
+def carregar_resumo_os_aberto(consultor_id, apenas_mais_30_dias):
+    filtros_os = [ordem.c.data_faturamento.is_(None)]
+    if consultor_id:
+        filtros_os.append(ordem.c.consultor_id == consultor_id)
+
+    if apenas_mais_30_dias or not banco.SQLITE:
+        # Só as OS antigas: faixa no índice, agrupada por status. Num servidor não há os triggers
+        # que mantêm 'resumo_os_aberto', então o resumo completo também agrega direto das OS.
+        total_ordens = func.count(ordem.c.id).label("total_ordens")
+        query_status_count = (
+            select(status.c.descricao.label("status"), total_ordens,
+                   func.coalesce(func.sum(ordem.c.valor_liquido_centavos), 0).label("valor_total_centavos"))
+            .select_from(ordem.join(status, ordem.c.status_id == status.c.id))
+            .where(*filtros_os, *([CONDICAO_MAIS_30_DIAS] if apenas_mais_30_dias else []))
+            .group_by(status.c.descricao)
+            .order_by(total_ordens.desc())
+        )
+    else:
+        total_ordens = func.sum(resumo.c.total_ordens).label("total_ordens")
+        query_status_count = (
+            select(status.c.descricao.label("status"), total_ordens,
+                   func.sum(resumo.c.valor_total_centavos).label("valor_total_centavos"))
+            .select_from(resumo.join(status, resumo.c.status_id == status.c.id))
+            .group_by(status.c.descricao)
+            .order_by(total_ordens.desc())
+        )
+        if consultor_id:
+            query_status_count = query_status_count.where(resumo.c.consultor_id == consultor_id)
+
+    query_os_mais_30_dias = select(func.count()).select_from(ordem).where(*filtros_os, CONDICAO_MAIS_30_DIAS)
+
+    # As duas consultas são independentes: rodam ao mesmo tempo, cada uma na sua conexão
+    resultados = consultas_paralelas.executar({
+        "status_count": query_status_count,
+        "mais_30_dias": lambda conexao: banco.escalar(query_os_mais_30_dias, conexao),
+    })
+    return resultados["status_count"], resultados["mais_30_dias"]
+
+
 def app(): # <--- Todo o código da página deve estar aqui dentro
     st.title("📊 Dashboard Geral")
 
-    conn = conectar()
-    cursor = conn.cursor() # Abrir cursor para queries auxiliares
-
-    # --- Funções auxiliares para dados de Consultores (Cacheando para performance) ---
-    @st.cache_data
-    def get_consultores_data_for_dashboard():
-        conn_inner = conectar()
-        cursor_inner = conn_inner.cursor()
-        cursor_inner.execute("SELECT id, nome FROM Consultor ORDER BY nome")
-        consultores_db = cursor_inner.fetchall()
-        conn_inner.close()
-        consultores_map = {nome: id for id, nome in consultores_db}
-        consultores_nomes = [nome for id, nome in consultores_db]
-        return consultores_map, consultores_nomes
-
     consultores_map, consultores_nomes = get_consultores_data_for_dashboard()
 
     # --- Filtro de Consultor para Supervisor ---
@@ -50,98 +99,58 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
         consultor_nome_para_exibicao = st.session_state.usuario["nome"]
         st.sidebar.info(f"Visualizando dados de: {consultor_nome_para_exibicao}")
 
+    # Só a barra lateral fica fora dos fragmentos (um fragmento não pode escrever nela)
+    painel_os_aberto(consultor_id_para_exibicao, consultor_nome_para_exibicao)
 
-    # --- CONSTRUÇÃO DAS QUERIES COM FILTROS ---
 
-    # Base da query com filtro de OS em aberto
-    base_query_aberto = """
-    FROM OrdemDeServico os
-    JOIN Cliente c ON os.cliente_id = c.id
-    JOIN Consultor cm ON os.consultor_id = cm.id
-    JOIN Status s ON os.status_id = s.id
-    JOIN Modelo m ON os.modelo_id = m.id
-    WHERE os.data_faturamento IS NULL -- Filtra apenas OS em aberto
-    """
-    base_params_aberto = []
+# --- Fragmentos: cada interação reroda só o próprio trecho, sem refazer a página inteira ---
+# O "+30 dias" reroda o painel (KPIs, tabela e gráficos); o filtro de status, só a tabela.
+@st.fragment
+def painel_os_aberto(consultor_id_para_exibicao, consultor_nome_para_exibicao):
+    # --- CONSTRUÇÃO DAS QUERIES COM FILTROS ---
+    filtros_aberto = [ordem.c.data_faturamento.is_(None)]
 
     # Aplicar o filtro de consultor (se houver) a todas as queries
     if consultor_id_para_exibicao:
-        base_query_aberto += f" AND os.consultor_id = ?"
-        base_params_aberto.append(consultor_id_para_exibicao)
+        filtros_aberto.append(ordem.c.consultor_id == consultor_id_para_exibicao)
 
     # NOVO: Checkbox para filtrar por OSs com mais de 30 dias
     st.markdown("---")
     show_over_30_days = st.checkbox("Mostrar apenas OSs com mais de 30 dias em aberto")
-    if show_over_30_days:
-        base_query_aberto += f" AND JULIANDAY('now') - JULIANDAY(os.data_abertura) > 30"
-
-
-    # Query para o DataFrame principal (tabela de detalhes de OS em aberto)
-    query_os_detalhes = f"""
-    SELECT os.id, os.numero_os, os.tipo_os,
-        c.nome AS cliente,
-        cm.nome AS consultor,
-        s.descricao AS status_descricao,
-        m.nome_modelo AS modelo_nome,
-        m.chassi AS modelo_chassi,
-        os.descricao_servico,
-        os.data_abertura,
-        os.valor_liquido
-    {base_query_aberto}
-    ORDER BY os.data_abertura DESC
-    """
-    df_os_detalhes = pd.read_sql_query(query_os_detalhes, conn, params=base_params_aberto)
-
-    # --- CORREÇÃO: Converter data_abertura para objeto datetime.date ---
-    df_os_detalhes['data_abertura'] = pd.to_datetime(df_os_detalhes['data_abertura'], errors='coerce').dt.date
-
-    # Query para contagem de ordens POR STATUS (APENAS EM ABERTO)
-    query_status_count = f"""
-    SELECT s.descricao AS status, COUNT(os.id) AS total_ordens
-    {base_query_aberto}
-    GROUP BY s.descricao ORDER BY total_ordens DESC
-    """
-    params_status_count = []
-    
-    # Query para OSs em Aberto vs. Mais de 30 Dias (APENAS EM ABERTO)
-    query_os_em_aberto_dias = f"""
-    SELECT
-        CASE
-            WHEN JULIANDAY('now') - JULIANDAY(os.data_abertura) > 30 THEN 'Ordens de serviço +30⚠️'
-            ELSE 'O.S. em Aberto (até 30 dias)'
-        END AS grupo_status_dias,
-        COUNT(os.id) AS total_ordens
-    {base_query_aberto}
-    GROUP BY grupo_status_dias ORDER BY grupo_status_dias DESC
-    """
-    params_os_em_aberto_dias = []
-    
-    df_status_count = pd.read_sql_query(query_status_count, conn, params=base_params_aberto)
-    df_os_em_aberto_dias = pd.read_sql_query(query_os_em_aberto_dias, conn, params=base_params_aberto)
 
-    conn.close()
+    df_status_count, os_mais_30_dias = carregar_resumo_os_aberto(consultor_id_para_exibicao or None, show_over_30_days)
+
+    total_geral_os_aberto = int(df_status_count['total_ordens'].sum()) if not df_status_count.empty else 0
+    valor_total_aberto_centavos = int(df_status_count['valor_total_centavos'].sum()) if not df_status_count.empty else 0
+
+    # Grupos do gráfico de tempo na garantia (só os grupos com OS, como o antigo GROUP BY)
+    grupos_dias = [('Ordens de serviço +30⚠️', os_mais_30_dias),
+                   ('O.S. em Aberto (até 30 dias)', total_geral_os_aberto - os_mais_30_dias)]
+    df_os_em_aberto_dias = pd.DataFrame(
+        [(grupo, total) for grupo, total in grupos_dias if total > 0],
+        columns=['grupo_status_dias', 'total_ordens']
+    )
 
 
     st.subheader(f"Visão Geral das Ordens de Serviço em Aberto ({consultor_nome_para_exibicao})")
 
 
-    # --- Botão para Limpar Cache (APENAS SUPERVISOR) ---
+    # --- Estatísticas dos caches (APENAS SUPERVISOR) ---
+    # Não há mais "Limpar Cache": os caches recarregam sozinhos quando as tabelas mudam
     if st.session_state.usuario["permissao"] == "supervisor":
-        if st.button("🔄 Limpar Cache de Dados do Dashboard"):
-            st.cache_data.clear()
-            st.success("Cache limpo! Recarregando dados...")
-            st.rerun()
+        with st.expander("📈 Estatísticas de Cache"):
+            st.dataframe(pd.DataFrame(cache_consultas.estatisticas()), use_container_width=True)
+            st.dataframe(pd.DataFrame(cache_dimensoes.estatisticas()), use_container_width=True)
     st.markdown("---")
 
 
     # --- DESTAQUE PRINCIPAL: KPIs de Total e Alerta (LADO A LADO) ---
     col_kpi_principal1, col_kpi_principal2 = st.columns(2)
     
-    total_geral_os_aberto = df_status_count['total_ordens'].sum() if not df_status_count.empty else 0
     with col_kpi_principal1:
         st.metric(label="Total Geral de Ordens em Aberto", value=int(total_geral_os_aberto))
+        st.metric(label="Valor Total em Aberto", value=dinheiro.formatar_brl_valor(valor_total_aberto_centavos))
     
-    os_mais_30_dias = df_os_em_aberto_dias[df_os_em_aberto_dias['grupo_status_dias'] == 'Ordens de serviço +30⚠️']['total_ordens'].sum() if 'Ordens de serviço +30⚠️' in df_os_em_aberto_dias['grupo_status_dias'].tolist() else 0
     with col_kpi_principal2:
         if os_mais_30_dias > 0:
             st.markdown(
@@ -156,30 +165,8 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
     
     st.markdown("---")
 
-
-    # --- Detalhes de Todas as Ordens de Serviço em Aberto (MOVIDO PARA CIMA) ---
-    
-    # Campo de seleção para filtrar a tabela por status
-    all_status_options = ["Todos os Status"] + df_status_count['status'].tolist()
-    selected_status_filter = st.selectbox("Filtrar tabela por Status:", options=all_status_options, key="dashboard_status_table_filter")
-
-    # Filtrar a tabela de detalhes baseada na seleção do status
-    df_os_detalhes_filtered_by_status = df_os_detalhes.copy()
-    if selected_status_filter != "Todos os Status":
-        df_os_detalhes_filtered_by_status = df_os_detalhes_filtered_by_status[
-            df_os_detalhes_filtered_by_status['status_descricao'] == selected_status_filter
-        ]
-
-    if not df_os_detalhes_filtered_by_status.empty:
-        df_os_detalhes_filtered_by_status['valor_liquido'] = df_os_detalhes_filtered_by_status['valor_liquido'].apply(
-            lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(x) else ""
-        )
-        df_os_detalhes_filtered_by_status['data_abertura'] = df_os_detalhes_filtered_by_status['data_abertura'].apply(
-            lambda x: x.strftime('%d/%m/%Y') if x is not None else ""
-        )
-        st.dataframe(df_os_detalhes_filtered_by_status, use_container_width=True)
-    else:
-        st.info("Nenhuma Ordem de Serviço em aberto encontrada para o seu perfil com os filtros aplicados.")
+    # Fragmento próprio: trocar o status da tabela não recalcula os KPIs nem os gráficos
+    tabela_os_aberto(filtros_aberto, show_over_30_days, df_status_count['status'].tolist())
 
     st.markdown("---")
 
@@ -214,4 +201,47 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
             fig_pie_status.update_traces(textposition='inside', textinfo='value+label')
             st.plotly_chart(fig_pie_status, use_container_width=True)
         else:
-            st.info("Nenhum dado de status de Ordem de Serviço em aberto para exibir no gráfico.")
\ No newline at end of file
+            st.info("Nenhum dado de status de Ordem de Serviço em aberto para exibir no gráfico.")
+
+
+@st.fragment
+def tabela_os_aberto(filtros_aberto, show_over_30_days, opcoes_status):
+    # --- Detalhes de Todas as Ordens de Serviço em Aberto (MOVIDO PARA CIMA) ---
+    
+    # Campo de seleção para filtrar a tabela por status
+    all_status_options = ["Todos os Status"] + opcoes_status
+    selected_status_filter = st.selectbox("Filtrar tabela por Status:", options=all_status_options, key="dashboard_status_table_filter")
+
+    # Tabela de detalhes: o filtro de status vai para o SQL (usa os índices das OS em aberto)
+    filtros_detalhes = list(filtros_aberto)
+    if show_over_30_days:
+        filtros_detalhes.append(CONDICAO_MAIS_30_DIAS)
+    if selected_status_filter != "Todos os Status":
+        filtros_detalhes.append(status.c.descricao == selected_status_filter)
+
+    query_os_detalhes = (
+        select(ordem.c.id, ordem.c.numero_os, ordem.c.tipo_os,
+               cliente.c.nome.label("cliente"),
+               consultor.c.nome.label("consultor"),
+               status.c.descricao.label("status_descricao"),
+               modelo.c.nome_modelo.label("modelo_nome"),
+               maquina.c.chassi.label("modelo_chassi"),
+               ordem.c.descricao_servico,
+               banco.data_br(ordem.c.data_abertura).label("data_abertura"),
+               ordem.c.valor_liquido_centavos.label("valor_liquido"))
+        .select_from(ordem
+                     .join(cliente, ordem.c.cliente_id == cliente.c.id)
+                     .join(consultor, ordem.c.consultor_id == consultor.c.id)
+                     .join(status, ordem.c.status_id == status.c.id)
+                     .join(modelo, ordem.c.modelo_id == modelo.c.id)
+                     .outerjoin(maquina, ordem.c.maquina_id == maquina.c.id))
+        .where(*filtros_detalhes)
+        .order_by(ordem.c.data_abertura.desc().nulls_last())
+    )
+    df_os_detalhes_filtered_by_status = banco.ler_df(query_os_detalhes)
+
+    if not df_os_detalhes_filtered_by_status.empty:
+        df_os_detalhes_filtered_by_status['valor_liquido'] = dinheiro.formatar_brl(df_os_detalhes_filtered_by_status['valor_liquido'])
+        st.dataframe(df_os_detalhes_filtered_by_status, use_container_width=True)
+    else:
+        st.info("Nenhuma Ordem de Serviço em aberto encontrada para o seu perfil com os filtros aplicados.")
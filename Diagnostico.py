@@ -0,0 +1,119 @@
+import streamlit as st
+import pandas as pd
+from controllers import db_pool, instrumentacao_sql, perfil_paginas, registro_paginas
+
+# --- Diagnóstico de desempenho (apenas supervisor) ---
+# Mostra o que a instrumentação do db_pool acumulou neste processo do servidor: os statements
+# que mais consomem tempo no total (onde aparecem full scans e padrões N+1: muitas execuções
+# com poucas linhas cada), o log de consultas lentas com o EXPLAIN QUERY PLAN de cada uma, a fila
+# de escrita (profundidade e espera) e, quando o perfil está ligado, o histórico de reruns
+# perfilados de cada página.
+
+LIMITE_TOP_CONSULTAS = 50
+
+
+def app():
+    st.title("🩺 Diagnóstico de Desempenho")
+
+    if st.session_state.usuario["permissao"] != "supervisor":
+        st.warning("Apenas supervisores podem acessar o diagnóstico.")
+        return
+
+    if not instrumentacao_sql.ATIVO:
+        st.info("A instrumentação de SQL está desligada (OS_SQL_INSTRUMENTACAO=0).")
+        return
+
+    st.caption(f"Números acumulados desde o início do servidor (ou do último 'Zerar'), somando todas as sessões. "
+               f"Consultas acima de {instrumentacao_sql.LIMIAR_LENTA_MS:.0f} ms vão para o log de lentas "
+               f"(ajuste com OS_SQL_LENTA_MS).")
+    if st.button("🧹 Zerar estatísticas"):
+        instrumentacao_sql.zerar()
+
+    # --- Top consultas por tempo total ---
+    st.subheader("⏱️ Consultas por tempo total")
+    df_top = pd.DataFrame(instrumentacao_sql.consultas_mais_lentas(LIMITE_TOP_CONSULTAS))
+    if df_top.empty:
+        st.info("Nenhuma consulta registrada ainda.")
+    else:
+        st.dataframe(
+            df_top,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "sql": st.column_config.TextColumn("SQL (normalizado)", width="large"),
+                "execucoes": st.column_config.NumberColumn("Execuções"),
+                "tempo_total_ms": st.column_config.NumberColumn("Total (ms)", format="%.1f"),
+                "tempo_medio_ms": st.column_config.NumberColumn("Média (ms)", format="%.2f"),
+                "tempo_max_ms": st.column_config.NumberColumn("Máx. (ms)", format="%.1f"),
+                "linhas": st.column_config.NumberColumn("Linhas"),
+                "linhas_por_execucao": st.column_config.NumberColumn("Linhas/execução", format="%.1f"),
+                "lentas": st.column_config.NumberColumn("Lentas"),
+                "parametros": st.column_config.TextColumn("Parâmetros"),
+            },
+        )
+
+    # --- Log de consultas lentas ---
+    st.subheader("🐢 Consultas lentas")
+    lentas = instrumentacao_sql.consultas_lentas()
+    if not lentas:
+        st.info("Nenhuma consulta passou do limite.")
+    for entrada in lentas:
+        alerta = " · ⚠️ full scan" if entrada["full_scan"] else ""
+        titulo = (f"{entrada['quando'].strftime('%d/%m/%Y %H:%M:%S')} · {entrada['tempo_ms']:.0f} ms · "
+                  f"{entrada['linhas']} linha(s){alerta}")
+        with st.expander(titulo):
+            st.code(entrada["sql"], language="sql")
+            st.caption(f"Parâmetros: {entrada['parametros']}")
+            st.code(entrada["plano"] or "(sem plano para este comando)", language="text")
+
+    # --- Fila de escrita (fila_escrita) ---
+    st.subheader("✍️ Fila de escrita")
+    fila = db_pool.get_pool().fila.estatisticas()
+    col_fila, col_espera, col_lote = st.columns(3)
+    col_fila.metric("Jobs na fila agora", fila["na_fila"])
+    col_espera.metric("Espera p95", f"{fila['espera_p95_ms']:.1f} ms")
+    col_lote.metric("Jobs por transação", f"{fila['jobs_por_transacao']:.2f}")
+    st.dataframe(pd.DataFrame([fila]), use_container_width=True, hide_index=True)
+
+    # --- Perfil dos reruns (perfil_paginas) ---
+    st.subheader("⏱️ Perfil das páginas")
+    st.caption("Só a thread do script é perfilada: as consultas rodadas em paralelo (threads de consultas_paralelas) "
+               "entram como espera, não como SQL. Reruns que começam enquanto outra sessão está sendo perfilada "
+               "rodam sem perfil no Python 3.12+ (coluna reruns_sem_perfil).")
+    resumo_perfis = perfil_paginas.resumo()
+    if not resumo_perfis:
+        st.info("Nenhum rerun perfilado. Ligue '⏱️ Perfilar páginas' na barra lateral e navegue pelas páginas.")
+    else:
+        st.dataframe(pd.DataFrame(resumo_perfis), use_container_width=True, hide_index=True,
+                     column_config={coluna: st.column_config.NumberColumn(format="%.1f")
+                                    for coluna in resumo_perfis[0] if coluna.endswith("_ms")})
+        titulo = st.selectbox("Página", [linha["pagina"] for linha in resumo_perfis], key="diag_perfil_pagina")
+        execucoes = perfil_paginas.historico(titulo)
+        indice = st.selectbox(
+            "Rerun", range(len(execucoes)), key="diag_perfil_rerun",
+            format_func=lambda i: (f"{execucoes[i]['quando'].strftime('%d/%m/%Y %H:%M:%S')} · "
+                                   f"{execucoes[i]['total_ms']:.0f} ms · {execucoes[i]['usuario'] or ''}"))
+        execucao = execucoes[min(indice or 0, len(execucoes) - 1)]
+        st.dataframe(pd.DataFrame([execucao["secoes_ms"]]), hide_index=True,
+                     column_config={secao: st.column_config.NumberColumn(f"{secao} (ms)", format="%.1f")
+                                    for secao in execucao["secoes_ms"]})
+
+        nome_arquivo = f"perfil_{registro_paginas.PAGINAS[titulo].split('.')[-1].lower()}_{execucao['quando'].strftime('%Y%m%d_%H%M%S')}"
+        col_pstats, col_speedscope, col_limpar = st.columns(3)
+        with col_pstats:
+            st.download_button("📥 Baixar .pstats", data=lambda: perfil_paginas.exportar_pstats(execucao),
+                               file_name=f"{nome_arquivo}.pstats", mime="application/octet-stream", on_click="ignore")
+        with col_speedscope:
+            st.download_button("📥 Baixar speedscope (JSON)", data=lambda: perfil_paginas.exportar_speedscope(execucao),
+                               file_name=f"{nome_arquivo}.speedscope.json", mime="application/json", on_click="ignore")
+        with col_limpar:
+            if st.button("🧹 Limpar perfis"):
+                perfil_paginas.limpar()
+        st.code(perfil_paginas.texto_top_funcoes(execucao), language="text")
+
+    # --- Importação das páginas (registro_paginas) ---
+    st.subheader("📦 Importação das páginas")
+    tempos = registro_paginas.tempos_importacao()
+    if tempos:
+        st.dataframe(pd.DataFrame([{"pagina": modulo, "importacao_ms": segundos * 1000} for modulo, segundos in tempos]),
+                     use_container_width=True, hide_index=True)
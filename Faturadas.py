@@ -1,148 +1,80 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from controllers.auth import conectar
+from controllers import banco # Consultas em SQLAlchemy Core (SQLite ou servidor)
+from controllers import consultas_faturadas # Filtros de período por faixa de data / colunas geradas
+from controllers import dinheiro # Formatação de centavos em R$
+from controllers import exportar # Exportação CSV/XLSX direto do cursor
+from controllers import consultas_paralelas # KPIs, gráficos e detalhes consultados ao mesmo tempo
 import plotly.express as px # Para gráficos (barras ou linhas)
 
+LIMITE_DETALHES = 1000 # A tabela mostra só as mais recentes; o período completo sai pela exportação
+
 def app(): # <--- Todo o código da página deve estar aqui dentro
     st.title("✅ Ordens de Serviço Faturadas")
 
-    conn = conectar()
-    cursor = conn.cursor()
-
     # --- Obter Anos e Meses Disponíveis para Filtro ---
-    query_anos = """
-    SELECT DISTINCT strftime('%Y', data_faturamento) AS ano
-    FROM OrdemDeServico
-    WHERE data_faturamento IS NOT NULL
-    ORDER BY ano DESC
-    """
-    df_anos = pd.read_sql_query(query_anos, conn)
-    anos_disponiveis = ["Todos"] + df_anos['ano'].tolist()
+    # Os anos já arquivados (ver arquivo_os) também aparecem
+    df_anos = banco.ler_df(consultas_faturadas.query_anos_faturados(consultas_faturadas.tabela_faturadas()))
+    anos_disponiveis = ["Todos"] + [str(ano) for ano in df_anos['ano'].tolist()]
 
     col_filter_ano, col_filter_mes = st.columns(2)
     with col_filter_ano:
         ano_selecionado = st.selectbox("Filtrar por Ano:", anos_disponiveis)
 
-    meses_disponiveis = ["Todos", "01-Janeiro", "02-Fevereiro", "03-Março", "04-Abril",
-                         "05-Maio", "06-Junho", "07-Julho", "08-Agosto",
-                         "09-Setembro", "10-Outubro", "11-Novembro", "12-Dezembro"]
+    meses_disponiveis = ["Todos"] + consultas_faturadas.MESES
     with col_filter_mes:
         mes_selecionado = st.selectbox("Filtrar por Mês:", meses_disponiveis)
 
-    # Converter mês selecionado para formato numérico para query
-    mes_num_selecionado = None
-    if mes_selecionado != "Todos":
-        mes_num_selecionado = meses_disponiveis.index(mes_selecionado)
-        if mes_num_selecionado < 10: # Adiciona zero à esquerda para meses < 10
-            mes_str = f"0{mes_num_selecionado}"
-        else:
-            mes_str = str(mes_num_selecionado)
-    else:
-        mes_str = None # Reset se 'Todos'
+    # Converter ano/mês selecionados para números
+    ano_num_selecionado = int(ano_selecionado) if ano_selecionado != "Todos" else None
+    mes_num_selecionado = meses_disponiveis.index(mes_selecionado) if mes_selecionado != "Todos" else None
 
-    # --- CONSTRUÇÃO DAS QUERIES COM FILTROS ---
+    # Consultor só vê as próprias OS
+    consultor_id_filtro = st.session_state.usuario['id'] if st.session_state.usuario["permissao"] == "consultor" else None
 
-    # Base da query com filtro de faturamento
-    base_query = """
-    FROM OrdemDeServico os
-    JOIN Cliente c ON os.cliente_id = c.id
-    JOIN Modelo m ON os.modelo_id = m.id
-    JOIN Consultor con ON os.consultor_id = con.id
-    JOIN Status s ON os.status_id = s.id
-    WHERE os.data_faturamento IS NOT NULL
-    """
-    base_params = []
-
-    # Adicionar filtro de consultor (se aplicável)
-    if st.session_state.usuario["permissao"] == "consultor":
-        base_query += f" AND os.consultor_id = {st.session_state.usuario['id']}"
-    
-    # Adicionar filtro de ano
-    if ano_selecionado != "Todos":
-        base_query += f" AND strftime('%Y', os.data_faturamento) = ?"
-        base_params.append(ano_selecionado)
-
-    # Adicionar filtro de mês
-    if mes_str: # mes_str já está no formato 'MM'
-        base_query += f" AND strftime('%m', os.data_faturamento) = ?"
-        base_params.append(mes_str)
-
-
-    # 1. Query para KPIs (Quantidade e Valor Total Faturado)
-    query_kpis = f"""
-    SELECT
-        COUNT(os.id) AS total_faturadas, -- CORRIGIDO: COUNT(os.id)
-        SUM(REPLACE(REPLACE(os.valor_liquido, 'R$', ''), ',', '.')) AS valor_total_faturado
-    {base_query}
-    """
-    df_kpis = pd.read_sql_query(query_kpis, conn, params=base_params)
-
-    # 2. Query para o Gráfico Mensal
-    query_faturadas_mensal = f"""
-    SELECT
-        strftime('%Y-%m', data_faturamento) AS mes_ano,
-        COUNT(os.id) AS total_faturadas -- CORRIGIDO: COUNT(os.id)
-    {base_query}
-    GROUP BY mes_ano ORDER BY mes_ano
-    """
-    df_faturadas_mensal = pd.read_sql_query(query_faturadas_mensal, conn, params=base_params)
-
-    # 3. Query para o Gráfico Anual (ignora filtro de mês)
-    # Cria uma cópia dos parâmetros base para a query anual, pois ela não terá filtro de mês
-    base_params_anual = list(base_params) 
-    base_query_anual = base_query
-    if mes_str: # Se o mês foi filtrado, remove o filtro de mês da query anual
-        base_query_anual = base_query_anual.replace(f" AND strftime('%m', os.data_faturamento) = ?", "")
-        # Remove o último parâmetro adicionado se for o do mês
-        if len(base_params_anual) > 0 and mes_str in base_params_anual[-1:]:
-            base_params_anual.pop()
-
-
-    query_faturadas_anual = f"""
-    SELECT
-        strftime('%Y', data_faturamento) AS ano,
-        COUNT(os.id) AS total_faturadas
-    {base_query_anual}
-    GROUP BY ano ORDER BY ano
-    """
-    df_faturadas_anual = pd.read_sql_query(query_faturadas_anual, conn, params=base_params_anual)
-
-    # 4. Query para os Detalhes da Tabela
-    query_os_faturadas_detalhes = f"""
-    SELECT
-        os.id, os.numero_os, os.tipo_os,
-        c.nome AS cliente_nome,
-        c.cpf AS cliente_cpf,
-        c.telefone AS cliente_telefone,
-        s.descricao AS status_descricao,
-        m.nome_modelo AS modelo_nome,
-        con.nome AS consultor_nome,
-        m.chassi AS modelo_chassi,
-        os.data_abertura,
-        os.valor_liquido,
-        os.data_faturamento,
-        os.data_pagamento_fabrica,
-        os.descricao_servico
-    {base_query}
-    ORDER BY os.data_faturamento DESC
-    """
-    df_os_faturadas_detalhes = pd.read_sql_query(query_os_faturadas_detalhes, conn, params=base_params)
-
-    conn.close()
+    # --- CONSTRUÇÃO DAS QUERIES COM FILTROS ---
+    # Só OrdemDeServico, ou a view com o banco de arquivo se o período chega aos anos arquivados
+    ordem = consultas_faturadas.tabela_faturadas(ano_num_selecionado)
+    # Filtros como faixas de data indexadas; o gráfico anual simplesmente não recebe o mês
+    filtros_periodo = consultas_faturadas.filtros_faturadas(
+        ano_num_selecionado, mes_num_selecionado, consultor_id_filtro, ordem
+    )
+    filtros_anual = consultas_faturadas.filtros_faturadas(
+        ano_num_selecionado, None, consultor_id_filtro, ordem
+    )
+
+    # 1. KPIs (Quantidade e Valor Total Faturado): query_faturadas_kpis
+    # 2. Gráfico Mensal (agrupa pelas colunas geradas ano/mês, via índice): query_faturadas_mensal
+    # 3. Gráfico Anual (ignora filtro de mês): query_faturadas_anual
+    # 4. Detalhes da Tabela (as mais recentes): query_faturadas_detalhes
+
+    # As quatro consultas são independentes: rodam ao mesmo tempo, cada uma na sua conexão
+    try:
+        resultados = consultas_paralelas.executar({
+            "kpis": consultas_faturadas.query_faturadas_kpis(filtros_periodo, ordem),
+            "mensal": consultas_faturadas.query_faturadas_mensal(filtros_periodo, ordem),
+            "anual": consultas_faturadas.query_faturadas_anual(filtros_anual, ordem),
+            "detalhes": consultas_faturadas.query_faturadas_detalhes(filtros_periodo, LIMITE_DETALHES, ordem),
+        })
+    except TimeoutError as e:
+        st.error(f"As consultas das OS faturadas demoraram demais. Tente um período menor. ({e})")
+        return
+    df_kpis = resultados["kpis"]
+    df_faturadas_mensal = resultados["mensal"]
+    df_faturadas_anual = resultados["anual"]
+    df_os_faturadas_detalhes = resultados["detalhes"]
 
     # --- Exibição dos KPIs ---
     st.subheader("Indicadores de Ordens Faturadas")
     
     total_faturadas_kpi = df_kpis['total_faturadas'].iloc[0] if not df_kpis.empty else 0
-    # Converte para float antes da formatação para garantir que é um número
-    valor_total_faturado_kpi = float(df_kpis['valor_total_faturado'].iloc[0]) if not df_kpis.empty and pd.notna(df_kpis['valor_total_faturado'].iloc[0]) else 0.0
+    valor_total_faturado_kpi = int(df_kpis['valor_total_faturado_centavos'].iloc[0]) if not df_kpis.empty and pd.notna(df_kpis['valor_total_faturado_centavos'].iloc[0]) else 0
 
     col_kpi1, col_kpi2 = st.columns(2)
     with col_kpi1:
         st.metric(label="Quantidade Total Faturada", value=int(total_faturadas_kpi))
     with col_kpi2:
-        st.metric(label="Valor Total Faturado", value=f"R$ {valor_total_faturado_kpi:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+        st.metric(label="Valor Total Faturado", value=dinheiro.formatar_brl_valor(valor_total_faturado_kpi))
     
     st.markdown("---")
 
@@ -170,10 +102,20 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
     # --- Detalhes das OS Faturadas ---
     st.subheader("Detalhes das Ordens de Serviço Faturadas")
     if not df_os_faturadas_detalhes.empty:
+        # Exportação do período filtrado inteiro, gerada só no clique (sem passar por DataFrame)
+        query_exportacao = consultas_faturadas.query_faturadas_exportacao(filtros_periodo, ordem)
+        col_exp1, col_exp2, _ = st.columns([1, 1, 4])
+        with col_exp1:
+            st.download_button("⬇️ Exportar CSV", data=lambda: exportar.arquivo_csv(query_exportacao),
+                               file_name="os_faturadas.csv", mime=exportar.MIME_CSV, on_click="ignore", key="faturadas_exportar_csv")
+        with col_exp2:
+            st.download_button("⬇️ Exportar Excel", data=lambda: exportar.arquivo_xlsx(query_exportacao, "Faturadas"),
+                               file_name="os_faturadas.xlsx", mime=exportar.MIME_XLSX, on_click="ignore", key="faturadas_exportar_xlsx")
+
+        if total_faturadas_kpi > LIMITE_DETALHES:
+            st.caption(f"Mostrando as {LIMITE_DETALHES} mais recentes de {int(total_faturadas_kpi)}. Use a exportação para o período completo.")
         # Converter valor_liquido para formato de moeda para exibição na tabela
-        df_os_faturadas_detalhes['valor_liquido'] = df_os_faturadas_detalhes['valor_liquido'].apply(
-            lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(x) else ""
-        )
+        df_os_faturadas_detalhes['valor_liquido'] = dinheiro.formatar_brl(df_os_faturadas_detalhes['valor_liquido'])
         st.dataframe(df_os_faturadas_detalhes, use_container_width=True, hide_index=True)
     else:
         st.info("Nenhuma Ordem de Serviço detalhada encontrada com os filtros aplicados.")
\ No newline at end of file
@@ -1,16 +1,39 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
-from controllers.auth import conectar
+from sqlalchemy import select
+from controllers import banco # Consultas em SQLAlchemy Core (SQLite ou servidor)
+from controllers import tabelas
+from controllers import consultas_maquinas # Máquina por chassi, inventário e histórico
+from controllers import cache_consultas
 # Removidos: from controllers import db_utils (já que os formulários foram removidos)
 import plotly.express as px # Para gráficos
 
+# --- Opções dos filtros e distribuição por tipo (Cacheando para performance) ---
+# Compartilhado entre sessões; recarrega sozinho quando alguma das tabelas muda (ver cache_consultas)
+@cache_consultas.versionado(["TipoMaquina"], ttl_s=600)
+def carregar_tipos_maquina():
+    tipo_maquina = tabelas.tipo_maquina
+    return [tuple(linha) for linha in banco.linhas(
+        select(tipo_maquina.c.id, tipo_maquina.c.descricao).order_by(tipo_maquina.c.descricao))]
+
+
+@cache_consultas.versionado(["Modelo"], ttl_s=600)
+def carregar_modelos(tipo_maquina_id=None):
+    # Só os modelos do tipo escolhido: o catálogo inteiro seria uma lista grande demais
+    modelo = tabelas.modelo
+    consulta = select(modelo.c.id, modelo.c.nome_modelo).order_by(modelo.c.nome_modelo)
+    if tipo_maquina_id is not None:
+        consulta = consulta.where(modelo.c.tipo_maquina_id == tipo_maquina_id)
+    return [tuple(linha) for linha in banco.linhas(consulta)]
+
+
+@cache_consultas.versionado(["Maquina", "Modelo", "TipoMaquina"], ttl_s=600)
+def carregar_maquinas_por_tipo():
+    return banco.ler_df(consultas_maquinas.query_maquinas_por_tipo())
+
+
 def app(): # <--- Todo o código da página deve estar aqui dentro
     st.title("🔧 Máquinas")
 
-    conn = conectar()
-    cursor = conn.cursor()
-
     # --- REMOVIDO: Formulário de Cadastro de Tipo de Máquina ---
     # st.subheader("➕ Cadastrar Novo Tipo de Máquina")
     # ... (código do formulário removido) ...
@@ -24,68 +47,78 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
     # --- Inventário de Máquinas e Filtros ---
     st.subheader("📋 Inventário de Máquinas")
 
-    # Carregar todos os modelos e tipos de máquina
-    query_inventario = """
-    SELECT m.nome_modelo, m.chassi, tm.descricao AS tipo_maquina_descricao, c.nome AS cliente_responsavel
-    FROM Modelo m
-    JOIN TipoMaquina tm ON m.tipo_maquina_id = tm.id
-    LEFT JOIN OrdemDeServico os ON m.id = os.modelo_id AND os.data_faturamento IS NULL
-    LEFT JOIN Cliente c ON os.cliente_id = c.id
-    ORDER BY tm.descricao, m.nome_modelo
-    """
-    df_inventario = pd.read_sql_query(query_inventario, conn)
-
-    # Obter lista de tipos de máquina e modelos para filtro
-    # As queries para popular os filtros permanecem, mesmo que os formulários de cadastro tenham saído
-    cursor.execute("SELECT id, descricao FROM TipoMaquina ORDER BY descricao")
-    tipos_maquina_db = cursor.fetchall()
-    tipos_maquina_nomes = [desc for id, desc in tipos_maquina_db]
-
-    cursor.execute("SELECT id, nome_modelo FROM Modelo ORDER BY nome_modelo")
-    modelos_db = cursor.fetchall()
-    modelos_nomes = [name for id, name in modelos_db]
-
-
-    tipos_para_filtro = ["Todos"] + tipos_maquina_nomes
-    modelos_para_filtro = ["Todos"] + modelos_nomes
-
-    col_filter1, col_filter2 = st.columns(2)
+    # Filtros por id (None = "Todos"); as opções vêm do cache, não de um SELECT a cada rerun
+    tipos_maquina_db = dict(carregar_tipos_maquina())
+    col_filter1, col_filter2, col_filter3 = st.columns([2, 2, 1])
     with col_filter1:
-        tipo_selecionado = st.selectbox("Filtrar por Tipo de Máquina:", tipos_para_filtro)
+        tipo_selecionado = st.selectbox("Filtrar por Tipo de Máquina:", [None] + list(tipos_maquina_db),
+                                        format_func=lambda id_: "Todos" if id_ is None else tipos_maquina_db[id_],
+                                        key="maquinas_filtro_tipo")
+    modelos_db = dict(carregar_modelos(tipo_selecionado))
     with col_filter2:
-        modelo_selecionado = st.selectbox("Filtrar por Modelo:", modelos_para_filtro)
-
-    df_filtrado = df_inventario.copy()
-    if tipo_selecionado != "Todos":
-        df_filtrado = df_filtrado[df_filtrado['tipo_maquina_descricao'] == tipo_selecionado]
-    if modelo_selecionado != "Todos":
-        df_filtrado = df_filtrado[df_filtrado['nome_modelo'] == modelo_selecionado]
-
-    if not df_filtrado.empty:
-        st.dataframe(df_filtrado, use_container_width=True, hide_index=True)
+        modelo_selecionado = st.selectbox("Filtrar por Modelo:", [None] + list(modelos_db),
+                                          format_func=lambda id_: "Todos" if id_ is None else modelos_db[id_],
+                                          key="maquinas_filtro_modelo")
+    with col_filter3:
+        tamanho_pagina = st.selectbox("Por página:", consultas_maquinas.TAMANHOS_PAGINA, index=1, key="maquinas_tamanho_pagina")
+
+    # Filtro ou tamanho de página mudou: volta para a primeira página
+    assinatura_filtros = (tipo_selecionado, modelo_selecionado, tamanho_pagina)
+    if st.session_state.get("maquinas_assinatura_filtros") != assinatura_filtros:
+        st.session_state.maquinas_assinatura_filtros = assinatura_filtros
+        st.session_state.maquinas_cursores = [None]
+    cursores_pagina = st.session_state.maquinas_cursores
+
+    # Uma linha por máquina (chassi); o cliente atual vem da OS mais recente dela.
+    # A conexão volta ao pool antes dos botões (st.rerun interrompe a execução).
+    with banco.conectar() as conexao:
+        df_inventario, tem_proxima_pagina = consultas_maquinas.query_inventario_pagina(
+            conexao, tamanho_pagina, apos=cursores_pagina[-1],
+            tipo_maquina_id=tipo_selecionado, modelo_id=modelo_selecionado)
+        total_maquinas = consultas_maquinas.contar_inventario(conexao, tipo_selecionado, modelo_selecionado)
+
+    numero_pagina = len(cursores_pagina)
+    col_nav1, col_nav2, col_nav3 = st.columns([1, 3, 1])
+    with col_nav1:
+        if st.button("⬅️ Anterior", disabled=numero_pagina == 1, key="maquinas_pagina_anterior"):
+            cursores_pagina.pop()
+            st.rerun()
+    with col_nav2:
+        st.caption(f"Página {numero_pagina} — {total_maquinas} máquina(s).")
+    with col_nav3:
+        if st.button("Próxima ➡️", disabled=not tem_proxima_pagina, key="maquinas_pagina_proxima"):
+            cursores_pagina.append(consultas_maquinas.chave_keyset(df_inventario))
+            st.rerun()
+
+    if not df_inventario.empty:
+        st.dataframe(df_inventario, use_container_width=True, hide_index=True)
     else:
         st.info("Nenhuma máquina encontrada com os filtros aplicados.")
 
     st.markdown("---")
 
+    # --- Histórico de uma máquina ---
+    st.subheader("🔍 Histórico por Chassi")
+    chassi_busca = st.text_input("Chassi da máquina:", key="maquinas_chassi_historico",
+                                 help="O chassi completo; maiúsculas e espaços nas pontas não importam.")
+    if chassi_busca.strip():
+        df_historico = banco.ler_df(consultas_maquinas.query_historico_chassi(chassi_busca))
+        if df_historico.empty:
+            st.info("Nenhuma OS encontrada para este chassi.")
+        else:
+            st.dataframe(df_historico.drop(columns=["data_abertura_iso", "os_id"]), use_container_width=True, hide_index=True)
+
+    st.markdown("---")
+
     # --- Dashboards de Pizza por Tipo de Máquina ---
     st.subheader("📊 Distribuição de Máquinas por Tipo")
-    query_tipo_count = """
-    SELECT tm.descricao AS tipo_maquina, COUNT(m.id) AS total_modelos
-    FROM Modelo m
-    JOIN TipoMaquina tm ON m.tipo_maquina_id = tm.id
-    GROUP BY tm.descricao
-    ORDER BY total_modelos DESC
-    """
-    df_tipo_count = pd.read_sql_query(query_tipo_count, conn)
+    df_tipo_count = carregar_maquinas_por_tipo() # Compartilhado pelo cache: não modificar
 
     if not df_tipo_count.empty:
-        fig_pie_tipo = px.pie(df_tipo_count, values='total_modelos', names='tipo_maquina',
-                              title='Quantidade de Modelos por Tipo de Máquina',
+        fig_pie_tipo = px.pie(df_tipo_count, values='total_maquinas', names='tipo_maquina',
+                              title='Quantidade de Máquinas por Tipo',
                               hole=0.3)
         fig_pie_tipo.update_traces(textposition='inside', textinfo='percent+label')
         st.plotly_chart(fig_pie_tipo, use_container_width=True)
     else:
-        st.info("Nenhum tipo de máquina para exibir no gráfico.")
-
-    conn.close()
\ No newline at end of file
+        st.info("Nenhum tipo de máquina para exibir no gráfico.")
\ No newline at end of file
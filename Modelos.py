@@ -3,6 +3,7 @@ import sqlite3
 import pandas as pd
 from controllers.auth import conectar
 from controllers import db_utils # Para db_utils.get_or_create_modelo
+from controllers import db_pool # Gravações pela fila de escrita
 
 def app(): # <--- Todo o código da página deve estar aqui dentro
     st.title("⚙️ Modelos (Visibilidade Limitada)")
@@ -26,8 +27,7 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
     if st.button("Cadastrar Modelo"):
         if nome_modelo and tipo_maquina_id:
             try:
-                db_utils.get_or_create_modelo(cursor, nome_modelo, chassi, tipo_maquina_id)
-                conn.commit()
+                db_pool.escrever(lambda conn_escrita: db_utils.get_or_create_modelo(conn_escrita.cursor(), nome_modelo, chassi, tipo_maquina_id))
                 st.success("Modelo cadastrado com sucesso!")
                 st.rerun()
             except sqlite3.IntegrityError:
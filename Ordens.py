@@ -1,62 +1,83 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
-from controllers.auth import conectar # Para a conexão com o DB
-from controllers import db_utils # Para as funções utilitárias (get_or_create, delete_record)
+from sqlalchemy import select, insert
+from controllers import banco # Consultas em SQLAlchemy Core (SQLite ou servidor)
+from controllers import tabelas
+from controllers import db_utils # Para as funções utilitárias (get_or_create, excluir_registros)
+from controllers import consultas_os # Consultas paginadas das OS em aberto
+from controllers import salvar_os # Diff e gravação em lote do editor de OS em aberto
+from controllers import db_pool # Gravações pela fila de escrita
+from controllers import dinheiro # Parse de valores em R$ para centavos
+from controllers import cache_consultas # Cache versionado pelas revisões das tabelas
+from controllers import importar_os # Importação em lote de OS (XLSX/CSV)
+from controllers import exportar # Exportação CSV/XLSX direto do cursor
+from controllers import busca_clientes # Sugestões de cliente por digitação (sem carregar a tabela toda)
 from datetime import datetime, date 
 
 # --- Funções auxiliares para Selectboxes (Cacheando para performance) ---
-@st.cache_data # st.cache_data é mais robusto para dados
+# Compartilhado entre sessões; recarrega sozinho quando alguma dessas tabelas muda (sem .clear())
+# Clientes não entram aqui: são muitos e o formulário busca por digitação (busca_clientes)
+@cache_consultas.versionado(["Consultor", "Status"], ttl_s=600)
 def get_all_auxiliary_data():
-    conn = conectar()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT id, nome FROM Cliente")
-    clientes_db = cursor.fetchall()
-    clientes_map = {nome: id for id, nome in clientes_db}
-    clientes_nomes = [nome for id, nome in clientes_db]
-
-    cursor.execute("SELECT id, descricao FROM TipoMaquina")
-    tipos_maquina_db = cursor.fetchall()
-    tipos_maquina_map = {desc: id for id, desc in tipos_maquina_db}
-    tipos_maquina_descricoes = [desc for id, desc in tipos_maquina_db]
-
-    cursor.execute("SELECT id, nome_modelo, tipo_maquina_id FROM Modelo")
-    modelos_db = cursor.fetchall()
-    modelos_map_id_to_name = {id: name for id, name, _ in modelos_db}
-    modelos_map_name_to_id = {name: id for id, name, _ in modelos_db}
-    modelos_nomes = [name for id, name, _ in modelos_db]
-
-    cursor.execute("SELECT id, nome FROM Consultor")
-    consultores_db = cursor.fetchall()
+    conexao = banco.conectar()
+
+    consultores_db = banco.linhas(select(tabelas.consultor.c.id, tabelas.consultor.c.nome), conexao)
     consultores_map = {nome: id for id, nome in consultores_db}
     consultores_nomes = [nome for id, nome in consultores_db] # Lista de nomes de consultores
 
-    cursor.execute("SELECT id, descricao FROM Status")
-    status_db = cursor.fetchall()
+    status_db = banco.linhas(select(tabelas.status.c.id, tabelas.status.c.descricao), conexao)
     status_map = {desc: id for id, desc in status_db}
     status_descricoes = [desc for id, desc in status_db] # Variável correta
     
-    conn.close()
-    return clientes_map, clientes_nomes, tipos_maquina_map, tipos_maquina_descricoes, \
-           modelos_map_id_to_name, modelos_map_name_to_id, modelos_nomes, \
-           consultores_map, consultores_nomes, status_map, status_descricoes
+    conexao.close()
+    return consultores_map, consultores_nomes, status_map, status_descricoes
 
 
 def app():
     st.title("📝 Ordens de Serviço")
 
-    (clientes_map, clientes_nomes, tipos_maquina_map, tipos_maquina_descricoes,
-     modelos_map_id_to_name, modelos_map_name_to_id, modelos_nomes,
-     consultores_map, consultores_nomes, status_map, status_descricoes) = get_all_auxiliary_data()
+    consultores_map, consultores_nomes, status_map, status_descricoes = get_all_auxiliary_data()
+
+    # Cada seção é um fragmento: digitar no formulário, editar uma célula ou escolher OS para
+    # excluir reroda só a própria seção. Gravações rerodam a página, que as outras seções também mostram.
+    # A exclusão fica dentro de os_em_aberto: escolhe entre as OS da página já carregada.
+    formulario_nova_os(consultores_nomes)
+
+    if st.session_state.usuario["permissao"] == "supervisor":
+        importacao_os()
+
+    os_em_aberto(consultores_map, consultores_nomes, status_map, status_descricoes)
+
 
+@st.fragment
+def formulario_nova_os(consultores_nomes):
     # --- Formulário para Nova Ordem de Serviço ---
     st.subheader("➕ Cadastrar Nova Ordem de Serviço")
+
+    # Cliente fora do formulário: dentro dele a busca só rodaria no envio. Só as sugestões
+    # do termo digitado vêm do banco; a última opção cadastra um cliente novo com esse nome
+    # (só quando o termo tem letras: um CPF ou telefone digitado não vira nome de cliente).
+    col_busca_cliente, col_escolha_cliente = st.columns(2)
+    with col_busca_cliente:
+        termo_cliente = st.text_input("Cliente (nome, CPF ou telefone)", help="Obrigatório. Digite ao menos "
+                                      f"{busca_clientes.MIN_CARACTERES} letras e tecle Enter", key="novo_cliente_busca")
+    sugestoes_cliente = {busca_clientes.rotulo(s): s.id for s in busca_clientes.sugerir(termo_cliente)}
+    nome_novo_cliente = busca_clientes.nome_novo_cliente(termo_cliente)
+    if nome_novo_cliente:
+        sugestoes_cliente[f"➕ Novo cliente: {nome_novo_cliente}"] = None
+    with col_escolha_cliente:
+        cliente_escolhido = st.selectbox("Cliente da OS", options=list(sugestoes_cliente), index=None,
+                                         placeholder="Escolha uma sugestão" if sugestoes_cliente else "Digite para buscar",
+                                         disabled=not sugestoes_cliente, key="novo_cliente_escolha")
+    cliente_id_form = sugestoes_cliente.get(cliente_escolhido)
+    if termo_cliente.strip() and not nome_novo_cliente:
+        st.caption("Cliente novo? Digite o nome dele para a opção de cadastro aparecer.")
+
     with st.form("form_nova_os", clear_on_submit=True):
         col1, col2, col3 = st.columns(3)
         with col1:
             numero_os = st.text_input("Número da OS", help="Obrigatório", key="novo_numero_os")
-            cliente_nome_form = st.text_input("Nome do Cliente", help="Obrigatório", key="novo_cliente_nome")
             consultor_nome_form = st.selectbox("Consultor", options=[""] + consultores_nomes, help="Obrigatório", key="novo_consultor_nome")
         
         with col2:
@@ -72,50 +93,50 @@ def app():
         submitted = st.form_submit_button("Cadastrar OS")
 
         if submitted:
-            if not all([numero_os.strip(), cliente_nome_form.strip(), modelo_nome_form.strip(), chassi_form.strip(),
+            if not all([numero_os.strip(), cliente_escolhido, modelo_nome_form.strip(), chassi_form.strip(),
                          data_abertura_form, consultor_nome_form, status_desc_form.strip()]):
                 st.error("Por favor, preencha todos os campos obrigatórios.")
                 st.stop()
 
-            conn = conectar()
-            cursor = conn.cursor()
-            
             try:
-                cliente_id = db_utils.get_or_create_cliente(cursor, cliente_nome_form.strip(), None, None)
+                valor_liquido_centavos_db = dinheiro.parse_brl_valor(valor_liquido_str_form)
+            except ValueError:
+                st.error("Erro: 'Valor Líquido' inválido. Use um formato numérico válido (ex: 123.45 ou 1.234,56).")
+                st.stop()
+
+            conn = banco.conexao_dbapi()
+            consultor_id = db_utils.get_consultor_id_by_name(conn.cursor(), consultor_nome_form)
+            conn.close()
+            if consultor_id is None:
+                st.error(f"Erro: Consultor '{consultor_nome_form}' não encontrado. Por favor, cadastre o consultor primeiro na página de Consultores.")
+                st.stop()
+
+            tipo_os_default_value = "Garantia"
+
+            # Cliente/modelo/status novos e a OS gravados juntos pela fila de escrita: tudo ou nada
+            def cadastrar_os(conn):
+                cursor = conn.cursor()
+                cliente_id = cliente_id_form
+                if cliente_id is None: # "Novo cliente"
+                    cliente_id = db_utils.get_or_create_cliente(cursor, nome_novo_cliente, None, None)
                 tipo_maquina_id = db_utils.get_or_create_tipo_maquina(cursor, "Trator") # Default "Trator"
                 modelo_id = db_utils.get_or_create_modelo(cursor, modelo_nome_form.strip(), chassi_form.strip(), tipo_maquina_id)
-                consultor_id = db_utils.get_consultor_id_by_name(cursor, consultor_nome_form)
+                maquina_id = db_utils.get_or_create_maquina(cursor, chassi_form, modelo_id)
                 status_id = db_utils.get_or_create_status(cursor, status_desc_form.strip())
+                cursor.execute(*banco.compilar(insert(tabelas.ordem_servico).values(
+                    numero_os=numero_os.strip(), tipo_os=tipo_os_default_value, cliente_id=cliente_id,
+                    modelo_id=modelo_id, maquina_id=maquina_id, consultor_id=consultor_id, status_id=status_id,
+                    descricao_servico=descricao_servico_form.strip(),
+                    data_abertura=data_abertura_form.strftime('%Y-%m-%d'),
+                    valor_liquido_centavos=valor_liquido_centavos_db,
+                )))
 
-                if consultor_id is None:
-                    st.error(f"Erro: Consultor '{consultor_nome_form}' não encontrado. Por favor, cadastre o consultor primeiro na página de Consultores.")
-                    conn.close()
-                    st.stop()
-                
-                tipo_os_default_value = "Garantia"
-
-                valor_liquido_db = None
-                if valor_liquido_str_form.strip():
-                    try:
-                        valor_limpo = valor_liquido_str_form.strip().replace('R$', '').replace('.', '').replace(',', '.')
-                        valor_liquido_db = float(valor_limpo)
-                    except ValueError:
-                        st.error("Erro: 'Valor Líquido' inválido. Use um formato numérico válido (ex: 123.45 ou 1.234,56).")
-                        conn.close()
-                        st.stop()
-
-                cursor.execute("""
-                    INSERT INTO OrdemDeServico
-                    (numero_os, tipo_os, cliente_id, modelo_id, consultor_id, status_id, descricao_servico, data_abertura, valor_liquido)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    numero_os.strip(), tipo_os_default_value, cliente_id, modelo_id, consultor_id,
-                    status_id, descricao_servico_form.strip(), data_abertura_form.strftime('%Y-%m-%d'),
-                    valor_liquido_db
-                ))
-                conn.commit()
+            try:
+                db_pool.escrever(cadastrar_os)
                 st.success(f"Ordem de Serviço Nº {numero_os.strip()} cadastrada com sucesso!")
-                get_all_auxiliary_data.clear()
+                # O clear_on_submit não alcança a busca de cliente, que fica fora do formulário
+                for chave in ("novo_cliente_busca", "novo_cliente_escolha"):
+                    st.session_state.pop(chave, None)
                 st.rerun()
             
             except sqlite3.IntegrityError as e:
@@ -123,65 +144,104 @@ def app():
                     st.error(f"Erro: Já existe uma Ordem de Serviço com o número '{numero_os.strip()}'. Por favor, use um número diferente ou edite a OS existente.")
                 else:
                     st.error(f"Erro de integridade ao cadastrar OS: {e}")
-                conn.rollback()
             except Exception as e:
                 st.error(f"Ocorreu um erro inesperado ao cadastrar OS: {e}")
-                conn.rollback()
-            finally:
-                conn.close()
 
 
+@st.fragment
+def importacao_os():
+    # --- Importação em lote de OS (APENAS SUPERVISOR) ---
+    with st.expander("📥 Importar Ordens de Serviço (Excel/CSV)"):
+        st.caption("Colunas obrigatórias: " + ", ".join(importar_os.OBRIGATORIAS) +
+                   ". Opcionais: cpf, telefone, tipo_maquina, data_faturamento, descricao_servico, valor_liquido, tipo_os.")
+        arquivo_importacao = st.file_uploader("Arquivo", type=["xlsx", "csv"], key="importar_os_arquivo")
+        if arquivo_importacao is not None and st.button("Importar", key="importar_os_botao"):
+            barra = st.progress(0.0, text="Importando...")
+            def atualizar_progresso(resumo, fracao):
+                barra.progress(fracao, text=f"{resumo['lidas']} linha(s) lida(s), {resumo['inseridas']} OS importada(s)")
+            try:
+                resumo, erros_importacao = importar_os.importar_os(arquivo_importacao, arquivo_importacao.name,
+                                                                   ao_progredir=atualizar_progresso)
+            except ValueError as e:
+                st.error(f"Erro na importação: {e}")
+            except sqlite3.Error as e:
+                st.error(f"Erro no DB durante a importação (lotes anteriores já foram gravados): {e}")
+            else:
+                barra.progress(1.0, text="Importação concluída.")
+                st.success(f"{resumo['inseridas']} de {resumo['lidas']} OS importada(s).")
+                if erros_importacao:
+                    st.warning(f"{resumo['com_erro']} linha(s) com erro não foram importadas.")
+                    st.dataframe(pd.DataFrame(erros_importacao), use_container_width=True, hide_index=True)
+
+
+@st.fragment
+def os_em_aberto(consultores_map, consultores_nomes, status_map, status_descricoes):
     # --- Seção "ORDEM DE SERVIÇO EM ABERTO" ---
     st.subheader("📊 Ordens de Serviço em Aberto (Aguardando Faturamento)")
 
-    conn_initial = conectar()
-    query_os_aberto = """
-    SELECT
-        os.id, os.numero_os, os.tipo_os,
-        c.nome AS cliente_nome,
-        c.cpf AS cliente_cpf,
-        c.telefone AS cliente_telefone,
-        s.descricao AS status_descricao,
-        m.nome_modelo AS modelo_nome,
-        con.nome AS consultor_nome,
-        m.chassi AS modelo_chassi,
-        os.data_abertura,
-        os.valor_liquido,
-        os.data_faturamento,
-        os.data_pagamento_fabrica,
-        os.descricao_servico,
-        os.cliente_id,
-        os.modelo_id,
-        os.consultor_id,
-        os.status_id
-    FROM OrdemDeServico os
-    JOIN Cliente c ON os.cliente_id = c.id
-    JOIN Modelo m ON os.modelo_id = m.id
-    JOIN Consultor con ON os.consultor_id = con.id
-    JOIN Status s ON os.status_id = s.id
-    WHERE os.data_faturamento IS NULL
-    """
+    # --- Filtros e paginação (executados no SQL; só UMA página fica em memória) ---
+    col_f1, col_f2, col_f3, col_f4 = st.columns([2, 2, 2, 1])
+    with col_f1:
+        filtro_status = st.selectbox("Filtrar por Status:", ["Todos"] + status_descricoes, key="os_aberto_filtro_status")
+    with col_f2:
+        filtro_cliente = st.text_input("Filtrar por Cliente (início do nome):", key="os_aberto_filtro_cliente")
+    with col_f3:
+        if st.session_state.usuario["permissao"] == "consultor":
+            filtro_consultor = st.session_state.usuario["nome"]
+            st.text_input("Consultor:", value=filtro_consultor, disabled=True, key="os_aberto_filtro_consultor_fixo")
+        else:
+            filtro_consultor = st.selectbox("Filtrar por Consultor:", ["Todos"] + consultores_nomes, key="os_aberto_filtro_consultor")
+    with col_f4:
+        tamanho_pagina = st.selectbox("Por página:", consultas_os.TAMANHOS_PAGINA, index=1, key="os_aberto_tamanho_pagina")
 
     if st.session_state.usuario["permissao"] == "consultor":
-        query_os_aberto += f" AND os.consultor_id = {st.session_state.usuario['id']}"
-    
-    query_os_aberto += " ORDER BY os.data_abertura DESC"
-    
-    df_ordens_aberto = pd.read_sql_query(query_os_aberto, conn_initial)
-    conn_initial.close()
-
-    for col in ['numero_os', 'tipo_os', 'cliente_nome', 'cliente_cpf', 'cliente_telefone',
-                'status_descricao', 'modelo_nome', 'consultor_nome', 'modelo_chassi',
-                'descricao_servico']:
-        df_ordens_aberto[col] = df_ordens_aberto[col].apply(lambda x: str(x).strip() if pd.notna(x) else None)
-
-    for col in ['data_abertura', 'data_faturamento', 'data_pagamento_fabrica']:
-        df_ordens_aberto[col] = pd.to_datetime(df_ordens_aberto[col], errors='coerce')
-        df_ordens_aberto[col] = df_ordens_aberto[col].dt.strftime('%d/%m/%Y')
-        df_ordens_aberto[col] = df_ordens_aberto[col].fillna("")
-    
-    df_ordens_aberto['valor_liquido'] = df_ordens_aberto['valor_liquido'].apply(lambda x: f"{x:.2f}".replace('.', ',') if pd.notna(x) else "")
-    
+        consultor_id_filtro = st.session_state.usuario['id']
+    else:
+        consultor_id_filtro = consultores_map.get(filtro_consultor) if filtro_consultor != "Todos" else None
+    status_id_filtro = status_map.get(filtro_status) if filtro_status != "Todos" else None
+    cliente_filtro = filtro_cliente.strip() or None
+
+    # Pilha de chaves keyset: o topo é o início da página atual. Reinicia quando os filtros mudam.
+    assinatura_filtros = (consultor_id_filtro, status_id_filtro, cliente_filtro, tamanho_pagina)
+    if st.session_state.get("os_aberto_assinatura_filtros") != assinatura_filtros:
+        st.session_state.os_aberto_assinatura_filtros = assinatura_filtros
+        st.session_state.os_aberto_cursores = [None]
+    cursores_pagina = st.session_state.os_aberto_cursores
+
+    with banco.conectar() as conexao:
+        df_ordens_aberto, tem_proxima_pagina = consultas_os.query_os_aberto_pagina(
+            conexao, tamanho_pagina, apos=cursores_pagina[-1],
+            consultor_id=consultor_id_filtro, status_id=status_id_filtro, cliente_nome=cliente_filtro
+        )
+        total_os_aberto = consultas_os.contar_os_aberto(
+            conexao, consultor_id=consultor_id_filtro, status_id=status_id_filtro, cliente_nome=cliente_filtro
+        )
+
+    # Navegação por callback: a pilha muda antes da rerodada do fragmento, sem st.rerun()
+    numero_pagina = len(cursores_pagina)
+    col_nav1, col_nav2, col_nav3 = st.columns([1, 3, 1])
+    with col_nav1:
+        st.button("⬅️ Anterior", disabled=numero_pagina == 1, key="os_aberto_pagina_anterior",
+                  on_click=cursores_pagina.pop)
+    with col_nav2:
+        st.caption(f"Página {numero_pagina} — {total_os_aberto} OS em aberto com os filtros aplicados.")
+        # Exporta TODAS as páginas com os filtros atuais, gerado só no clique
+        query_exportacao = consultas_os.query_os_aberto_exportacao(
+            consultor_id=consultor_id_filtro, status_id=status_id_filtro, cliente_nome=cliente_filtro
+        )
+        col_exp1, col_exp2 = st.columns(2)
+        with col_exp1:
+            st.download_button("⬇️ Exportar CSV", data=lambda: exportar.arquivo_csv(query_exportacao),
+                               file_name="os_em_aberto.csv", mime=exportar.MIME_CSV, on_click="ignore",
+                               disabled=total_os_aberto == 0, key="os_aberto_exportar_csv")
+        with col_exp2:
+            st.download_button("⬇️ Exportar Excel", data=lambda: exportar.arquivo_xlsx(query_exportacao, "OS em aberto"),
+                               file_name="os_em_aberto.xlsx", mime=exportar.MIME_XLSX, on_click="ignore",
+                               disabled=total_os_aberto == 0, key="os_aberto_exportar_xlsx")
+    with col_nav3:
+        st.button("Próxima ➡️", disabled=not tem_proxima_pagina, key="os_aberto_pagina_proxima",
+                  on_click=lambda: cursores_pagina.append(consultas_os.chave_keyset(df_ordens_aberto)))
+
     if not df_ordens_aberto.empty:
         st.write("Edite 'Data Faturamento' e 'Data Pagamento Fábrica' para mover a OS para 'Faturadas'.")
 
@@ -213,7 +273,6 @@ def app():
             "data_faturamento": st.column_config.TextColumn("DATA FATURAMENTO"),
             "data_pagamento_fabrica": st.column_config.TextColumn("DATA PAGAMENTO FÁBRICA"),
             "descricao_servico": st.column_config.Column("SERVIÇO", disabled=False),
-            "cliente_id": None, "modelo_id": None, "consultor_id": None, "status_id": None
         }
 
         edited_df_aberto = st.data_editor(
@@ -221,252 +280,70 @@ def app():
             column_config=column_config_dict_aberto,
             num_rows="fixed",
             hide_index=True,
-            key="os_aberto_data_editor"
+            key=f"os_aberto_data_editor_{numero_pagina}"
         )
 
         if st.button("Salvar Alterações das OS em Aberto"):
-            changes_made_overall = False 
-            conn = conectar() 
-            cursor = conn.cursor()
-
-            original_df_reload_conn = conectar()
-            original_df_reload = pd.read_sql_query(query_os_aberto, original_df_reload_conn)
-            original_df_reload_conn.close()
-
-            for col in ['data_abertura', 'data_faturamento', 'data_pagamento_fabrica']:
-                original_df_reload[col] = pd.to_datetime(original_df_reload[col], errors='coerce').dt.date
-                original_df_reload[col] = original_df_reload[col].apply(lambda x: None if pd.isna(x) else x)
-            
-            original_df_reload['valor_liquido'] = original_df_reload['valor_liquido'].apply(lambda x: float(str(x).replace(',', '.')) if pd.notna(x) else None)
-
-
-            for idx, edited_row in edited_df_aberto.iterrows():
-                original_row = original_df_reload[original_df_reload['numero_os'] == edited_row['numero_os']]
-
-                if not original_row.empty:
-                    original_row = original_row.iloc[0]
-                    # CONVERTENDO O ID PARA INT AQUI, para evitar problemas com np.int64
-                    os_id = int(original_row['id']) 
-
-                    row_has_changes = False 
-                    fields_to_update_os = {}
-
-                    # 1. Status (TextColumn)
-                    edited_status_desc = edited_row['status_descricao']
-                    original_status_desc = original_row['status_descricao']
-                    
-                    if edited_status_desc != original_status_desc:
-                        new_status_id = db_utils.get_or_create_status(cursor, edited_status_desc.strip())
-                        fields_to_update_os['status_id'] = new_status_id
-                        row_has_changes = True
-                        print(f"DEBUG (OS {os_id}): Status alterado de '{original_status_desc}' para '{edited_status_desc}'. Novo status_id: {new_status_id}")
-
-                    # 2. Data Faturamento (TextColumn -> Date)
-                    edited_data_faturamento_str = edited_row['data_faturamento']
-                    
-                    parsed_edited_data_faturamento = None
-                    if edited_data_faturamento_str and edited_data_faturamento_str.strip():
-                        try:
-                            parsed_edited_data_faturamento = datetime.strptime(edited_data_faturamento_str.strip(), '%d/%m/%Y').date()
-                        except ValueError:
-                            st.error(f"Erro no formato da Data Faturamento para OS {edited_row['numero_os']}. Use DD/MM/YYYY.")
-                            conn.rollback() 
-                            conn.close()
-                            st.stop()
-                    
-                    if parsed_edited_data_faturamento != original_row['data_faturamento']:
-                        fields_to_update_os['data_faturamento'] = parsed_edited_data_faturamento.strftime('%Y-%m-%d') if parsed_edited_data_faturamento is not None else None
-                        row_has_changes = True
-                        print(f"DEBUG (OS {os_id}): Data Faturamento alterada de '{original_row['data_faturamento']}' para '{parsed_edited_data_faturamento}'.")
-
-                    # 3. Data Pagamento Fábrica (TextColumn -> Date)
-                    edited_data_pagamento_fabrica_str = edited_row['data_pagamento_fabrica']
-
-                    parsed_edited_data_pagamento_fabrica = None
-                    if edited_data_pagamento_fabrica_str and edited_data_pagamento_fabrica_str.strip():
-                        try:
-                            parsed_edited_data_pagamento_fabrica = datetime.strptime(edited_data_pagamento_fabrica_str.strip(), '%d/%m/%Y').date()
-                        except ValueError:
-                            st.error(f"Erro no formato da Data Pagamento Fábrica para OS {edited_row['numero_os']}. Use DD/MM/YYYY.")
-                            conn.rollback()
-                            conn.close()
-                            st.stop()
-
-                    if parsed_edited_data_pagamento_fabrica != original_row['data_pagamento_fabrica']:
-                        fields_to_update_os['data_pagamento_fabrica'] = parsed_edited_data_pagamento_fabrica.strftime('%Y-%m-%d') if parsed_edited_data_pagamento_fabrica is not None else None
-                        row_has_changes = True
-                        print(f"DEBUG (OS {os_id}): Data Pagamento Fábrica alterada de '{original_row['data_pagamento_fabrica']}' para '{parsed_edited_data_pagamento_fabrica}'.")
-
-                    # 4. Descrição do Serviço (TextColumn)
-                    edited_descricao_servico_val = edited_row['descricao_servico']
-                    original_descricao_servico_val = original_row['descricao_servico']
-                    if edited_descricao_servico_val != original_descricao_servico_val:
-                        fields_to_update_os['descricao_servico'] = edited_descricao_servico_val.strip() if edited_descricao_servico_val else None
-                        row_has_changes = True
-                        print(f"DEBUG (OS {os_id}): Descrição Serviço alterada.")
-
-                    # 5. Campos que APENAS o Supervisor pode editar
-                    if st.session_state.usuario["permissao"] == "supervisor":
-                        # Tipo OS
-                        edited_tipo_os_val = edited_row['tipo_os']
-                        original_tipo_os_val = original_row['tipo_os']
-                        if edited_tipo_os_val != original_tipo_os_val:
-                            fields_to_update_os['tipo_os'] = edited_tipo_os_val
-                            row_has_changes = True
-                            print(f"DEBUG (OS {os_id}): Tipo OS alterado de '{original_tipo_os_val}' para '{edited_tipo_os_val}'.")
-                        
-                        # Valor Líquido (TextColumn -> Float)
-                        edited_valor_liquido_str = edited_row['valor_liquido']
-                        
-                        parsed_edited_valor_liquido = None
-                        if edited_valor_liquido_str and edited_valor_liquido_str.strip():
-                            try:
-                                valor_limpo = edited_valor_liquido_str.strip().replace('R$', '').replace('.', '').replace(',', '.')
-                                parsed_edited_valor_liquido = float(valor_limpo)
-                            except ValueError:
-                                st.error(f"Erro no formato do Valor Líquido para OS {edited_row['numero_os']}. Use um formato numérico válido (ex: 123.45 ou 1.234,56).")
-                                conn.rollback()
-                                conn.close()
-                                st.stop()
-                        
-                        if parsed_edited_valor_liquido != original_row['valor_liquido']:
-                            fields_to_update_os['valor_liquido'] = parsed_edited_valor_liquido
-                            row_has_changes = True
-                            print(f"DEBUG (OS {os_id}): Valor Líquido alterado de '{original_row['valor_liquido']}' para '{parsed_edited_valor_liquido}'.")
-                    
-                    # --- EXECUTE O UPDATE SE HOUVER ALTERAÇÕES DETECTADAS PARA ESTA LINHA ---
-                    if row_has_changes:
-                        set_clauses_os = [f"{k} = ?" for k in fields_to_update_os.keys()]
-                        query_update_os_sql = f"UPDATE OrdemDeServico SET {', '.join(set_clauses_os)} WHERE id = ?"
-                        params_update_os = list(fields_to_update_os.values()) + [os_id] # os_id já é int aqui
-                        
-                        print(f"DEBUG (OS {os_id}): Executando UPDATE principal: {query_update_os_sql} com parâmetros {params_update_os}")
-                        try:
-                            cursor.execute(query_update_os_sql, params_update_os)
-                            print(f"DEBUG (OS {os_id}): UPDATE principal executado com sucesso. Rows affected by this execute: {cursor.rowcount}") # Adicionado para ver o impacto individual
-                        except sqlite3.Error as e:
-                            st.error(f"Erro no DB ao atualizar OS {edited_row['numero_os']}: {e}")
-                            conn.rollback()
-                            conn.close()
-                            st.stop()
-                        except Exception as e:
-                            st.error(f"Erro inesperado ao atualizar OS {edited_row['numero_os']}: {e}")
-                            conn.rollback()
-                            conn.close()
-                            st.stop()
-
-
-                        # --- Lógica de Transição para Faturada ---
-                        status_faturada_id = status_map.get("Faturada")
-                        if status_faturada_id is None:
-                            # Esta parte pode ser o motivo do conflito de IDs.
-                            # Se 'Faturada' foi digitado e não existia, get_or_create_status irá criá-lo.
-                            # É crucial que essa função seja robusta e não crie duplicatas.
-                            status_faturada_id = db_utils.get_or_create_status(cursor, "Faturada")
-                            status_map["Faturada"] = status_faturada_id # Garante que o status_map está atualizado
-                            print(f"DEBUG: Status 'Faturada' criado (ou obtido) com ID: {status_faturada_id}. (Pode ocorrer mais de uma vez se não estiver no cache)")
-                            
-                        # Verifica se o status *digitado* é 'Faturada' E se a data de faturamento *foi preenchida*
-                        if edited_status_desc and edited_status_desc.lower() == 'faturada' and parsed_edited_data_faturamento is not None:
-                            current_status_id_in_transaction = fields_to_update_os.get('status_id', original_row['status_id'])
-                            
-                            # Se o status da OS no DB (após o update principal) ainda não for 'Faturada', força a atualização
-                            if current_status_id_in_transaction != status_faturada_id:
-                                print(f"DEBUG (OS {os_id}): Status atual na transação ({current_status_id_in_transaction}) diferente de 'Faturada' ({status_faturada_id}). Forçando atualização.")
-                                try:
-                                    cursor.execute("UPDATE OrdemDeServico SET status_id = ? WHERE id = ?", (status_faturada_id, os_id))
-                                    changes_made_overall = True 
-                                    st.success(f"OS {edited_row['numero_os']} marcada como 'Faturada' e movida para a aba 'Faturadas'!")
-                                    print(f"DEBUG (OS {os_id}): Status FORÇADO para 'Faturada' com sucesso. Rows affected: {cursor.rowcount}")
-                                except sqlite3.Error as e:
-                                    st.error(f"Erro no DB ao forçar status para OS {edited_row['numero_os']}: {e}")
-                                    conn.rollback()
-                                    conn.close()
-                                    st.stop()
-                                except Exception as e:
-                                    st.error(f"Erro inesperado ao forçar status para OS {edited_row['numero_os']}: {e}")
-                                    conn.rollback()
-                                    conn.close()
-                                    st.stop()
-                            else:
-                                st.success(f"OS {edited_row['numero_os']} marcada como 'Faturada' e movida para a aba 'Faturadas'!")
-                                changes_made_overall = True 
-                                print(f"DEBUG (OS {os_id}): Status já era 'Faturada' ou foi atualizado no UP principal. Confirmando sucesso.")
-
-                        elif row_has_changes: 
-                            st.info(f"OS {edited_row['numero_os']} atualizada.")
-                            changes_made_overall = True 
+            # Diff vetorizado contra a página exibida (chaveado por id) + validação em bloco, sem abrir o banco
+            pode_editar_financeiro = st.session_state.usuario["permissao"] == "supervisor"
+            alteracoes, erros = salvar_os.preparar_alteracoes(df_ordens_aberto, edited_df_aberto, pode_editar_financeiro)
+            if erros:
+                for erro in erros:
+                    st.error(erro)
+                st.stop()
 
-                    else:
-                        st.info(f"Nenhuma alteração detectada para OS {edited_row['numero_os']}.")
-                else:
-                    st.warning(f"OS {edited_row['numero_os']} não encontrada no banco de dados original para atualização.")
+            if not alteracoes:
+                st.info("Nenhuma alteração a ser salva.")
+            else:
+                # Um único job na fila de escrita (executemany): o lock de escrita só é mantido durante os UPDATEs
+                try:
+                    os_faturadas = db_pool.escrever(lambda conn: salvar_os.aplicar_alteracoes(conn, alteracoes))
+                except (sqlite3.Error, TimeoutError) as e:
+                    st.error(f"Erro no DB ao salvar as alterações das OS: {e}")
+                    st.stop()
 
-            print(f"DEBUG: Tentando commit final. changes_made_overall = {changes_made_overall}")
-            conn.commit()
-            #cursor.rowcount após commit() pode não ser o total de linhas modificadas na transação inteira,
-            # mas sim da última operação. O importante é o commit ter ocorrido sem erro.
-            print(f"DEBUG: Commit final realizado.") 
-            
-            if changes_made_overall:
-                get_all_auxiliary_data.clear()
-                print("DEBUG: Cache limpo. Chamando st.rerun()")
+                for numero_os in os_faturadas:
+                    st.success(f"OS {numero_os} marcada como 'Faturada' e movida para a aba 'Faturadas'!")
+                st.info(f"{len(alteracoes)} OS atualizada(s).")
                 st.rerun()
-            else:
-                st.info("Nenhuma alteração a ser salva.")
-                
-            conn.close()
                 
     else:
         st.info("Nenhuma Ordem de Serviço em Aberto. Cadastre uma nova OS ou verifique as OSs faturadas.")
 
+    exclusao_os(df_ordens_aberto[["id", "numero_os"]])
+
+
+@st.fragment
+def exclusao_os(df_ordens_aberto_for_delete):
     # --- Lógica para Deletar Ordens de Serviço ---
+    # Recebe a página de OS em aberto já carregada por os_em_aberto (mesmos filtros): nenhuma
+    # consulta a mais, e a lista nunca passa do tamanho da página
     st.markdown("---")
     st.subheader("🗑️ Excluir Ordens de Serviço")
     
     if st.session_state.usuario["permissao"] == "supervisor":
-        conn_delete = conectar()
-        query_os_aberto_delete = """
-        SELECT
-            os.id, os.numero_os
-        FROM OrdemDeServico os
-        WHERE os.data_faturamento IS NULL
-        """
-        if st.session_state.usuario["permissao"] == "consultor":
-            query_os_aberto_delete += f" AND os.consultor_id = {st.session_state.usuario['id']}"
-        
-        df_ordens_aberto_for_delete = pd.read_sql_query(query_os_aberto_delete, conn_delete)
-        conn_delete.close()
-
         if not df_ordens_aberto_for_delete.empty:
             os_para_excluir_nomes = st.multiselect(
-                "Selecione o(s) número(s) da OS para excluir (apenas em aberto):",
+                "Selecione o(s) número(s) da OS para excluir (OS em aberto da página exibida acima):",
                 df_ordens_aberto_for_delete['numero_os'].tolist(),
                 key="multiselect_delete_os"
             )
 
             if st.button("Excluir OSs Selecionadas", key="delete_os_button"):
                 if os_para_excluir_nomes:
-                    conn = conectar()
-                    deleted_count = 0
-                    for os_num in os_para_excluir_nomes:
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT id FROM OrdemDeServico WHERE numero_os = ?", (os_num,))
-                        os_id_to_delete = cursor.fetchone()
-                        
-                        if os_id_to_delete:
-                            if db_utils.delete_record(conn, "OrdemDeServico", os_id_to_delete[0]):
-                                deleted_count += 1
-                            else:
-                                st.error(f"Falha ao excluir OS {os_num}.")
-                        else:
-                            st.warning(f"OS {os_num} não encontrada no banco de dados para exclusão.")
+                    ids_por_numero = dict(zip(df_ordens_aberto_for_delete['numero_os'], df_ordens_aberto_for_delete['id']))
+                    numeros_por_id = {int(ids_por_numero[os_num]): os_num for os_num in os_para_excluir_nomes}
+                    # Todas as OS selecionadas num job só da fila de escrita (um commit)
+                    erros = db_utils.excluir_registros("OrdemDeServico", list(numeros_por_id))
+                    for os_id, erro in erros.items():
+                        if erro is not None:
+                            st.error(f"Falha ao excluir OS {numeros_por_id[os_id]}: {erro}")
+                    deleted_count = sum(erro is None for erro in erros.values())
                     
-                    conn.close()
                     if deleted_count > 0:
                         st.success(f"{deleted_count} Ordem(ns) de Serviço excluída(s) com sucesso!")
-                        get_all_auxiliary_data.clear()
-                        st.rerun()
+                        if deleted_count == len(erros): # Com falhas, não recarrega: as mensagens sumiriam
+                            st.rerun()
                     else:
                         st.info("Nenhuma OS foi excluída.")
                 else:
@@ -474,4 +351,4 @@ def app():
         else:
             st.info("Nenhuma Ordem de Serviço em aberto para excluir.")
     else:
-        st.info("Apenas supervisores podem excluir Ordens de Serviço.")
\ No newline at end of file
+        st.info("Apenas supervisores podem excluir Ordens de Serviço.")
@@ -3,6 +3,7 @@ import sqlite3
 import pandas as pd
 from controllers.auth import conectar
 from controllers import db_utils # Para db_utils.get_or_create_status
+from controllers import db_pool # Gravações pela fila de escrita
 
 def app(): # <--- Todo o código da página deve estar aqui dentro
     st.title("🚦 Status de Ordem de Serviço (Visibilidade Limitada)")
@@ -16,8 +17,7 @@ def app(): # <--- Todo o código da página deve estar aqui dentro
     if st.button("Cadastrar Status"):
         if descricao:
             try:
-                db_utils.get_or_create_status(cursor, descricao)
-                conn.commit()
+                db_pool.escrever(lambda conn_escrita: db_utils.get_or_create_status(conn_escrita.cursor(), descricao))
                 st.success("Status cadastrado com sucesso!")
                 st.rerun()
             except sqlite3.IntegrityError:
@@ -1,17 +1,10 @@
 import streamlit as st
 from controllers import auth
+from controllers import migracoes
+from controllers import registro_paginas # Páginas de 'app_pages/' importadas só quando abertas
+from controllers import perfil_paginas
 import os
 
-# Importar as funções de cada página. Certifique-se que seus arquivos na pasta 'app_pages/' NÃO têm números no nome.
-# E que a pasta se chama 'app_pages'
-import app_pages.Dashboard as dashboard_page
-import app_pages.Ordens as ordens_page
-import app_pages.Clientes as clientes_page
-import app_pages.Consultores as consultores_page
-import app_pages.Config as config_page
-import app_pages.Maquinas as maquinas_page
-import app_pages.Faturadas as faturadas_page
-
 
 
 # st.set_page_config DEVE SER O PRIMEIRO COMANDO Streamlit!
@@ -19,6 +12,13 @@ st.set_page_config(page_title="Gestão de Ordens de Serviço", layout="wide", in
 
 # --- REMOVIDO: Bloco de carregamento de CSS customizado e imagem de fundo ---
 
+# Aplica as migrações pendentes do schema uma única vez por processo
+@st.cache_resource
+def inicializar_banco():
+    return migracoes.garantir_schema()
+
+inicializar_banco()
+
 # Inicializa o estado de login
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
@@ -74,21 +74,22 @@ else:
     st.sidebar.title(f"Bem-vindo, {st.session_state.usuario['nome']}!")
     st.sidebar.write(f"Permissão: {st.session_state.usuario['permissao'].capitalize()}")
 
-    # Opções de navegação do menu principal
-    menu_options = {
-        "📊 Dashboard Geral": dashboard_page.app,
-        "📝 Gerenciar Ordens de Serviço": ordens_page.app, # Página de cadastro de novas OS        
-        "✅ Faturadas": faturadas_page.app,
-        "👤 Clientes": clientes_page.app,
-        "🧑‍💼 Consultores": consultores_page.app,
-        "🔧 Máquinas": maquinas_page.app,
-        "⚙️ Configurações": config_page.app,
-    }
+    # Busca global: leva o termo digitado para a página de busca
+    def abrir_busca_global():
+        st.session_state.busca_termo = st.session_state.busca_global
+        st.session_state.current_page = "🔎 Buscar"
+
+    st.sidebar.text_input("🔎 Buscar OS, cliente ou chassi", key="busca_global", on_change=abrir_busca_global)
+
+    # Opções de navegação do menu principal (título -> módulo da página, ver registro_paginas)
+    menu_options = dict(registro_paginas.PAGINAS)
 
     # Restringe acesso a certas páginas para consultores
     if st.session_state.usuario["permissao"] == "consultor":
         if "🧑‍💼 Consultores" in menu_options:
             del menu_options["🧑‍💼 Consultores"]
+        if "🩺 Diagnóstico" in menu_options:
+            del menu_options["🩺 Diagnóstico"]
 
     # Permite selecionar a página no sidebar
     selected_page_title = st.sidebar.radio("Navegar", list(menu_options.keys()),
@@ -107,6 +108,12 @@ else:
     except Exception as e:
         st.sidebar.error(f"Erro ao carregar a logo na barra lateral: {e}")
 
+    # Perfil de cada rerun (resultados na página de Diagnóstico); OS_PERFIL_PAGINAS=1 liga para todos
+    if perfil_paginas.ATIVO_AMBIENTE:
+        st.sidebar.caption("⏱️ Perfil das páginas ligado (OS_PERFIL_PAGINAS=1)")
+    elif st.session_state.usuario["permissao"] == "supervisor":
+        st.sidebar.toggle("⏱️ Perfilar páginas", key="perfil_paginas_ativo")
+
     # Botão de Logout no final do sidebar
     st.sidebar.markdown("---")
     if st.sidebar.button("Sair"):
@@ -114,4 +121,8 @@ else:
 
     # Exibir a página selecionada
     st.session_state.current_page = selected_page_title
-    menu_options[selected_page_title]()
\ No newline at end of file
+    pagina = registro_paginas.carregar_pagina(selected_page_title)
+    if perfil_paginas.ATIVO_AMBIENTE or st.session_state.get("perfil_paginas_ativo"):
+        perfil_paginas.perfilar(selected_page_title, pagina, st.session_state.usuario["nome"])
+    else:
+        pagina()
\ No newline at end of file
@@ -0,0 +1,278 @@
+import argparse
+import os
+import sqlite3
+from datetime import date
+
+# --- Arquivo das OS faturadas antigas (partição fria) ---
+# As OS faturadas antes de uma data de corte saem de OrdemDeServico e vão para um banco separado
+# (por padrão <banco>_arquivo.sqlite3, ou OS_ARQUIVO_PATH). O banco principal fica pequeno e cabe no
+# page cache das consultas quentes (Dashboard, Ordens), e o arquivo pode ser compactado e copiado
+# à parte (ver compactar/copiar e a linha de comando no fim).
+#
+# O db_pool anexa o arquivo (ATTACH ... AS arquivo) a cada conexão na primeira vez que ela sai do
+# pool depois de o arquivo existir, e cria nela, como objetos TEMP (só eles podem citar outro banco):
+#   - a view os_faturadas_todas: as faturadas do banco principal UNION ALL as do arquivo. A página
+#     de Faturadas só a consulta quando o período escolhido chega aos anos arquivados
+#     (tabela_faturadas); os filtros de período descem para cada lado e usam os índices de cada um;
+#   - triggers que estendem ao arquivo o que o banco principal garante com UNIQUE e FOREIGN KEY:
+#     número de OS repetido e exclusão de cliente/modelo/consultor/status ainda usados;
+#   - os triggers que mantêm as OS arquivadas na busca textual (busca_fts.criar_triggers_arquivo).
+#
+# A movimentação é feita em lotes pela fila de escrita, em duas transações por lote: a cópia
+# (grava no arquivo as OS e seus ids em lote_pendente) e a exclusão no banco principal. Com WAL,
+# uma transação que grava em dois bancos não é atômica entre eles; assim, se o processo cair entre
+# as duas, o lote fica só duplicado (nunca perdido) e a próxima execução termina a exclusão.
+
+TAMANHO_LOTE = 1000
+ALIAS = "arquivo"
+
+# Colunas gravadas (as colunas de período são geradas, como no banco principal)
+COLUNAS = ["id", "numero_os", "tipo_os", "cliente_id", "modelo_id", "consultor_id", "status_id",
+           "descricao_servico", "data_abertura", "data_faturamento", "data_pagamento_fabrica",
+           "valor_liquido_centavos", "maquina_id"]
+_LISTA_COLUNAS = ", ".join(COLUNAS)
+
+# Sem FOREIGN KEY: Cliente, Modelo etc. ficam no banco principal (ver os triggers de exclusão)
+SQL_ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS OrdemDeServico (
+        id INTEGER PRIMARY KEY, -- O mesmo id do banco principal
+        numero_os TEXT NOT NULL UNIQUE,
+        tipo_os TEXT NOT NULL,
+        cliente_id INTEGER NOT NULL,
+        modelo_id INTEGER NOT NULL,
+        consultor_id INTEGER NOT NULL,
+        status_id INTEGER NOT NULL,
+        descricao_servico TEXT,
+        data_abertura DATE,
+        data_faturamento DATE NOT NULL,
+        data_pagamento_fabrica DATE,
+        valor_liquido_centavos INTEGER,
+        maquina_id INTEGER,
+        ano_faturamento INTEGER GENERATED ALWAYS AS (CAST(strftime('%Y', data_faturamento) AS INTEGER)) VIRTUAL,
+        mes_faturamento INTEGER GENERATED ALWAYS AS (CAST(strftime('%m', data_faturamento) AS INTEGER)) VIRTUAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_arq_faturamento ON OrdemDeServico (data_faturamento);
+    CREATE INDEX IF NOT EXISTS idx_arq_consultor_faturamento ON OrdemDeServico (consultor_id, data_faturamento);
+    CREATE INDEX IF NOT EXISTS idx_arq_faturamento_ano_mes ON OrdemDeServico (ano_faturamento, mes_faturamento);
+    CREATE INDEX IF NOT EXISTS idx_arq_faturamento_mes ON OrdemDeServico (mes_faturamento, data_faturamento);
+    CREATE INDEX IF NOT EXISTS idx_arq_cliente ON OrdemDeServico (cliente_id);
+    CREATE INDEX IF NOT EXISTS idx_arq_modelo ON OrdemDeServico (modelo_id);
+    CREATE INDEX IF NOT EXISTS idx_arq_status ON OrdemDeServico (status_id);
+    CREATE INDEX IF NOT EXISTS idx_arq_maquina ON OrdemDeServico (maquina_id, data_abertura, id);
+
+    -- Ids do lote copiado e ainda não excluído do banco principal
+    CREATE TABLE IF NOT EXISTS lote_pendente (id INTEGER PRIMARY KEY);
+"""
+
+SQL_OBJETOS_TEMP = f"""
+    CREATE TEMP VIEW IF NOT EXISTS os_faturadas_todas AS
+        SELECT {_LISTA_COLUNAS}, ano_faturamento, mes_faturamento
+        FROM main.OrdemDeServico WHERE data_faturamento IS NOT NULL
+        UNION ALL
+        SELECT {_LISTA_COLUNAS}, ano_faturamento, mes_faturamento
+        FROM {ALIAS}.OrdemDeServico;
+
+    CREATE TEMP TRIGGER IF NOT EXISTS trg_arquivo_numero_os_insert
+    BEFORE INSERT ON main.OrdemDeServico
+    WHEN EXISTS (SELECT 1 FROM {ALIAS}.OrdemDeServico WHERE numero_os = new.numero_os)
+    BEGIN
+        SELECT RAISE(ABORT, 'UNIQUE constraint failed: OrdemDeServico.numero_os');
+    END;
+
+    CREATE TEMP TRIGGER IF NOT EXISTS trg_arquivo_numero_os_update
+    BEFORE UPDATE OF numero_os ON main.OrdemDeServico
+    WHEN EXISTS (SELECT 1 FROM {ALIAS}.OrdemDeServico WHERE numero_os = new.numero_os)
+    BEGIN
+        SELECT RAISE(ABORT, 'UNIQUE constraint failed: OrdemDeServico.numero_os');
+    END;
+""" + "".join(f"""
+    CREATE TEMP TRIGGER IF NOT EXISTS trg_arquivo_fk_{tabela}
+    BEFORE DELETE ON main.{tabela}
+    WHEN EXISTS (SELECT 1 FROM {ALIAS}.OrdemDeServico WHERE {coluna} = old.id)
+    BEGIN
+        SELECT RAISE(ABORT, 'FOREIGN KEY constraint failed');
+    END;
+""" for tabela, coluna in [("Cliente", "cliente_id"), ("Modelo", "modelo_id"),
+                           ("Consultor", "consultor_id"), ("Status", "status_id")])
+# Maquina fica de fora: o app não exclui máquinas, e o trigger falharia ao anexar o arquivo num
+# banco ainda sem a migração 12
+
+
+def caminho_arquivo(db_path):
+    return os.environ.get("OS_ARQUIVO_PATH") or os.path.splitext(db_path)[0] + "_arquivo.sqlite3"
+
+
+def _executar_script(conn, script):
+    # Statement por statement: executescript faria COMMIT no meio da transação de quem chama
+    statement = ""
+    for linha in script.splitlines(keepends=True):
+        statement += linha
+        if sqlite3.complete_statement(statement):
+            if statement.strip():
+                conn.execute(statement)
+            statement = ""
+
+
+def anexado(conn):
+    return getattr(conn, "_arquivo_anexado", False)
+
+
+def anexar(conn, caminho):
+    # Anexa o arquivo à conexão (uma vez) se ele já existe. Chamado pelo db_pool fora de
+    # transação e antes de qualquer PRAGMA query_only (objetos TEMP também são gravações).
+    if anexado(conn) or not os.path.exists(caminho):
+        return anexado(conn)
+    conn.execute(f"ATTACH DATABASE ? AS {ALIAS}", (caminho,))
+    _atualizar_esquema(conn)
+    _executar_script(conn, SQL_OBJETOS_TEMP)
+    conn._arquivo_anexado = True
+    from controllers import busca_fts
+    busca_fts.criar_triggers_arquivo(conn)
+    return True
+
+
+def _atualizar_esquema(conn, banco=ALIAS):
+    # Arquivo criado antes da migração 12 (Maquina): ganha a coluna maquina_id, nula nas OS já
+    # arquivadas. Outra conexão pode estar fazendo o mesmo; quem perder a corrida só confere.
+    def colunas():
+        return {linha[1] for linha in conn.execute(f"PRAGMA {banco}.table_xinfo(OrdemDeServico)")}
+    existentes = colunas()
+    if not existentes or "maquina_id" in existentes: # Arquivo novo (ainda sem a tabela) ou já atualizado
+        return
+    try:
+        conn.execute(f"ALTER TABLE {banco}.OrdemDeServico ADD COLUMN maquina_id INTEGER")
+    except sqlite3.OperationalError:
+        if "maquina_id" not in colunas():
+            raise
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {banco}.idx_arq_maquina ON OrdemDeServico (maquina_id, data_abertura, id)")
+
+
+def criar_arquivo(caminho):
+    # Idempotente, com conexão própria (journal_mode não muda dentro de transação). Um arquivo novo
+    # é montado ao lado e só então renomeado: quem o anexa nunca encontra o banco ainda vazio.
+    destino = caminho if os.path.exists(caminho) else caminho + ".novo"
+    conn = sqlite3.connect(destino)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        _atualizar_esquema(conn, "main")
+        _executar_script(conn, SQL_ESQUEMA)
+        conn.commit()
+    finally:
+        conn.close()
+    if destino != caminho:
+        os.replace(destino, caminho)
+
+
+# --- Jobs da fila de escrita (recebem a conexão de escrita, já anexada) ---
+
+def _excluir_pendentes(conn):
+    # 2ª transação do lote: tira do banco principal o que já está gravado no arquivo. A exclusão
+    # tira as OS da busca textual (trg_busca_os_delete); na mesma transação elas voltam ao índice,
+    # agora lidas do arquivo.
+    from controllers import busca_fts
+    excluidas = conn.execute(
+        f"DELETE FROM main.OrdemDeServico WHERE id IN (SELECT id FROM {ALIAS}.lote_pendente)"
+    ).rowcount
+    busca_fts.indexar_arquivadas(conn, f"SELECT id FROM {ALIAS}.lote_pendente")
+    _manter_ultima_os_arquivada(conn)
+    return excluidas
+
+
+def _manter_ultima_os_arquivada(conn):
+    # A exclusão também disparou trg_maquina_ultima_os_delete, que troca a última OS da máquina pela
+    # anterior ainda no banco principal. Arquivar não é excluir: a OS arquivada mais nova de cada
+    # máquina do lote volta a valer se for mais nova que a da linha (o cliente atual não regride).
+    conn.execute(f"""
+        INSERT INTO main.maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+        SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento FROM (
+            SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento,
+                   row_number() OVER (PARTITION BY maquina_id ORDER BY data_abertura DESC, id DESC) AS posicao
+            FROM {ALIAS}.OrdemDeServico
+            WHERE id IN (SELECT id FROM {ALIAS}.lote_pendente) AND maquina_id IS NOT NULL)
+        WHERE posicao = 1
+        ON CONFLICT (maquina_id) DO UPDATE SET
+            os_id = excluded.os_id, cliente_id = excluded.cliente_id,
+            data_abertura = excluded.data_abertura, data_faturamento = excluded.data_faturamento
+        WHERE (coalesce(excluded.data_abertura, ''), excluded.os_id)
+            >= (coalesce(maquina_ultima_os.data_abertura, ''), maquina_ultima_os.os_id)
+    """)
+
+
+def _copiar_lote(conn, data_corte, tamanho_lote):
+    # 1ª transação do lote. O lote anterior já foi excluído (transação confirmada antes desta).
+    conn.execute(f"DELETE FROM {ALIAS}.lote_pendente")
+    ids = [linha[0] for linha in conn.execute("""
+        SELECT id FROM main.OrdemDeServico
+        WHERE data_faturamento IS NOT NULL AND data_faturamento < ?
+        ORDER BY data_faturamento LIMIT ?
+    """, (data_corte, tamanho_lote))]
+    if ids:
+        marcadores = ", ".join("?" for _ in ids)
+        # OR REPLACE: após uma queda entre as duas transações, a cópia é refeita com o valor atual
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {ALIAS}.OrdemDeServico ({_LISTA_COLUNAS})
+            SELECT {_LISTA_COLUNAS} FROM main.OrdemDeServico WHERE id IN ({marcadores})
+        """, ids)
+        conn.executemany(f"INSERT INTO {ALIAS}.lote_pendente (id) VALUES (?)", [(id_,) for id_ in ids])
+    return len(ids)
+
+
+def arquivar(data_corte, tamanho_lote=TAMANHO_LOTE, ao_progredir=None):
+    # Move para o arquivo as OS faturadas antes de data_corte ('AAAA-MM-DD'). Retorna quantas moveu.
+    from controllers import db_pool
+    if not db_pool.BANCO_SQLITE:
+        raise RuntimeError("O arquivo de OS é um banco SQLite anexado; não se aplica a OS_DATABASE_URL de servidor.")
+    pool = db_pool.get_pool()
+    criar_arquivo(pool.arquivo_path)
+    movidas = db_pool.escrever(_excluir_pendentes) # Termina um lote interrompido
+    while True:
+        copiadas = db_pool.escrever(lambda conn: _copiar_lote(conn, data_corte, tamanho_lote))
+        if not copiadas:
+            # Estatísticas do arquivo: sem elas o planejador ordena o lado do arquivo da view
+            # com uma B-tree temporária em vez de percorrer idx_arq_faturamento
+            db_pool.escrever(lambda conn: conn.execute(f"ANALYZE {ALIAS}"))
+            return movidas
+        movidas += db_pool.escrever(_excluir_pendentes)
+        if ao_progredir is not None:
+            ao_progredir(movidas)
+
+
+def compactar(caminho):
+    # VACUUM só do arquivo; as leituras em andamento (WAL) não são bloqueadas
+    conn = sqlite3.connect(caminho)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def copiar(caminho, destino):
+    # Cópia consistente do arquivo (API de backup do SQLite), sem parar o app
+    origem = sqlite3.connect(caminho)
+    copia = sqlite3.connect(destino)
+    try:
+        origem.backup(copia)
+    finally:
+        copia.close()
+        origem.close()
+
+
+if __name__ == "__main__":
+    from controllers import db_pool
+    parser = argparse.ArgumentParser(description="Move as OS faturadas antigas para o banco de arquivo.")
+    parser.add_argument("--antes-de", type=date.fromisoformat,
+                        help="Arquiva as OS faturadas antes desta data (AAAA-MM-DD)")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    parser.add_argument("--compactar", action="store_true", help="VACUUM do arquivo ao final")
+    parser.add_argument("--copiar-para", help="Grava uma cópia do arquivo neste caminho ao final")
+    args = parser.parse_args()
+
+    caminho = db_pool.get_pool().arquivo_path
+    if args.antes_de:
+        total = arquivar(args.antes_de.isoformat(), args.lote, lambda movidas: print(f"{movidas} OS arquivadas...", end="\r"))
+        print(f"{total} OS faturadas antes de {args.antes_de:%d/%m/%Y} movidas para {caminho}.")
+    if args.compactar:
+        compactar(caminho)
+    if args.copiar_para:
+        copiar(caminho, args.copiar_para)
+    db_pool.get_pool().fechar_tudo()
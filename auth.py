@@ -1,22 +1,22 @@
 import streamlit as st
-import sqlite3
-import os
+from sqlalchemy import select
+from controllers import db_pool
+from controllers import banco
+from controllers import tabelas
 
 def conectar():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(base_dir, "..", "database", "db.sqlite3")
-    return sqlite3.connect(db_path)
+    # Conexão do pool (WAL + pragmas já aplicados); conn.close() a devolve ao pool
+    return db_pool.conectar()
 
 def login():
     st.title("Login")
     email = st.text_input("E-mail")
     senha = st.text_input("Senha", type="password")
     if st.button("Entrar"):
-        conn = conectar()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, nome, permissao FROM Consultor WHERE email = ? AND senha = ?", (email, senha))
-        resultado = cursor.fetchone()
-        conn.close()
+        consultor = tabelas.consultor
+        with banco.conectar() as conexao:
+            resultado = conexao.execute(select(consultor.c.id, consultor.c.nome, consultor.c.permissao)
+                                        .where(consultor.c.email == email, consultor.c.senha == senha)).first()
         if resultado:
             st.session_state.logged_in = True
             st.session_state.usuario = {
@@ -0,0 +1,264 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# --- Benchmark repetível das consultas e transformações das páginas ---
+# Mede (1) as funções reais que as páginas chamam e (2) cada página inteira rodando no AppTest
+# do Streamlit, com cache frio e quente. O resultado vai para JSON; --comparar aponta regressões
+# em relação a um JSON anterior (ex.: gerado na versão anterior do app, no mesmo banco sintético).
+#
+# Uso:
+#   python gerar_dados.py --ordens 100k --saida database/bench_100k.sqlite3 --hoje 2026-01-01
+#   python benchmark.py --banco database/bench_100k.sqlite3 --saida bench.json [--comparar anterior.json]
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(base_dir, "app.py")
+
+REPETICOES_PADRAO = 5
+LIMIAR_REGRESSAO = 1.20 # Mediana 20% mais lenta que a referência = regressão
+USUARIO_SUPERVISOR = {"id": 1, "nome": "Admin Teste", "permissao": "supervisor"} # id 1 no banco sintético
+
+_CENARIOS = [] # (nome, função sem argumentos)
+
+
+def cenario(nome):
+    def registrar(funcao):
+        _CENARIOS.append((nome, funcao))
+        return funcao
+    return registrar
+
+
+def _medir(funcao, repeticoes):
+    funcao() # Aquecimento: imports, page cache do SQLite, statements preparados
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        "repeticoes": repeticoes,
+        "min_ms": round(tempos[0], 3),
+        "mediana_ms": round(statistics.median(tempos), 3),
+        "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+        "max_ms": round(tempos[-1], 3),
+    }
+
+
+def _registrar_cenarios():
+    # Imports aqui dentro: o db_pool já precisa estar apontando para o banco do benchmark
+    from controllers import db_pool, banco, consultas_os, consultas_faturadas, salvar_os, busca_fts, exportar
+    from controllers import consultas_maquinas, tabelas
+    from sqlalchemy import select
+    from controllers import cache_consultas, cache_dimensoes
+    from app_pages import Dashboard
+
+    def com_conexao(funcao):
+        # Conexão do sqlite3 (busca FTS5, gravação)
+        def executar():
+            conn = db_pool.conectar()
+            try:
+                return funcao(conn)
+            finally:
+                conn.close()
+        return executar
+
+    def com_conexao_banco(funcao):
+        # Connection do SQLAlchemy (consultas em Core)
+        def executar():
+            with banco.conectar() as conexao:
+                return funcao(conexao)
+        return executar
+
+    # --- Dashboard ---
+    cenario("dashboard.resumo_status")(lambda: Dashboard.carregar_resumo_os_aberto.funcao(None, False))
+    cenario("dashboard.resumo_status_mais_30_dias")(lambda: Dashboard.carregar_resumo_os_aberto.funcao(None, True))
+    cenario("dashboard.resumo_status_consultor")(lambda: Dashboard.carregar_resumo_os_aberto.funcao(3, False))
+
+    # --- Faturadas (ano mais recente e histórico completo) ---
+    ano = banco.escalar(consultas_faturadas.query_anos_faturados()) or datetime.now().year
+    for rotulo, filtros in [("ano", (ano, None)), ("tudo", (None, None))]:
+        condicoes = consultas_faturadas.filtros_faturadas(*filtros)
+        cenario(f"faturadas.mensal_{rotulo}")(com_conexao_banco(
+            lambda conexao, condicoes=condicoes: banco.linhas(consultas_faturadas.query_faturadas_mensal(condicoes), conexao)))
+        cenario(f"faturadas.anual_{rotulo}")(com_conexao_banco(
+            lambda conexao, condicoes=condicoes: banco.linhas(consultas_faturadas.query_faturadas_anual(condicoes), conexao)))
+        cenario(f"faturadas.kpis_{rotulo}")(com_conexao_banco(
+            lambda conexao, condicoes=condicoes: banco.linhas(consultas_faturadas.query_faturadas_kpis(condicoes), conexao)))
+    condicoes_ano = consultas_faturadas.filtros_faturadas(ano, None)
+    cenario("faturadas.exportar_csv_ano")(lambda: exportar.arquivo_csv(consultas_faturadas.query_faturadas_exportacao(condicoes_ano)))
+
+    # --- Ordens em aberto: primeira página, 5 páginas via keyset e contagem ---
+    def paginas_os_aberto(conexao, paginas=5):
+        apos = None
+        for _ in range(paginas):
+            df, tem_proxima = consultas_os.query_os_aberto_pagina(conexao, 50, apos=apos)
+            if not tem_proxima:
+                break
+            apos = consultas_os.chave_keyset(df)
+        return consultas_os.contar_os_aberto(conexao)
+
+    cenario("ordens.primeira_pagina")(com_conexao_banco(lambda conexao: consultas_os.query_os_aberto_pagina(conexao, 50)))
+    cenario("ordens.cinco_paginas_e_contagem")(com_conexao_banco(paginas_os_aberto))
+    cenario("ordens.filtro_cliente")(com_conexao_banco(lambda conexao: consultas_os.query_os_aberto_pagina(conexao, 50, cliente_nome="JOSE")))
+
+    # --- Salvamento do editor: diff + gravação de uma página inteira, desfeita no fim ---
+    with banco.conectar() as conexao:
+        df_pagina, _ = consultas_os.query_os_aberto_pagina(conexao, 50)
+    df_editado = df_pagina.copy()
+    df_editado["status_descricao"] = df_editado["status_descricao"].map(lambda s: "SUBMETIDA" if s == "APROVADA" else "APROVADA")
+    df_editado["descricao_servico"] = df_editado["descricao_servico"] + " (revisado)"
+
+    def salvar_editor():
+        alteracoes, _ = salvar_os.preparar_alteracoes(df_pagina, df_editado, True)
+        conn = db_pool.conectar()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            salvar_os.aplicar_alteracoes(conn, alteracoes)
+        finally:
+            conn.rollback() # O banco do benchmark não muda entre repetições
+            conn.close()
+
+    cenario("ordens.preparar_alteracoes")(lambda: salvar_os.preparar_alteracoes(df_pagina, df_editado, True))
+    cenario("ordens.salvar_pagina")(salvar_editor)
+
+    # --- Máquinas: inventário inteiro (uma linha por chassi) e distribuição por tipo ---
+    cenario("maquinas.inventario")(com_conexao_banco(
+        lambda conexao: banco.ler_df(consultas_maquinas.query_inventario(), conexao)))
+    cenario("maquinas.por_tipo")(com_conexao_banco(
+        lambda conexao: banco.ler_df(consultas_maquinas.query_maquinas_por_tipo(), conexao)))
+
+    # Como a página: 5 páginas via keyset (chassi) e contagem, sem filtro e só de um tipo minoritário
+    def paginas_inventario(conexao, tipo_maquina_id=None, paginas=5):
+        apos = None
+        for _ in range(paginas):
+            df, tem_proxima = consultas_maquinas.query_inventario_pagina(conexao, 50, apos=apos,
+                                                                        tipo_maquina_id=tipo_maquina_id)
+            if not tem_proxima:
+                break
+            apos = consultas_maquinas.chave_keyset(df)
+        return consultas_maquinas.contar_inventario(conexao, tipo_maquina_id)
+
+    tipo_pulverizador = banco.escalar(select(tabelas.tipo_maquina.c.id).where(tabelas.tipo_maquina.c.descricao == "Pulverizador"))
+    cenario("maquinas.pagina")(com_conexao_banco(paginas_inventario))
+    cenario("maquinas.filtro_tipo")(com_conexao_banco(
+        lambda conexao: paginas_inventario(conexao, tipo_maquina_id=tipo_pulverizador)))
+
+    # --- Busca ---
+    cenario("busca.fts")(com_conexao(lambda conn: (busca_fts.contar_resultados(conn, "silva"),
+                                                    busca_fts.buscar_os(conn, "silva"))))
+
+    # --- Páginas inteiras (AppTest): cache frio e quente ---
+    from controllers import registro_paginas
+    from streamlit.testing.v1 import AppTest
+    # Sem o aviso de "missing ScriptRunContext" a cada página (o AppTest roda fora do 'streamlit run')
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+
+    def rodar_pagina(titulo, frio):
+        def executar():
+            if frio:
+                cache_consultas.invalidar_tudo()
+                cache_dimensoes.invalidar_tudo()
+            at = AppTest.from_file(APP_PATH, default_timeout=600)
+            at.session_state.logged_in = True
+            at.session_state.usuario = USUARIO_SUPERVISOR
+            at.session_state.current_page = titulo
+            at.run()
+            if at.exception:
+                raise RuntimeError(f"Página '{titulo}' falhou: {at.exception[0].value}")
+        return executar
+
+    for titulo, modulo in registro_paginas.PAGINAS.items():
+        nome = modulo.split(".")[-1].lower()
+        cenario(f"pagina.{nome}.fria")(rodar_pagina(titulo, frio=True))
+        cenario(f"pagina.{nome}.quente")(rodar_pagina(titulo, frio=False))
+
+
+def _metadados(banco):
+    conn = sqlite3.connect(banco)
+    try:
+        ordens, abertas = conn.execute(
+            "SELECT COUNT(*), SUM(data_faturamento IS NULL) FROM OrdemDeServico").fetchone()
+        versao_schema = conn.execute("SELECT MAX(versao) FROM schema_version").fetchone()[0]
+    finally:
+        conn.close()
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=base_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "banco": os.path.abspath(banco),
+        "ordens": ordens,
+        "ordens_abertas": abertas,
+        "versao_schema": versao_schema,
+        "sqlite": sqlite3.sqlite_version,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+    }
+
+
+def executar(banco, repeticoes=REPETICOES_PADRAO, filtro=None):
+    from controllers import db_pool
+    os.environ["OS_DB_PATH"] = os.path.abspath(banco)
+    db_pool.usar_banco(os.path.abspath(banco))
+    from controllers import migracoes
+    migracoes.garantir_schema() # Banco gerado por uma versão anterior também serve
+
+    _registrar_cenarios()
+    resultados = {}
+    for nome, funcao in _CENARIOS:
+        if filtro and filtro not in nome:
+            continue
+        resultados[nome] = _medir(funcao, repeticoes)
+        print(f"{nome:45s} mediana {resultados[nome]['mediana_ms']:10.2f} ms", flush=True)
+    return {"metadados": _metadados(banco), "resultados": resultados}
+
+
+def comparar(atual, referencia, limiar=LIMIAR_REGRESSAO):
+    # Retorna a lista de cenários cuja mediana piorou além do limiar
+    regressoes = []
+    print(f"\n{'cenário':45s} {'ref (ms)':>10s} {'atual (ms)':>11s} {'razão':>7s}")
+    for nome, medida in atual["resultados"].items():
+        anterior = referencia["resultados"].get(nome)
+        if not anterior:
+            continue
+        razao = medida["mediana_ms"] / anterior["mediana_ms"] if anterior["mediana_ms"] else float("inf")
+        marca = " ⚠️" if razao > limiar else ""
+        print(f"{nome:45s} {anterior['mediana_ms']:10.2f} {medida['mediana_ms']:11.2f} {razao:7.2f}{marca}")
+        if razao > limiar:
+            regressoes.append(nome)
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das consultas e páginas do app.")
+    parser.add_argument("--banco", required=True, help="Banco a medir (ex.: gerado por gerar_dados.py)")
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO)
+    parser.add_argument("--filtro", help="Só cenários cujo nome contém este texto")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior, para apontar regressões")
+    parser.add_argument("--limiar", type=float, default=LIMIAR_REGRESSAO)
+    args = parser.parse_args()
+
+    relatorio = executar(args.banco, args.repeticoes, args.filtro)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        print(f"✅ Resultados gravados em {args.saida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            regressoes = comparar(relatorio, json.load(arquivo), args.limiar)
+        if regressoes:
+            print(f"❌ {len(regressoes)} cenário(s) mais lento(s) que a referência: {', '.join(regressoes)}")
+            sys.exit(1)
@@ -0,0 +1,100 @@
+from sqlalchemy import select, func, case, and_, or_, text, column
+from controllers import banco
+from controllers import busca_fts
+from controllers import consultas_os
+from controllers import tabelas
+
+# --- Busca de clientes por digitação e listagem paginada ---
+# Nenhuma das duas carrega a tabela Cliente inteira. A busca usa a tabela FTS5 'busca_cliente'
+# (uma linha por cliente, rowid = Cliente.id, mantida por triggers, migração 10). Cada palavra
+# digitada vale como prefixo, sem diferenciar maiúsculas nem acentos ("joao sil" acha
+# "João da Silva"). Só as LIMITE_SUGESTOES primeiras voltam, com os nomes que começam pelo termo
+# na frente. A listagem da página de Clientes é paginada por keyset em (nome, id), pelo índice
+# idx_cliente_nome; o mesmo índice atende a conferência de nome repetido no cadastro.
+
+LIMITE_SUGESTOES = 10
+MIN_CARACTERES = 2 # O menor prefixo indexado no FTS5; com menos a busca percorreria o índice todo
+TAMANHOS_PAGINA = [25, 50, 100]
+
+cliente = tabelas.cliente
+
+
+def condicao_busca(termo):
+    # Condição (SQLAlchemy Core) sobre Cliente para o termo digitado; None quando não há o que buscar
+    if not banco.SQLITE:
+        # No servidor não há a tabela FTS5: começo do nome, sem diferenciar maiúsculas
+        if not (termo or "").strip():
+            return None
+        return func.lower(cliente.c.nome).like(consultas_os.padrao_prefixo(termo.lower()), escape='\\')
+    consulta = busca_fts.montar_consulta_fts(termo)
+    if not consulta:
+        return None
+    ids = (text("SELECT rowid FROM busca_cliente WHERE busca_cliente MATCH :consulta_cliente")
+           .bindparams(consulta_cliente=consulta)
+           .columns(column("rowid")))
+    return cliente.c.id.in_(ids)
+
+
+def _cpf_exibicao():
+    return case((cliente.c.cpf.like("TEMP_CPF_%"), None), else_=cliente.c.cpf).label("cpf")
+
+
+def sugerir(termo, limite=LIMITE_SUGESTOES, conexao=None):
+    # Até 'limite' clientes (id, nome, cpf, telefone) para o termo; [] com menos de MIN_CARACTERES
+    if len((termo or "").strip()) < MIN_CARACTERES:
+        return []
+    condicao = condicao_busca(termo)
+    if condicao is None:
+        return []
+    comeca_com = cliente.c.nome.like(consultas_os.padrao_prefixo(termo), escape='\\')
+    query = (select(cliente.c.id, cliente.c.nome, _cpf_exibicao(), cliente.c.telefone)
+             .where(condicao)
+             .order_by(case((comeca_com, 0), else_=1), cliente.c.nome, cliente.c.id)
+             .limit(limite))
+    return banco.linhas(query, conexao)
+
+
+def rotulo(sugestao):
+    # Texto de uma sugestão no selectbox: o nome e, quando houver, CPF e telefone para desempatar homônimos
+    detalhes = [f"CPF {sugestao.cpf}" if sugestao.cpf else None,
+                f"Tel. {sugestao.telefone}" if sugestao.telefone else None]
+    detalhes = " · ".join(d for d in detalhes if d)
+    return f"{sugestao.nome} ({detalhes}) #{sugestao.id}" if detalhes else f"{sugestao.nome} #{sugestao.id}"
+
+
+def nome_novo_cliente(termo):
+    # Nome para cadastrar um cliente a partir do termo buscado, ou None quando o termo não tem
+    # letras (CPF, telefone): virariam o nome do cliente
+    nome = (termo or "").strip()
+    return nome if any(caractere.isalpha() for caractere in nome) else None
+
+
+def _condicoes_listagem(termo):
+    condicao = condicao_busca(termo) if termo else None
+    return [condicao] if condicao is not None else []
+
+
+def contar_clientes(conexao, termo=None):
+    return banco.escalar(select(func.count()).select_from(cliente).where(*_condicoes_listagem(termo)), conexao)
+
+
+def query_clientes_pagina(conexao, tamanho_pagina, apos=None, termo=None):
+    # Uma página da listagem em ordem de nome. 'apos' é a chave (nome, id) da última linha da
+    # página anterior; busca uma linha a mais só para saber se existe próxima página.
+    condicoes = _condicoes_listagem(termo)
+    if apos is not None:
+        nome_ultimo, id_ultimo = apos
+        condicoes.append(or_(cliente.c.nome > nome_ultimo,
+                             and_(cliente.c.nome == nome_ultimo, cliente.c.id > id_ultimo)))
+    consulta = (select(cliente.c.id, cliente.c.nome, cliente.c.cpf, cliente.c.telefone)
+                .where(*condicoes)
+                .order_by(cliente.c.nome, cliente.c.id)
+                .limit(tamanho_pagina + 1))
+    df = banco.ler_df(consulta, conexao)
+    tem_proxima = len(df) > tamanho_pagina
+    return df.iloc[:tamanho_pagina], tem_proxima
+
+
+def chave_keyset(df_pagina):
+    ultima = df_pagina.iloc[-1]
+    return (ultima['nome'], int(ultima['id']))
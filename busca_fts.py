@@ -0,0 +1,157 @@
+import re
+import pandas as pd
+from controllers import arquivo_os
+
+# --- Busca textual (FTS5) de Ordens de Serviço ---
+# A tabela virtual 'busca_os' tem uma linha por OS (rowid = OrdemDeServico.id) com os textos
+# da OS, do cliente e do modelo. Ela é mantida por triggers (migração 5), então a busca nunca
+# precisa carregar as tabelas inteiras para filtrar no Python.
+#
+# As OS arquivadas (ver arquivo_os) continuam no índice: a exclusão do banco principal dispara
+# trg_busca_os_delete, e o próprio lote as reindexa a partir do arquivo (indexar_arquivadas). Como
+# triggers permanentes não podem citar o banco anexado, as mudanças de cliente/modelo/máquina e de
+# OS arquivadas são acompanhadas por triggers TEMP criados em cada conexão que anexa o arquivo
+# (criar_triggers_arquivo). A busca junta os dois lados (situação 'Arquivada').
+
+RESULTADOS_POR_PAGINA = 20
+
+# Colunas de 'busca_os', na ordem da tabela virtual
+COLUNAS_FTS = ["numero_os", "descricao_servico", "cliente_nome", "cliente_cpf",
+               "cliente_telefone", "modelo_nome", "chassi", "chassi_final"]
+
+# Pesos do bm25 por coluna (mesma ordem de COLUNAS_FTS): número da OS e chassi pesam mais
+PESOS_BM25 = [10.0, 1.0, 5.0, 5.0, 5.0, 2.0, 8.0, 8.0]
+
+# Linhas de 'busca_os' a partir de OrdemDeServico. CPFs temporários (TEMP_CPF_...) não são indexados.
+# 'chassi_final' guarda os 6 últimos caracteres: o balcão costuma buscar pelo final do chassi.
+# O chassi é o da máquina da OS. São as linhas dos triggers da migração 13 (migracoes.py): mudar
+# o que o índice guarda pede uma migração nova, não uma edição aqui.
+SELECT_LINHAS_BUSCA = """
+    SELECT os.id, os.numero_os, os.descricao_servico, c.nome,
+           CASE WHEN c.cpf LIKE 'TEMP_CPF_%' THEN NULL ELSE c.cpf END,
+           c.telefone, m.nome_modelo, maq.chassi, substr(maq.chassi, -6)
+    FROM OrdemDeServico os
+    LEFT JOIN Cliente c ON c.id = os.cliente_id
+    LEFT JOIN Modelo m ON m.id = os.modelo_id
+    LEFT JOIN Maquina maq ON maq.id = os.maquina_id
+"""
+# Colunas de OrdemDeServico e das tabelas ligadas que, ao mudar, reindexam a OS
+COLUNAS_OS_BUSCA = "numero_os, descricao_servico, cliente_id, modelo_id, maquina_id"
+RELACIONADAS_BUSCA = [("Cliente", "cliente_id", "nome, cpf, telefone"),
+                      ("Modelo", "modelo_id", "nome_modelo"),
+                      ("Maquina", "maquina_id", "chassi")]
+
+INSERT_BUSCA = f"INSERT INTO busca_os (rowid, {', '.join(COLUNAS_FTS)})"
+
+# As mesmas linhas a partir das OS arquivadas
+SELECT_LINHAS_BUSCA_ARQUIVO = SELECT_LINHAS_BUSCA.replace(
+    "FROM OrdemDeServico os", f"FROM {arquivo_os.ALIAS}.OrdemDeServico os")
+
+
+def indexar_arquivadas(conn, ids_sql=None):
+    # (Re)indexa as OS do arquivo: todas, ou as de ids_sql (um SELECT de ids). Apaga antes de inserir,
+    # então pode repetir um lote já reindexado (ver arquivo_os._excluir_pendentes).
+    filtro = f" WHERE os.id IN ({ids_sql})" if ids_sql else ""
+    conn.execute(f"DELETE FROM busca_os WHERE rowid IN (SELECT os.id FROM {arquivo_os.ALIAS}.OrdemDeServico os{filtro})")
+    conn.execute(f"{INSERT_BUSCA} {SELECT_LINHAS_BUSCA_ARQUIVO}{filtro}")
+
+
+def criar_triggers_arquivo(conn):
+    # Triggers TEMP da conexão que anexou o arquivo (só eles podem citar outro banco). Só depois da
+    # migração 13: antes dela o índice guarda o chassi do modelo e as OS arquivadas não são indexadas.
+    if not conn.execute("SELECT 1 FROM main.sqlite_master WHERE name = 'trg_busca_os_maquina_update'").fetchone():
+        return
+    alias = arquivo_os.ALIAS
+    conn.execute(f"""
+        CREATE TEMP TRIGGER IF NOT EXISTS trg_arquivo_busca_os_update
+        AFTER UPDATE OF {COLUNAS_OS_BUSCA} ON {alias}.OrdemDeServico
+        BEGIN
+            DELETE FROM busca_os WHERE rowid = old.id;
+            {INSERT_BUSCA} {SELECT_LINHAS_BUSCA_ARQUIVO} WHERE os.id = new.id;
+        END
+    """)
+    for tabela, coluna_fk, colunas in RELACIONADAS_BUSCA:
+        conn.execute(f"""
+            CREATE TEMP TRIGGER IF NOT EXISTS trg_arquivo_busca_os_{tabela.lower()}_update
+            AFTER UPDATE OF {colunas} ON main.{tabela}
+            BEGIN
+                DELETE FROM busca_os WHERE rowid IN (SELECT id FROM {alias}.OrdemDeServico WHERE {coluna_fk} = new.id);
+                {INSERT_BUSCA} {SELECT_LINHAS_BUSCA_ARQUIVO} WHERE os.{coluna_fk} = new.id;
+            END
+        """)
+
+
+def montar_consulta_fts(termo):
+    # Cada palavra digitada vira um prefixo entre aspas ("joao"* "silva"*), todas obrigatórias.
+    # As aspas neutralizam operadores do FTS5 (AND, OR, NEAR, -, :) digitados pelo usuário.
+    palavras = re.findall(r"\w+", termo or "")
+    return " ".join(f'"{palavra}"*' for palavra in palavras)
+
+
+def _filtro_consultor(consultor_id):
+    if consultor_id is None:
+        return "", []
+    return " AND os.consultor_id = ?", [consultor_id]
+
+
+def _tabelas_os(conn):
+    # (tabela, situação fixa ou None): o arquivo só tem OS faturadas
+    tabelas = [("main.OrdemDeServico", None)]
+    if arquivo_os.anexado(conn):
+        tabelas.append((f"{arquivo_os.ALIAS}.OrdemDeServico", "Arquivada"))
+    return tabelas
+
+
+def contar_resultados(conn, termo, consultor_id=None):
+    consulta = montar_consulta_fts(termo)
+    if not consulta:
+        return 0
+    filtro, params = _filtro_consultor(consultor_id)
+    total = 0
+    for tabela, _ in _tabelas_os(conn):
+        query = f"""
+        SELECT COUNT(*)
+        FROM busca_os JOIN {tabela} os ON os.id = busca_os.rowid
+        WHERE busca_os MATCH ?{filtro}
+        """
+        total += conn.execute(query, [consulta] + params).fetchone()[0]
+    return total
+
+
+def buscar_os(conn, termo, pagina=1, por_pagina=RESULTADOS_POR_PAGINA, consultor_id=None):
+    # Retorna um DataFrame com os resultados da página, do mais relevante para o menos relevante.
+    # Com o arquivo anexado, cada lado é uma consulta (UNION ALL), como no histórico do chassi.
+    consulta = montar_consulta_fts(termo)
+    if not consulta:
+        return pd.DataFrame()
+    filtro, params = _filtro_consultor(consultor_id)
+    partes, params_partes = [], []
+    for tabela, situacao in _tabelas_os(conn):
+        situacao_sql = (f"'{situacao}'" if situacao else
+                        "CASE WHEN os.data_faturamento IS NULL THEN 'Em aberto' ELSE 'Faturada' END")
+        partes.append(f"""
+        SELECT
+            os.numero_os,
+            {situacao_sql} AS situacao,
+            c.nome AS cliente,
+            m.nome_modelo AS modelo,
+            maq.chassi,
+            s.descricao AS status,
+            con.nome AS consultor,
+            os.data_abertura,
+            os.data_faturamento,
+            os.descricao_servico,
+            bm25(busca_os, {', '.join(str(p) for p in PESOS_BM25)}) AS relevancia
+        FROM busca_os
+        JOIN {tabela} os ON os.id = busca_os.rowid
+        JOIN Cliente c ON os.cliente_id = c.id
+        JOIN Modelo m ON os.modelo_id = m.id
+        JOIN Consultor con ON os.consultor_id = con.id
+        JOIN Status s ON os.status_id = s.id
+        LEFT JOIN Maquina maq ON os.maquina_id = maq.id
+        WHERE busca_os MATCH ?{filtro}
+        """)
+        params_partes += [consulta] + params
+    query = " UNION ALL ".join(partes) + " ORDER BY relevancia LIMIT ? OFFSET ?"
+    df = pd.read_sql_query(query, conn, params=params_partes + [por_pagina, (pagina - 1) * por_pagina])
+    return df.drop(columns="relevancia")
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from controllers import banco
+from controllers.tabelas import tabela_revisao
+
+# --- Cache de resultados de consultas, versionado pelas revisões das tabelas ---
+# Substitui st.cache_data + .clear(): a chave de cada entrada inclui a revisão (tabela_revisao)
+# de cada tabela de que a consulta depende. Um INSERT/UPDATE/DELETE troca a revisão via trigger,
+# então só os caches que leem aquela tabela recarregam — e só na próxima leitura.
+# As entradas são compartilhadas entre sessões: quem chama NÃO deve modificar o resultado.
+
+TTL_PADRAO_S = 300
+MAX_ENTRADAS_PADRAO = 64
+
+_REGISTRADOS = []
+
+
+class VersionedCache:
+
+    def __init__(self, funcao, tabelas, ttl_s=TTL_PADRAO_S, max_entradas=MAX_ENTRADAS_PADRAO):
+        self.funcao = funcao
+        self.nome = funcao.__name__
+        self.tabelas = list(tabelas)
+        self.ttl_s = ttl_s
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict() # chave -> (revisões, criado_em, valor), em ordem de uso (LRU)
+        self._lock = threading.Lock()
+        self._consulta_revisoes = select(tabela_revisao.c.tabela, tabela_revisao.c.revisao).where(
+            tabela_revisao.c.tabela.in_(self.tabelas))
+        self.hits = 0
+        self.misses = 0
+        self.invalidadas = 0 # Revisão de alguma tabela mudou
+        self.expiradas = 0 # Passou do TTL
+        self.descartadas = 0 # Removidas por max_entradas
+
+    def _ler_revisoes(self):
+        revisoes = dict(banco.linhas(self._consulta_revisoes))
+        return tuple(revisoes.get(tabela) for tabela in self.tabelas)
+
+    def __call__(self, *args, **kwargs):
+        chave = (args, tuple(sorted(kwargs.items())))
+        # A revisão é lida ANTES da consulta: se alguém gravar no meio, a entrada fica marcada com a
+        # revisão antiga e é recarregada na próxima leitura (nunca o contrário).
+        revisoes = self._ler_revisoes()
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                revisoes_entrada, criado_em, valor = entrada
+                if revisoes_entrada == revisoes and agora - criado_em < self.ttl_s:
+                    self._entradas.move_to_end(chave)
+                    self.hits += 1
+                    return valor
+                if revisoes_entrada != revisoes:
+                    self.invalidadas += 1
+                else:
+                    self.expiradas += 1
+                del self._entradas[chave]
+            self.misses += 1
+
+        valor = self.funcao(*args, **kwargs)
+
+        with self._lock:
+            self._entradas[chave] = (revisoes, agora, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.descartadas += 1
+        return valor
+
+    def invalidar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self):
+        total = self.hits + self.misses
+        return {
+            "cache": self.nome,
+            "tabelas": ", ".join(self.tabelas),
+            "entradas": len(self._entradas),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidadas": self.invalidadas,
+            "expiradas": self.expiradas,
+            "descartadas": self.descartadas,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def versionado(tabelas, ttl_s=TTL_PADRAO_S, max_entradas=MAX_ENTRADAS_PADRAO):
+    # Uso: @cache_consultas.versionado(["Consultor"]) sobre uma função de módulo (argumentos hasháveis)
+    def decorador(funcao):
+        cache = VersionedCache(funcao, tabelas, ttl_s, max_entradas)
+        _REGISTRADOS.append(cache)
+        return cache
+    return decorador
+
+
+def estatisticas():
+    return [cache.estatisticas() for cache in _REGISTRADOS]
+
+
+def invalidar_tudo():
+    for cache in _REGISTRADOS:
+        cache.invalidar()
@@ -0,0 +1,106 @@
+import threading
+import time
+
+# --- Cache em memória das tabelas de dimensão (Status, TipoMaquina, Modelo, Consultor) ---
+# Chave (descrição/nome) -> id, carregado sob demanda e compartilhado por todas as sessões.
+# A validade é controlada pela tabela 'tabela_revisao', cuja revisão é trocada por triggers
+# a cada INSERT/UPDATE/DELETE relevante (migração 4). Um miss SEMPRE consulta o banco,
+# então o cache nunca responde "não existe" com base em dado velho.
+
+INTERVALO_VALIDACAO_S = 1.0 # Intervalo mínimo entre leituras da revisão (para hits)
+
+
+class DimensionCache:
+
+    def __init__(self, tabela, sql_carga):
+        self.tabela = tabela
+        self.sql_carga = sql_carga # SELECT que devolve (chave..., id) — a última coluna é o id
+        self._mapa = None
+        self._revisao = None
+        self._validado_em = 0.0
+        self._forcar_validacao = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recargas = 0
+
+    def _ler_revisao(self, cursor):
+        cursor.execute("SELECT revisao FROM tabela_revisao WHERE tabela = ?", (self.tabela,))
+        resultado = cursor.fetchone()
+        return resultado[0] if resultado else None
+
+    def _carregar(self, cursor, revisao):
+        cursor.execute(self.sql_carga)
+        mapa = {}
+        for linha in cursor.fetchall():
+            chave = linha[0] if len(linha) == 2 else tuple(linha[:-1])
+            mapa[chave] = linha[-1]
+        self._mapa = mapa
+        self._revisao = revisao
+        self.recargas += 1
+
+    def _validar(self, cursor):
+        agora = time.monotonic()
+        if self._mapa is not None and not self._forcar_validacao and agora - self._validado_em < INTERVALO_VALIDACAO_S:
+            return
+        revisao = self._ler_revisao(cursor)
+        if self._mapa is None or revisao != self._revisao:
+            self._carregar(cursor, revisao)
+        self._validado_em = agora
+        self._forcar_validacao = False
+
+    def obter(self, cursor, chave):
+        with self._lock:
+            self._validar(cursor)
+            id_ = self._mapa.get(chave)
+            if id_ is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return id_
+
+    def registrar(self, cursor, chave, id_, inserido=False):
+        # Chamado após encontrar no banco (miss) ou inserir. O mapa fica sempre associado a UMA revisão:
+        # - encontrado no banco: se a revisão mudou desde a carga, recarrega tudo;
+        # - inserido agora: a troca de revisão é a do nosso próprio INSERT, então só adota a nova.
+        # A próxima leitura revalida, o que descarta entradas de transações que acabaram em rollback.
+        with self._lock:
+            revisao = self._ler_revisao(cursor)
+            if self._mapa is None or (revisao != self._revisao and not inserido):
+                self._carregar(cursor, revisao)
+            self._mapa[chave] = id_
+            self._revisao = revisao
+            self._forcar_validacao = True
+
+    def invalidar(self):
+        with self._lock:
+            self._mapa = None
+            self._revisao = None
+
+    def estatisticas(self):
+        total = self.hits + self.misses
+        return {
+            "tabela": self.tabela,
+            "entradas": len(self._mapa) if self._mapa is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "recargas": self.recargas,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+status = DimensionCache("Status", "SELECT descricao, id FROM Status")
+tipos_maquina = DimensionCache("TipoMaquina", "SELECT descricao, id FROM TipoMaquina")
+modelos = DimensionCache("Modelo", "SELECT nome_modelo, tipo_maquina_id, id FROM Modelo")
+consultores = DimensionCache("Consultor", "SELECT nome, id FROM Consultor ORDER BY id DESC") # Nome repetido: vale o menor id
+
+TODOS = [status, tipos_maquina, modelos, consultores]
+
+
+def estatisticas():
+    return [cache.estatisticas() for cache in TODOS]
+
+
+def invalidar_tudo():
+    for cache in TODOS:
+        cache.invalidar()
@@ -0,0 +1,114 @@
+import os
+from datetime import date
+from sqlalchemy import select, func, cast, String
+from controllers import banco
+from controllers import db_pool
+from controllers import consultas_os
+from controllers import tabelas
+
+# --- Filtros de período das OS faturadas ---
+# Ano e ano+mês viram faixas em data_faturamento (usam idx_os_faturamento / idx_os_consultor_faturamento).
+# Mês sem ano usa a coluna gerada mes_faturamento, indexada junto com ano_faturamento (migração 7).
+# As consultas recebem a tabela a ler: OrdemDeServico ou, quando o período chega aos anos já
+# arquivados, a view os_faturadas_todas (ver tabela_faturadas e arquivo_os).
+
+MESES = ["01-Janeiro", "02-Fevereiro", "03-Março", "04-Abril",
+         "05-Maio", "06-Junho", "07-Julho", "08-Agosto",
+         "09-Setembro", "10-Outubro", "11-Novembro", "12-Dezembro"]
+
+
+def _inicio_mes(ano, mes):
+    return date(ano, mes, 1).isoformat()
+
+
+def _inicio_mes_seguinte(ano, mes):
+    return date(ano + 1, 1, 1).isoformat() if mes == 12 else date(ano, mes + 1, 1).isoformat()
+
+
+ordem = tabelas.ordem_servico
+
+
+def tabela_faturadas(ano=None):
+    # Só a tabela viva, a menos que o arquivo exista e tenha OS do período (ano=None: todos os anos)
+    if not banco.SQLITE or not os.path.exists(db_pool.get_pool().arquivo_path):
+        return ordem
+    arquivo = tabelas.ordem_servico_arquivo
+    ultimo_ano_arquivado = banco.escalar(select(func.max(arquivo.c.ano_faturamento))) # Fim do índice (ano, mês)
+    if ultimo_ano_arquivado is None or (ano is not None and ano > ultimo_ano_arquivado):
+        return ordem
+    return tabelas.os_faturadas_todas
+
+
+def filtros_faturadas(ano=None, mes=None, consultor_id=None, ordem=ordem):
+    # Condições (SQLAlchemy Core) sobre 'ordem' (ver tabela_faturadas)
+    condicoes = [ordem.c.data_faturamento.is_not(None)]
+    if consultor_id is not None:
+        condicoes.append(ordem.c.consultor_id == consultor_id)
+    if ano is not None and mes is not None:
+        condicoes.append(ordem.c.data_faturamento >= _inicio_mes(ano, mes))
+        condicoes.append(ordem.c.data_faturamento < _inicio_mes_seguinte(ano, mes))
+    elif ano is not None:
+        condicoes.append(ordem.c.data_faturamento >= date(ano, 1, 1).isoformat())
+        condicoes.append(ordem.c.data_faturamento < date(ano + 1, 1, 1).isoformat())
+    elif mes is not None:
+        condicoes.append(ordem.c.mes_faturamento == mes)
+    return condicoes
+
+
+def query_anos_faturados(ordem=ordem):
+    ano = ordem.c.ano_faturamento.label("ano")
+    return (select(ano).distinct()
+            .where(ordem.c.data_faturamento.is_not(None), ordem.c.ano_faturamento.is_not(None))
+            .order_by(ano.desc()))
+
+
+def query_faturadas_kpis(condicoes, ordem=ordem):
+    return select(
+        func.count(ordem.c.id).label("total_faturadas"),
+        func.sum(ordem.c.valor_liquido_centavos).label("valor_total_faturado_centavos"), # Soma inteira exata
+    ).where(*condicoes)
+
+
+def query_faturadas_mensal(condicoes, ordem=ordem):
+    return (select(banco.ano_mes(ordem.c.ano_faturamento, ordem.c.mes_faturamento).label("mes_ano"),
+                   func.count().label("total_faturadas"))
+            .where(*condicoes)
+            .group_by(ordem.c.ano_faturamento, ordem.c.mes_faturamento)
+            .order_by(ordem.c.ano_faturamento, ordem.c.mes_faturamento))
+
+
+def query_faturadas_anual(condicoes, ordem=ordem):
+    return (select(cast(ordem.c.ano_faturamento, String).label("ano"),
+                   func.count().label("total_faturadas"))
+            .where(*condicoes)
+            .group_by(ordem.c.ano_faturamento)
+            .order_by(ordem.c.ano_faturamento))
+
+
+def query_faturadas_detalhes(condicoes, limite, ordem=ordem):
+    cliente, modelo, consultor, status = tabelas.cliente, tabelas.modelo, tabelas.consultor, tabelas.status
+    return (select(
+                ordem.c.id, ordem.c.numero_os, ordem.c.tipo_os,
+                cliente.c.nome.label("cliente_nome"),
+                cliente.c.cpf.label("cliente_cpf"),
+                cliente.c.telefone.label("cliente_telefone"),
+                status.c.descricao.label("status_descricao"),
+                modelo.c.nome_modelo.label("modelo_nome"),
+                consultor.c.nome.label("consultor_nome"),
+                tabelas.maquina.c.chassi.label("modelo_chassi"),
+                ordem.c.data_abertura,
+                ordem.c.valor_liquido_centavos.label("valor_liquido"),
+                ordem.c.data_faturamento,
+                ordem.c.data_pagamento_fabrica,
+                ordem.c.descricao_servico)
+            .select_from(consultas_os.joins_os(ordem))
+            .where(*condicoes)
+            .order_by(ordem.c.data_faturamento.desc())
+            .limit(limite))
+
+
+def query_faturadas_exportacao(condicoes, ordem=ordem):
+    return (select(*consultas_os.colunas_exportacao(ordem))
+            .select_from(consultas_os.joins_os(ordem))
+            .where(*condicoes)
+            .order_by(ordem.c.data_faturamento.desc(), ordem.c.id.desc()))
@@ -0,0 +1,126 @@
+import os
+from sqlalchemy import select, func, case, desc, union_all
+from controllers import banco
+from controllers import db_pool
+from controllers import tabelas
+
+# --- Máquinas (uma por chassi) ---
+# Antes o chassi ficava em Modelo e cada OS nova reescrevia o chassi do modelo, trocando o chassi de
+# todas as OS anteriores. Agora cada máquina é uma linha de Maquina (chassi único) e a OS aponta para
+# ela (OrdemDeServico.maquina_id, migrações 12 e 13). O histórico de um chassi é uma busca no índice
+# único de Maquina seguida de um intervalo de idx_os_maquina, sem percorrer as OS.
+#
+# 'maquina_ultima_os' guarda a OS mais recente de cada máquina (cliente atual, datas) e é mantida
+# por triggers, como resumo_os_aberto. O inventário lê só Maquina e essa tabela. Uma OS excluída
+# que era a única da máquina no banco principal deixa a linha como está: o último cliente conhecido
+# continua valendo. Uma OS arquivada continua valendo como a última da máquina enquanto não houver
+# outra mais nova (arquivo_os._manter_ultima_os_arquivada e migração 16).
+
+ordem, maquina, modelo, tipo_maquina, cliente, status, consultor = (
+    tabelas.ordem_servico, tabelas.maquina, tabelas.modelo, tabelas.tipo_maquina,
+    tabelas.cliente, tabelas.status, tabelas.consultor)
+ultima_os = tabelas.maquina_ultima_os
+
+
+def normalizar_chassi(chassi):
+    return str(chassi).strip().upper() if chassi is not None else ""
+
+
+def _arquivo_disponivel():
+    # Mesmo critério de consultas_faturadas.tabela_faturadas: o arquivo existe, então está anexado
+    return banco.SQLITE and os.path.exists(db_pool.get_pool().arquivo_path)
+
+
+# --- Consultas da página de Máquinas ---
+# O inventário é paginado por keyset no chassi (único): filtrado por modelo, é um intervalo de
+# idx_maquina_modelo_chassi (migração 14); sem filtro, de idx_maquina_chassi. Só a página atual é lida.
+
+TAMANHOS_PAGINA = [25, 50, 100]
+
+
+def _condicoes_inventario(tipo_maquina_id=None, modelo_id=None):
+    condicoes = []
+    if tipo_maquina_id is not None:
+        condicoes.append(modelo.c.tipo_maquina_id == tipo_maquina_id)
+    if modelo_id is not None:
+        condicoes.append(maquina.c.modelo_id == modelo_id)
+    return condicoes
+
+
+def query_inventario(tipo_maquina_id=None, modelo_id=None, apos=None, limite=None):
+    # Uma linha por máquina; cliente atual e situação vêm da OS mais recente (maquina_ultima_os).
+    # 'apos' é o chassi da última linha da página anterior.
+    condicoes = _condicoes_inventario(tipo_maquina_id, modelo_id)
+    if apos is not None:
+        condicoes.append(maquina.c.chassi > apos)
+    consulta = (select(maquina.c.chassi, modelo.c.nome_modelo,
+                       tipo_maquina.c.descricao.label("tipo_maquina_descricao"),
+                       cliente.c.nome.label("cliente_atual"),
+                       banco.data_br(ultima_os.c.data_abertura).label("ultima_os_aberta_em"),
+                       case((ultima_os.c.os_id.is_(None), None),
+                            (ultima_os.c.data_faturamento.is_(None), "Em aberto"),
+                            else_="Faturada").label("situacao_ultima_os"))
+                .select_from(maquina
+                             .join(modelo, maquina.c.modelo_id == modelo.c.id)
+                             .outerjoin(tipo_maquina, modelo.c.tipo_maquina_id == tipo_maquina.c.id)
+                             .outerjoin(ultima_os, ultima_os.c.maquina_id == maquina.c.id)
+                             .outerjoin(cliente, ultima_os.c.cliente_id == cliente.c.id))
+                .where(*condicoes)
+                .order_by(maquina.c.chassi))
+    return consulta.limit(limite) if limite is not None else consulta
+
+
+def contar_inventario(conexao, tipo_maquina_id=None, modelo_id=None):
+    consulta = (select(func.count())
+                .select_from(maquina.join(modelo, maquina.c.modelo_id == modelo.c.id))
+                .where(*_condicoes_inventario(tipo_maquina_id, modelo_id)))
+    return banco.escalar(consulta, conexao)
+
+
+def query_inventario_pagina(conexao, tamanho_pagina, apos=None, tipo_maquina_id=None, modelo_id=None):
+    # Busca uma linha a mais só para saber se existe próxima página (como em busca_clientes)
+    df = banco.ler_df(query_inventario(tipo_maquina_id, modelo_id, apos, tamanho_pagina + 1), conexao)
+    tem_proxima = len(df) > tamanho_pagina
+    return df.iloc[:tamanho_pagina], tem_proxima
+
+
+def chave_keyset(df_pagina):
+    return df_pagina.iloc[-1]['chassi']
+
+
+def query_maquinas_por_tipo():
+    total = func.count(maquina.c.id).label("total_maquinas")
+    return (select(tipo_maquina.c.descricao.label("tipo_maquina"), total)
+            .select_from(maquina
+                         .join(modelo, maquina.c.modelo_id == modelo.c.id)
+                         .join(tipo_maquina, modelo.c.tipo_maquina_id == tipo_maquina.c.id))
+            .group_by(tipo_maquina.c.descricao)
+            .order_by(total.desc()))
+
+
+def _historico(ordem, chassi):
+    return (select(ordem.c.numero_os,
+                   cliente.c.nome.label("cliente"),
+                   modelo.c.nome_modelo.label("modelo"),
+                   status.c.descricao.label("status"),
+                   consultor.c.nome.label("consultor"),
+                   banco.data_br(ordem.c.data_abertura).label("data_abertura"),
+                   banco.data_br(ordem.c.data_faturamento).label("data_faturamento"),
+                   ordem.c.descricao_servico,
+                   ordem.c.data_abertura.label("data_abertura_iso"),
+                   ordem.c.id.label("os_id")) # Rótulo explícito: o ORDER BY do UNION ALL usa o nome da coluna
+            .select_from(maquina
+                         .join(ordem, ordem.c.maquina_id == maquina.c.id)
+                         .join(cliente, ordem.c.cliente_id == cliente.c.id)
+                         .join(modelo, ordem.c.modelo_id == modelo.c.id)
+                         .join(status, ordem.c.status_id == status.c.id)
+                         .join(consultor, ordem.c.consultor_id == consultor.c.id))
+            .where(maquina.c.chassi == normalizar_chassi(chassi)))
+
+
+def query_historico_chassi(chassi):
+    # Todas as OS da máquina, da mais recente para a mais antiga (inclusive as arquivadas)
+    consulta = _historico(ordem, chassi)
+    if _arquivo_disponivel():
+        consulta = union_all(consulta, _historico(tabelas.ordem_servico_arquivo, chassi))
+    return consulta.order_by(desc("data_abertura_iso"), desc("os_id"))
@@ -0,0 +1,134 @@
+import pandas as pd
+from sqlalchemy import select, func, and_, or_, case
+from controllers import banco
+from controllers import tabelas
+
+# --- Consultas paginadas de Ordens de Serviço em aberto (SQLAlchemy Core, ver banco) ---
+# Paginação por keyset em (data_abertura, id), do mais recente para o mais antigo.
+# A formatação para exibição (trim, datas DD/MM/YYYY, valor com vírgula) é feita no SQL,
+# então o Python só recebe as colunas exibidas de UMA página.
+
+TAMANHOS_PAGINA = [25, 50, 100, 200]
+
+ordem, cliente, modelo, consultor, status = (tabelas.ordem_servico, tabelas.cliente, tabelas.modelo,
+                                             tabelas.consultor, tabelas.status)
+maquina = tabelas.maquina
+
+COLUNAS_OS_ABERTO = [
+    ordem.c.id,
+    func.trim(ordem.c.numero_os).label("numero_os"),
+    func.trim(ordem.c.tipo_os).label("tipo_os"),
+    func.trim(cliente.c.nome).label("cliente_nome"),
+    func.trim(status.c.descricao).label("status_descricao"),
+    func.trim(modelo.c.nome_modelo).label("modelo_nome"),
+    func.trim(consultor.c.nome).label("consultor_nome"),
+    maquina.c.chassi.label("modelo_chassi"), # Já gravado sem espaços nas pontas (normalizar_chassi)
+    banco.data_br(ordem.c.data_abertura).label("data_abertura"),
+    banco.valor_br(ordem.c.valor_liquido_centavos).label("valor_liquido"),
+    banco.data_br(ordem.c.data_faturamento).label("data_faturamento"),
+    banco.data_br(ordem.c.data_pagamento_fabrica).label("data_pagamento_fabrica"),
+    func.trim(ordem.c.descricao_servico).label("descricao_servico"),
+    ordem.c.status_id,
+    ordem.c.data_abertura.label("data_abertura_iso"),
+]
+
+
+def joins_os(ordem=ordem):
+    # 'ordem' pode ser outra tabela com as colunas de OrdemDeServico (ex.: tabelas.os_faturadas_todas)
+    return (ordem
+            .join(cliente, ordem.c.cliente_id == cliente.c.id)
+            .join(modelo, ordem.c.modelo_id == modelo.c.id)
+            .join(consultor, ordem.c.consultor_id == consultor.c.id)
+            .join(status, ordem.c.status_id == status.c.id)
+            # O chassi é o da máquina da OS; OS antigas sem máquina ficam com o chassi vazio
+            .outerjoin(maquina, ordem.c.maquina_id == maquina.c.id))
+
+
+JOINS_OS = joins_os()
+
+# Mais recente primeiro; OS sem data de abertura no fim (padrão do SQLite no DESC, explícito para os outros bancos)
+ORDEM_OS_ABERTO = [ordem.c.data_abertura.desc().nulls_last(), ordem.c.id.desc()]
+
+
+def padrao_prefixo(texto):
+    # Padrão LIKE para 'começa com' (use com escape='\\'); '%' e '_' digitados valem como texto
+    return texto.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def montar_filtros_os_aberto(consultor_id=None, status_id=None, cliente_nome=None):
+    condicoes = [ordem.c.data_faturamento.is_(None)]
+    if consultor_id is not None:
+        condicoes.append(ordem.c.consultor_id == consultor_id)
+    if status_id is not None:
+        condicoes.append(ordem.c.status_id == status_id)
+    if cliente_nome:
+        condicoes.append(cliente.c.nome.like(padrao_prefixo(cliente_nome), escape='\\')) # Começo do nome
+    return condicoes
+
+
+def query_os_aberto_pagina(conexao, tamanho_pagina, apos=None, consultor_id=None, status_id=None, cliente_nome=None):
+    # 'apos' é a chave (data_abertura_iso, id) da última linha da página anterior.
+    # Busca uma linha a mais só para saber se existe próxima página.
+    condicoes = montar_filtros_os_aberto(consultor_id, status_id, cliente_nome)
+
+    if apos is not None:
+        data_ultima, id_ultimo = apos
+        if data_ultima is None:
+            # NULLs ficam no fim da ordenação DESC
+            condicoes.append(and_(ordem.c.data_abertura.is_(None), ordem.c.id < id_ultimo))
+        else:
+            condicoes.append(or_(ordem.c.data_abertura < data_ultima,
+                                 and_(ordem.c.data_abertura == data_ultima, ordem.c.id < id_ultimo),
+                                 ordem.c.data_abertura.is_(None)))
+
+    consulta = (select(*COLUNAS_OS_ABERTO)
+                .select_from(JOINS_OS)
+                .where(*condicoes)
+                .order_by(*ORDEM_OS_ABERTO)
+                .limit(tamanho_pagina + 1))
+    df = banco.ler_df(consulta, conexao)
+    tem_proxima = len(df) > tamanho_pagina
+    return df.iloc[:tamanho_pagina], tem_proxima
+
+
+def chave_keyset(df_pagina):
+    ultima = df_pagina.iloc[-1]
+    data_iso = ultima['data_abertura_iso'] if pd.notna(ultima['data_abertura_iso']) else None
+    return (data_iso, int(ultima['id']))
+
+
+def contar_os_aberto(conexao, consultor_id=None, status_id=None, cliente_nome=None):
+    condicoes = montar_filtros_os_aberto(consultor_id, status_id, cliente_nome)
+    origem = ordem.join(cliente, ordem.c.cliente_id == cliente.c.id) if cliente_nome else ordem
+    return banco.escalar(select(func.count()).select_from(origem).where(*condicoes), conexao)
+
+
+# Colunas dos relatórios exportados (CSV/XLSX): valores numéricos em reais e datas ISO,
+# para a planilha poder somar e ordenar
+def colunas_exportacao(ordem=ordem):
+    return [
+        ordem.c.numero_os,
+        ordem.c.tipo_os,
+        cliente.c.nome.label("cliente_nome"),
+        # CPF provisório não vai para o relatório
+        case((cliente.c.cpf.like("TEMP_CPF_%"), None), else_=cliente.c.cpf).label("cliente_cpf"),
+        cliente.c.telefone.label("cliente_telefone"),
+        status.c.descricao.label("status_descricao"),
+        modelo.c.nome_modelo.label("modelo_nome"),
+        maquina.c.chassi.label("modelo_chassi"),
+        consultor.c.nome.label("consultor_nome"),
+        ordem.c.data_abertura,
+        ordem.c.data_faturamento,
+        ordem.c.data_pagamento_fabrica,
+        (ordem.c.valor_liquido_centavos / 100.0).label("valor_liquido"),
+        ordem.c.descricao_servico,
+    ]
+
+
+COLUNAS_EXPORTACAO = colunas_exportacao()
+
+
+def query_os_aberto_exportacao(consultor_id=None, status_id=None, cliente_nome=None):
+    # Todas as OS em aberto com os filtros da tela (sem paginação), na mesma ordem da tela
+    condicoes = montar_filtros_os_aberto(consultor_id, status_id, cliente_nome)
+    return select(*COLUNAS_EXPORTACAO).select_from(JOINS_OS).where(*condicoes).order_by(*ORDEM_OS_ABERTO)
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from sqlalchemy.exc import DBAPIError
+from controllers import banco
+
+# --- Execução paralela de consultas independentes ---
+# As páginas montam um dicionário {nome: select do SQLAlchemy} (ou {nome: função(conexao)}) e
+# recebem {nome: resultado} de volta. Cada consulta roda numa thread do pool abaixo, com sua
+# própria conexão do banco (no SQLite, em modo somente leitura: PRAGMA query_only); o driver
+# solta o GIL enquanto o banco executa, então o tempo total fica perto do da consulta mais lenta.
+# Enquanto espera, a thread do script confere se a sessão pediu um rerun (o usuário clicou em
+# outro widget): nesse caso as consultas em andamento são interrompidas (interrupt() no sqlite3,
+# cancel() nos drivers de servidor) e o script para, para o Streamlit começar logo o rerun. Não chame executar() de dentro de uma
+# consulta submetida (as threads do pool podem estar todas ocupadas esperando).
+
+MAX_THREADS = min(4, os.cpu_count() or 1)
+TIMEOUT_PADRAO_S = 30
+INTERVALO_VERIFICACAO_S = 0.05 # De quanto em quanto tempo confere timeout e pedido de rerun
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix="consultas")
+    return _executor
+
+
+def _estado_pedidos(ctx):
+    # O Streamlit não tem API pública para "há um rerun pendente": o estado fica no atributo privado
+    # ScriptRequests._state (conferido no Streamlit 1.66.0). Se uma versão nova mudar isso, o
+    # resultado é None e a execução segue como se nenhum rerun tivesse sido pedido (sem cancelar).
+    try:
+        from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequestType
+    except ImportError:
+        return None
+    estado = getattr(getattr(ctx, "script_requests", None), "_state", None)
+    return estado if isinstance(estado, ScriptRequestType) else None
+
+
+def _rerun_pendente():
+    # True se a sessão do Streamlit já tem um rerun/stop esperando este script terminar.
+    # Fora do Streamlit (benchmark, scripts) não há contexto e nunca cancela.
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return False
+    estado = _estado_pedidos(get_script_run_ctx(suppress_warning=True))
+    return estado is not None and estado.name != "CONTINUE"
+
+
+def _parar_script():
+    from streamlit.runtime.scriptrunner_utils.exceptions import StopException
+    raise StopException()
+
+
+class _Lote:
+    # Conexões em uso pelas consultas de UMA chamada de executar(), para poder interrompê-las
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conexoes = {}
+        self.cancelado = False
+
+    def rodar(self, nome, consulta):
+        with banco.conectar() as conexao:
+            conn = conexao.connection.dbapi_connection # Do driver: é nela que se interrompe a consulta
+            sqlite = conexao.dialect.name == "sqlite"
+            with self.lock:
+                if self.cancelado:
+                    return None
+                self.conexoes[nome] = conn
+            if sqlite:
+                conexao.exec_driver_sql("PRAGMA query_only = ON")
+            try:
+                if callable(consulta):
+                    return consulta(conexao)
+                return banco.ler_df(consulta, conexao)
+            finally:
+                # Sai do mapa ANTES de voltar ao pool: interrupt() nunca atinge a consulta de outra página
+                with self.lock:
+                    self.conexoes.pop(nome, None)
+                if sqlite:
+                    try:
+                        conexao.rollback() # Sai de alguma transação que a interrupção deixou aberta
+                        conexao.exec_driver_sql("PRAGMA query_only = OFF")
+                    except DBAPIError:
+                        conn.fechar_definitivamente() # Não volta ao pool presa em somente leitura
+                        conexao.invalidate()
+
+    def cancelar(self):
+        with self.lock:
+            self.cancelado = True
+            for conn in self.conexoes.values():
+                interromper = getattr(conn, "interrupt", None) or getattr(conn, "cancel", None)
+                if interromper is not None:
+                    interromper()
+
+
+def executar(consultas, timeout_s=TIMEOUT_PADRAO_S):
+    # consultas: {nome: select -> DataFrame} ou {nome: função(conexao) -> qualquer coisa}.
+    # Retorna {nome: resultado}. Erro de uma consulta cancela as demais e sobe para quem chamou;
+    # estourar o timeout levanta TimeoutError.
+    if len(consultas) <= 1:
+        # Uma consulta só: roda aqui mesmo, sem pagar a troca de thread
+        lote = _Lote()
+        return {nome: lote.rodar(nome, consulta) for nome, consulta in consultas.items()}
+
+    lote = _Lote()
+    executor = _get_executor()
+    futuros = {nome: executor.submit(lote.rodar, nome, consulta) for nome, consulta in consultas.items()}
+    limite = time.monotonic() + timeout_s
+    try:
+        pendentes = set(futuros.values())
+        while pendentes:
+            concluidos, pendentes = wait(pendentes, timeout=INTERVALO_VERIFICACAO_S, return_when=FIRST_EXCEPTION)
+            for futuro in concluidos:
+                if futuro.exception() is not None:
+                    raise futuro.exception()
+            if pendentes and _rerun_pendente():
+                _parar_script()
+            if pendentes and time.monotonic() > limite:
+                raise TimeoutError(f"Consultas não terminaram em {timeout_s}s: "
+                                   f"{', '.join(n for n, f in futuros.items() if not f.done())}")
+    except BaseException:
+        lote.cancelar()
+        for futuro in futuros.values():
+            futuro.cancel()
+        raise
+    return {nome: futuro.result() for nome, futuro in futuros.items()}
@@ -63,6 +63,10 @@ CREATE TABLE IF NOT EXISTS OrdemDeServico (
 
 cursor.executescript(script_sql)
 conn.commit()
+
+# Índices e demais evoluções do schema ficam nas migrações versionadas
+from controllers import migracoes
+migracoes.aplicar_migracoes(conn)
 conn.close()
 
 print("✅ Banco de dados e tabelas criados com sucesso!")
\ No newline at end of file
@@ -0,0 +1,159 @@
+import sqlite3
+import os
+import threading
+from controllers import instrumentacao_sql
+from controllers import fila_escrita
+from controllers import arquivo_os
+
+# --- Configuração do banco ---
+base_dir = os.path.dirname(os.path.abspath(__file__))
+# OS_DATABASE_URL escolhe o banco das consultas (ver banco). sqlite:///caminho escolhe o arquivo;
+# a URL de um servidor manda as leituras para lá e deixa o app sem gravações (ver escrever).
+URL_BANCO = os.environ.get("OS_DATABASE_URL") or ""
+BANCO_SQLITE = not URL_BANCO or URL_BANCO.startswith("sqlite")
+_ARQUIVO_URL = URL_BANCO.split(":///", 1)[1] if BANCO_SQLITE and ":///" in URL_BANCO else None
+# OS_DB_PATH aponta o app (ou o benchmark) para outro arquivo, ex.: um banco sintético de teste
+DB_PATH = os.environ.get("OS_DB_PATH") or _ARQUIVO_URL or os.path.join(base_dir, "..", "database", "db.sqlite3")
+
+# Pragmas aplicados UMA vez, na criação de cada conexão
+CACHE_SIZE_KB = 20000 # ~20 MB de page cache por conexão
+MMAP_SIZE = 256 * 1024 * 1024 # 256 MB mapeados em memória
+BUSY_TIMEOUT_MS = 5000 # Espera pelo lock de escrita em vez de falhar na hora
+CACHED_STATEMENTS = 256 # Cache de statements preparados (padrão do sqlite3 é 128)
+MAX_CONEXOES_OCIOSAS = 32 # Conexões de leitura mantidas abertas no pool
+# Cursor que mede cada statement (ver instrumentacao_sql); OS_SQL_INSTRUMENTACAO=0 volta ao padrão
+FABRICA_CURSOR = instrumentacao_sql.CursorInstrumentado if instrumentacao_sql.ATIVO else sqlite3.Cursor
+
+
+class PooledConnection(sqlite3.Connection):
+    # Conexão que volta para o pool no close() em vez de ser fechada.
+    # Continua sendo um sqlite3.Connection, então pd.read_sql_query funciona sem avisos.
+    _pool = None
+    _em_uso = False
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or FABRICA_CURSOR)
+
+    # O Connection.execute do C cria o cursor sem passar por cursor(); estes dois passam,
+    # para que conn.execute/executemany também sejam medidos (o pd.read_sql_query já usa cursor())
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if not self._em_uso:
+            return # close() repetido (ex.: finally + fim da função) não devolve duas vezes
+        self._em_uso = False
+        if self.in_transaction:
+            self.rollback() # Nada pendente de uma sessão vaza para a próxima
+        if self._pool is not None:
+            self._pool._devolver(self)
+        else:
+            super().close()
+
+    def fechar_definitivamente(self):
+        self._em_uso = False
+        super().close()
+
+
+def _configurar(conn):
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+
+
+def _nova_conexao(db_path):
+    conn = sqlite3.connect(
+        db_path,
+        factory=PooledConnection,
+        check_same_thread=False, # A conexão passa de thread em thread junto com o pool
+        cached_statements=CACHED_STATEMENTS,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+    )
+    _configurar(conn)
+    return conn
+
+
+class ConnectionPool:
+    # Pool de conexões de leitura de longa duração + a fila de escrita (dona da única conexão que grava).
+    # O Streamlit executa cada rerun em uma thread nova, então conexões presas a
+    # threading.local seriam recriadas a cada interação; o pool reaproveita a
+    # mesma conexão (e seu page cache já aquecido) entre reruns e sessões.
+
+    def __init__(self, db_path, max_ociosas=MAX_CONEXOES_OCIOSAS):
+        self.db_path = db_path
+        self.arquivo_path = arquivo_os.caminho_arquivo(db_path) # OS faturadas antigas (ver arquivo_os)
+        self.max_ociosas = max_ociosas
+        self._ociosas = []
+        self._lock = threading.Lock()
+        self.fila = fila_escrita.FilaEscrita(lambda: _nova_conexao(db_path), self._anexar_arquivo)
+
+    def _anexar_arquivo(self, conn):
+        # O arquivo pode ser criado com o app rodando: cada conexão o anexa na primeira vez que o encontra
+        arquivo_os.anexar(conn, self.arquivo_path)
+
+    def conectar(self):
+        with self._lock:
+            conn = self._ociosas.pop() if self._ociosas else None
+        if conn is None:
+            conn = _nova_conexao(self.db_path)
+            conn._pool = self
+        self._anexar_arquivo(conn)
+        conn._em_uso = True
+        return conn
+
+    def _devolver(self, conn):
+        with self._lock:
+            if len(self._ociosas) < self.max_ociosas:
+                self._ociosas.append(conn)
+                return
+        conn.fechar_definitivamente()
+
+    def escrever(self, job, timeout_s=fila_escrita.TIMEOUT_PADRAO_S):
+        # Roda job(conn) na thread de escrita, dentro de uma transação, e devolve o resultado
+        return self.fila.executar(job, timeout_s)
+
+    def fechar_tudo(self):
+        with self._lock:
+            ociosas, self._ociosas = self._ociosas, []
+        for conn in ociosas:
+            conn.fechar_definitivamente()
+        self.fila.parar()
+
+
+_pool_padrao = None
+_pool_padrao_lock = threading.Lock()
+
+def get_pool():
+    global _pool_padrao
+    if _pool_padrao is None:
+        with _pool_padrao_lock:
+            if _pool_padrao is None:
+                _pool_padrao = ConnectionPool(DB_PATH)
+    return _pool_padrao
+
+def conectar():
+    return get_pool().conectar()
+
+def escrever(job, timeout_s=fila_escrita.TIMEOUT_PADRAO_S):
+    # Toda gravação das páginas passa por aqui (ver fila_escrita): job(conn) -> resultado
+    if not BANCO_SQLITE:
+        # Os jobs ainda são SQL do SQLite: gravar no arquivo local enquanto as leituras vêm do servidor
+        # separaria os dois bancos sem ninguém perceber
+        raise RuntimeError("Gravações ainda não são suportadas com OS_DATABASE_URL apontando para um servidor.")
+    return get_pool().escrever(job, timeout_s)
+
+def usar_banco(db_path):
+    # Troca o banco do pool padrão (fecha as conexões abertas do anterior). Usado pelo benchmark.
+    global _pool_padrao, DB_PATH
+    with _pool_padrao_lock:
+        if _pool_padrao is not None:
+            _pool_padrao.fechar_tudo()
+        DB_PATH = db_path
+        _pool_padrao = None
@@ -1,6 +1,23 @@
 import sqlite3
 from datetime import datetime
-from controllers.auth import conectar # Importa a função de conexão
+from sqlalchemy import select, insert, update, delete, or_
+from controllers import banco # Comandos em SQLAlchemy Core, compilados para o cursor do driver
+from controllers import tabelas
+from controllers import cache_dimensoes # Cache em memória de Status/TipoMaquina/Modelo/Consultor
+from controllers import db_pool # Exclusões pela fila de escrita
+from controllers import consultas_maquinas # normalizar_chassi
+
+# As funções recebem o cursor da conexão de escrita (job da fila_escrita) e montam os comandos
+# com as tabelas do SQLAlchemy; os INSERTs devolvem o id por RETURNING em vez de lastrowid.
+cliente, tipo_maquina, modelo, status, consultor, maquina = (tabelas.cliente, tabelas.tipo_maquina, tabelas.modelo,
+                                                            tabelas.status, tabelas.consultor, tabelas.maquina)
+
+def _executar(cursor, comando):
+    cursor.execute(*banco.compilar(comando))
+    return cursor
+
+def _inserir(cursor, tabela, **valores):
+    return _executar(cursor, insert(tabela).values(**valores).returning(tabela.c.id)).fetchone()[0]
 
 def get_or_create_cliente(cursor, nome, cpf, telefone):
     if not nome or str(nome).strip() == '':
@@ -11,17 +28,15 @@ def get_or_create_cliente(cursor, nome, cpf, telefone):
     # --- NOVO: Lógica para evitar duplicidade de clientes SEM CPF ---
     if not cpf_to_use: # Se o CPF não foi fornecido (é None ou string vazia)
         # Tenta encontrar um cliente existente com o mesmo nome E sem CPF (ou com TEMP_CPF)
-        cursor.execute("""
-            SELECT id FROM Cliente 
-            WHERE nome = ? AND (cpf IS NULL OR cpf LIKE 'TEMP_CPF_%')
-        """, (nome.strip(),))
-        existing_client_id_by_name_no_cpf = cursor.fetchone()
+        existing_client_id_by_name_no_cpf = _executar(cursor, select(cliente.c.id).where(
+            cliente.c.nome == nome.strip(), or_(cliente.c.cpf.is_(None), cliente.c.cpf.like('TEMP_CPF_%'))
+        )).fetchone()
 
         if existing_client_id_by_name_no_cpf:
             # Se encontrou um cliente com o mesmo nome E sem CPF/TEMP_CPF, reutiliza
             cliente_id = existing_client_id_by_name_no_cpf[0]
             # Opcional: Atualizar telefone ou nome (se algo mudou) no cliente existente
-            cursor.execute("UPDATE Cliente SET nome = ?, telefone = ? WHERE id = ?", (nome, telefone, cliente_id))
+            _executar(cursor, update(cliente).where(cliente.c.id == cliente_id).values(nome=nome, telefone=telefone))
             return cliente_id
         else:
             # Se não encontrou cliente com mesmo nome e sem CPF, gera um novo TEMP_CPF único
@@ -30,82 +45,120 @@ def get_or_create_cliente(cursor, nome, cpf, telefone):
     
     # Se o CPF foi fornecido (cpf_to_use não é None e não é TEMP_CPF_ gerado agora), 
     # ou se foi gerado um novo TEMP_CPF_
-    cursor.execute("SELECT id FROM Cliente WHERE cpf = ?", (cpf_to_use,))
-    cliente_id = cursor.fetchone()
+    cliente_id = _executar(cursor, select(cliente.c.id).where(cliente.c.cpf == cpf_to_use)).fetchone()
     if cliente_id:
         # Se encontrou, atualiza nome e telefone (para o caso de ser um CPF existente)
-        cursor.execute("UPDATE Cliente SET nome = ?, telefone = ? WHERE id = ?", (nome, telefone, cliente_id[0]))
+        _executar(cursor, update(cliente).where(cliente.c.id == cliente_id[0]).values(nome=nome, telefone=telefone))
         return cliente_id[0]
     else:
         # Se não encontrou (novo cliente com CPF, ou novo TEMP_CPF_ gerado), insere
-        cursor.execute("INSERT INTO Cliente (nome, cpf, telefone) VALUES (?, ?, ?)", (nome, cpf_to_use, telefone))
-        return cursor.lastrowid
+        return _inserir(cursor, cliente, nome=nome, cpf=cpf_to_use, telefone=telefone)
 
 def get_or_create_tipo_maquina(cursor, descricao):
     if not descricao or str(descricao).strip() == '':
         descricao = "Tipo Desconhecido" # Default
-    cursor.execute("SELECT id FROM TipoMaquina WHERE descricao = ?", (descricao,))
-    tipo_id = cursor.fetchone()
+    tipo_id = cache_dimensoes.tipos_maquina.obter(cursor, descricao)
+    if tipo_id is not None:
+        return tipo_id
+    tipo_id = _executar(cursor, select(tipo_maquina.c.id).where(tipo_maquina.c.descricao == descricao)).fetchone()
     if tipo_id:
+        cache_dimensoes.tipos_maquina.registrar(cursor, descricao, tipo_id[0])
         return tipo_id[0]
     else:
-        cursor.execute("INSERT INTO TipoMaquina (descricao) VALUES (?)", (descricao,))
-        return cursor.lastrowid
+        tipo_id = _inserir(cursor, tipo_maquina, descricao=descricao)
+        cache_dimensoes.tipos_maquina.registrar(cursor, descricao, tipo_id, inserido=True)
+        return tipo_id
 
 def get_or_create_status(cursor, descricao):
     if not descricao or str(descricao).strip() == '':
         descricao = "Status Desconhecido" # Default
-    cursor.execute("SELECT id FROM Status WHERE descricao = ?", (descricao,))
-    status_id = cursor.fetchone()
+    status_id = cache_dimensoes.status.obter(cursor, descricao)
+    if status_id is not None:
+        return status_id
+    status_id = _executar(cursor, select(status.c.id).where(status.c.descricao == descricao)).fetchone()
     if status_id:
+        cache_dimensoes.status.registrar(cursor, descricao, status_id[0])
         return status_id[0]
     else:
-        cursor.execute("INSERT INTO Status (descricao) VALUES (?)", (descricao,))
-        return cursor.lastrowid
+        status_id = _inserir(cursor, status, descricao=descricao)
+        cache_dimensoes.status.registrar(cursor, descricao, status_id, inserido=True)
+        return status_id
 
 def get_or_create_modelo(cursor, nome_modelo, chassi, tipo_maquina_id):
     if not nome_modelo or str(nome_modelo).strip() == '':
         raise ValueError("Nome do modelo não pode ser vazio.")
     
-    cursor.execute("SELECT id FROM Modelo WHERE nome_modelo = ? AND tipo_maquina_id = ?", (nome_modelo, tipo_maquina_id))
-    modelo_id = cursor.fetchone()
-    if modelo_id:
-        cursor.execute("UPDATE Modelo SET chassi = ? WHERE id = ?", (chassi, modelo_id[0]))
-        return modelo_id[0]
+    chave = (nome_modelo, tipo_maquina_id)
+    modelo_id = cache_dimensoes.modelos.obter(cursor, chave)
+    if modelo_id is None:
+        encontrado = _executar(cursor, select(modelo.c.id).where(
+            modelo.c.nome_modelo == nome_modelo, modelo.c.tipo_maquina_id == tipo_maquina_id
+        )).fetchone()
+        if encontrado:
+            modelo_id = encontrado[0]
+            cache_dimensoes.modelos.registrar(cursor, chave, modelo_id)
+    if modelo_id is not None:
+        # O chassi da OS fica na Maquina (get_or_create_maquina); reescrevê-lo aqui trocaria o chassi
+        # de todas as OS do modelo. Modelo.chassi só guarda o do cadastro do modelo.
+        return modelo_id
     else:
-        cursor.execute("INSERT INTO Modelo (nome_modelo, chassi, tipo_maquina_id) VALUES (?, ?, ?)", (nome_modelo, chassi, tipo_maquina_id))
-        return cursor.lastrowid
+        modelo_id = _inserir(cursor, modelo, nome_modelo=nome_modelo, chassi=chassi, tipo_maquina_id=tipo_maquina_id)
+        cache_dimensoes.modelos.registrar(cursor, chave, modelo_id, inserido=True)
+        return modelo_id
+
+def get_or_create_maquina(cursor, chassi, modelo_id):
+    # A máquina é identificada pelo chassi (índice único); uma máquina já cadastrada mantém o seu modelo
+    chassi = consultas_maquinas.normalizar_chassi(chassi)
+    if not chassi:
+        raise ValueError("Chassi não pode ser vazio.")
+    encontrada = _executar(cursor, select(maquina.c.id).where(maquina.c.chassi == chassi)).fetchone()
+    if encontrada:
+        return encontrada[0]
+    return _inserir(cursor, maquina, chassi=chassi, modelo_id=modelo_id)
 
 def get_consultor_id_by_name(cursor, nome_consultor):
     if not nome_consultor or str(nome_consultor).strip() == '':
         return None
-    cursor.execute("SELECT id FROM Consultor WHERE nome = ?", (nome_consultor,))
-    consultor_id = cursor.fetchone()
+    consultor_id = cache_dimensoes.consultores.obter(cursor, nome_consultor)
+    if consultor_id is not None:
+        return consultor_id
+    consultor_id = _executar(cursor, select(consultor.c.id).where(consultor.c.nome == nome_consultor)).fetchone()
     if consultor_id:
+        cache_dimensoes.consultores.registrar(cursor, nome_consultor, consultor_id[0])
         return consultor_id[0]
     return None
 
 def get_consultor_name_by_id(cursor, consultor_id):
     if not consultor_id:
         return "N/A"
-    cursor.execute("SELECT nome FROM Consultor WHERE id = ?", (consultor_id,))
-    consultor_name = cursor.fetchone()
+    consultor_name = _executar(cursor, select(consultor.c.nome).where(consultor.c.id == consultor_id)).fetchone()
     if consultor_name:
         return consultor_name[0]
     return "Desconhecido"
 
-def delete_record(conn, table_name, record_id):
-    cursor = conn.cursor()
+def excluir_registros(table_name, record_ids):
+    # Exclui pela fila de escrita (foreign_keys já vem ligado em todas as conexões do pool). Um job só
+    # (um commit) para todos os ids; cada id no seu SAVEPOINT, então um registro ainda referenciado
+    # não desfaz as outras exclusões. Retorna {id: None se excluiu, senão o erro} para a página mostrar.
+    tabela = tabelas.metadata.tables[table_name]
+    def job(conn):
+        cursor = conn.cursor()
+        erros = {}
+        for record_id in record_ids:
+            conn.execute("SAVEPOINT excluir")
+            try:
+                _executar(cursor, delete(tabela).where(tabela.c.id == record_id))
+                erros[record_id] = None
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK TO excluir")
+                erros[record_id] = e
+            conn.execute("RELEASE excluir")
+        return erros
     try:
-        cursor.execute(f"PRAGMA foreign_keys = ON;")
-        cursor.execute(f"DELETE FROM {table_name} WHERE id = ?", (record_id,))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError as e:
-        print(f"Erro de integridade ao deletar registro da tabela {table_name} (ID: {record_id}): {e}")
-        conn.rollback()
-        return False
-    except Exception as e:
-        print(f"Erro inesperado ao deletar registro da tabela {table_name} (ID: {record_id}): {e}")
-        conn.rollback()
-        return False
\ No newline at end of file
+        return db_pool.escrever(job)
+    except Exception as e: # A fila não rodou o job (banco ocupado, servidor): nada foi excluído
+        return {record_id: e for record_id in record_ids}
+
+def delete_record(table_name, record_id):
+    # Um registro só: None se excluiu, senão o erro
+    return excluir_registros(table_name, [record_id])[record_id]
\ No newline at end of file
@@ -0,0 +1,67 @@
+import pandas as pd
+
+# --- Valores monetários em centavos (inteiros) ---
+# O banco guarda OrdemDeServico.valor_liquido_centavos (INTEGER), então somas no SQLite são exatas.
+# Parse e formatação são vetorizados (métodos .str do pandas), sem lambda por célula.
+
+# Formatos aceitos (sem "R$" e espaços); o que não casar com nenhum é inválido, nunca adivinhado:
+#   - vírgula decimal, com no máximo 2 casas; pontos só como milhar, em grupos de 3 ("1.234,56", "1234,5");
+#   - sem vírgula, ponto único seguido de 1 ou 2 dígitos é decimal ("123.45", "99.9");
+#   - sem vírgula, pontos em grupos de 3 são milhar ("1.234", "1.234.567"), ou só dígitos ("1234").
+# Assim "1,234.56" (formato americano), "1.2.3", "0,005" e "12,3456" são recusados.
+_VIRGULA_DECIMAL = r"-?(\d{1,3}(\.\d{3})+|\d*),\d{1,2}"
+_PONTO_DECIMAL = r"-?\d*\.\d{1,2}"
+_PONTO_MILHAR = r"-?\d{1,3}(\.\d{3})+"
+_INTEIRO = r"-?\d+"
+_SEPARADOR_MILHAR = r"\B(?=(\d{3})+(?!\d))"
+
+
+def parse_brl(valores):
+    # Converte textos como "R$ 1.234,56", "1234,5" ou "123.45" em centavos (Int64).
+    # Retorna (centavos, invalidos): vazios viram <NA> e não são inválidos.
+    texto = pd.Series(valores, dtype="string") \
+        .str.replace("R$", "", regex=False) \
+        .str.replace(r"\s+", "", regex=True)
+
+    def casa(padrao):
+        return texto.str.fullmatch(padrao).fillna(False)
+
+    virgula_decimal, ponto_decimal = casa(_VIRGULA_DECIMAL), casa(_PONTO_DECIMAL)
+    ponto_milhar, inteiro = casa(_PONTO_MILHAR), casa(_INTEIRO)
+    sem_milhar = texto.str.replace(".", "", regex=False)
+    normalizado = sem_milhar.str.replace(",", ".", regex=False).where(virgula_decimal) \
+        .fillna(texto.where(ponto_decimal | inteiro)) \
+        .fillna(sem_milhar.where(ponto_milhar))
+
+    valido = virgula_decimal | ponto_decimal | ponto_milhar | inteiro
+    numeros = pd.to_numeric(normalizado.where(valido), errors="coerce")
+    centavos = (numeros * 100).round().astype("Int64")
+
+    vazio = texto.isna() | texto.eq("")
+    invalidos = ~vazio & ~valido
+    return centavos, invalidos
+
+
+def parse_brl_valor(texto):
+    # Versão escalar para formulários. Vazio -> None; inválido -> ValueError.
+    centavos, invalidos = parse_brl([texto])
+    if invalidos.iloc[0]:
+        raise ValueError(f"Valor inválido: {texto}")
+    return None if pd.isna(centavos.iloc[0]) else int(centavos.iloc[0])
+
+
+def formatar_brl(centavos, prefixo="R$ "):
+    # Centavos -> "R$ 1.234,56" (ou sem prefixo, para o editor). Nulos viram "".
+    serie = pd.Series(centavos)
+    indice = serie.index
+    serie = pd.to_numeric(serie, errors="coerce").round().astype("Int64")
+    absoluto = serie.abs()
+    reais = (absoluto // 100).astype("string").str.replace(_SEPARADOR_MILHAR, ".", regex=True)
+    cents = (absoluto % 100).astype("string").str.zfill(2)
+    texto = prefixo + reais + "," + cents
+    texto = texto.where(~serie.lt(0).fillna(False), "-" + texto)
+    return texto.fillna("").astype(object).set_axis(indice)
+
+
+def formatar_brl_valor(centavos, prefixo="R$ "):
+    return formatar_brl([centavos], prefixo).iloc[0]
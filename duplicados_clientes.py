@@ -0,0 +1,271 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+import pandas as pd
+from controllers import banco
+from controllers import db_pool
+from controllers import arquivo_os
+
+# --- Clientes duplicados: detecção por blocos e mesclagem ---
+# Clientes sem CPF ganham um TEMP_CPF próprio (db_utils.get_or_create_cliente), então
+# "JOAO SILVA" e "João da Silva" viram dois cadastros. Comparar todos os pares de dezenas de
+# milhares de clientes é inviável. Por isso cada cliente recebe até duas chaves de bloco,
+# gravadas em 'cliente_chave' (indexada pela chave, migração 11). Cada chave é o código
+# fonético do primeiro nome junto com o do último, e o do primeiro com o do segundo. Só
+# clientes que dividem uma chave são comparados entre si.
+#
+# As chaves são calculadas no Python (normalização e código fonético), então não há trigger
+# que as mantenha: atualizar_chaves recalcula, em lotes pela fila de escrita, só os clientes
+# novos ou renomeados desde a última vez ('cliente_dedupe' guarda o nome usado no cálculo).
+
+TAMANHO_LOTE = 5000
+MAX_BLOCO = 200 # Blocos maiores (nomes muito comuns) são pulados: seriam ~20 mil pares cada
+LIMIAR_SEMELHANCA = 0.88
+MAX_CANDIDATOS = 500
+
+# Partículas e sufixos de empresa que não distinguem um cliente de outro
+PALAVRAS_IGNORADAS = {"DA", "DE", "DO", "DAS", "DOS", "E", "LTDA", "ME", "EPP", "EIRELI"}
+
+# Grafias com o mesmo som viram a mesma letra (aplicadas em ordem, sobre o nome sem acentos)
+_REGRAS_FONETICAS = [(re.compile(padrao), troca) for padrao, troca in [
+    ("PH", "F"), ("TH", "T"), ("Y", "I"), ("W", "V"), ("K", "C"),
+    ("SC(?=[EI])", "S"), ("QU(?=[EI])", "C"), ("Q", "C"), ("C(?=[EI])", "S"),
+    ("G(?=[EI])", "J"), ("GU(?=[EI])", "G"),
+    ("CH", "X"), ("SH", "X"), ("LH", "L"), ("NH", "N"), ("H", ""),
+    ("Z", "S"), ("M(?=[^AEIOU]|$)", "N"),
+]]
+
+def palavras_nome(nome):
+    # "João da Silva" -> ["JOAO", "SILVA"]: sem acentos, maiúsculas e sem PALAVRAS_IGNORADAS
+    texto = (nome or "").upper().replace("Ç", "S")
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return [palavra for palavra in re.findall(r"[A-Z0-9]+", texto) if palavra not in PALAVRAS_IGNORADAS]
+
+
+def codigo_fonetico(palavra):
+    # Esqueleto de consoantes: "SOUZA" e "SOUSA" -> "SS", "SYLVA" e "SILVA" -> "SLV"
+    for regra, troca in _REGRAS_FONETICAS:
+        palavra = regra.sub(troca, palavra)
+    palavra = re.sub(r"(.)\1+", r"\1", palavra) # Letras dobradas
+    return palavra[:1] + re.sub(r"[AEIOU]", "", palavra[1:])
+
+
+def chaves_bloco(palavras):
+    if not palavras:
+        return []
+    codigos = [codigo_fonetico(palavra) for palavra in palavras]
+    chaves = {" ".join([codigos[0], codigos[-1]]) if len(codigos) > 1 else codigos[0]}
+    if len(codigos) > 2: # "JOAO SILVA SANTOS" também cai no bloco de "JOAO SILVA"
+        chaves.add(f"{codigos[0]} {codigos[1]}")
+    return sorted(chaves)
+
+
+# --- Jobs da fila de escrita ---
+
+def _atualizar_lote(conn, tamanho_lote):
+    pendentes = conn.execute("""
+        SELECT c.id, c.nome FROM Cliente c
+        LEFT JOIN cliente_dedupe d ON d.cliente_id = c.id
+        WHERE d.cliente_id IS NULL OR d.nome IS NOT c.nome
+        LIMIT ?
+    """, (tamanho_lote,)).fetchall()
+    ids = [(cliente_id,) for cliente_id, _ in pendentes]
+    conn.executemany("DELETE FROM cliente_chave WHERE cliente_id = ?", ids)
+    conn.executemany("INSERT OR REPLACE INTO cliente_dedupe (cliente_id, nome) VALUES (?, ?)", pendentes)
+    conn.executemany("INSERT INTO cliente_chave (chave, cliente_id) VALUES (?, ?)",
+                     [(chave, cliente_id) for cliente_id, nome in pendentes
+                      for chave in chaves_bloco(palavras_nome(nome))])
+    return len(pendentes)
+
+
+def _limpar_orfaos(conn):
+    conn.execute("DELETE FROM cliente_chave WHERE cliente_id NOT IN (SELECT id FROM Cliente)")
+    return conn.execute("DELETE FROM cliente_dedupe WHERE cliente_id NOT IN (SELECT id FROM Cliente)").rowcount
+
+
+def atualizar_chaves(tamanho_lote=TAMANHO_LOTE):
+    # Recalcula as chaves dos clientes novos/renomeados e tira as dos excluídos. Retorna quantos recalculou.
+    db_pool.escrever(_limpar_orfaos)
+    total = 0
+    while True:
+        atualizados = db_pool.escrever(lambda conn: _atualizar_lote(conn, tamanho_lote))
+        total += atualizados
+        if atualizados < tamanho_lote:
+            return total
+
+
+# --- Candidatos ---
+
+def _cpf_real(cpf):
+    return cpf if cpf and not str(cpf).startswith("TEMP_CPF_") else None
+
+
+def _digitos(telefone):
+    return re.sub(r"\D", "", telefone or "")
+
+
+def semelhanca(a, b, limiar=0.0):
+    # 0..1 entre dois clientes (dicts de _dados_cliente); abaixo de 'limiar' pode voltar só 0
+    if a["cpf"] and b["cpf"] and a["cpf"] != b["cpf"]:
+        return 0.0 # CPFs reais diferentes: pessoas diferentes, por mais parecido que seja o nome
+    if a["numeros"] != b["numeros"]:
+        return 0.0 # "FAZENDA 2" e "FAZENDA 3", "LOJA 12" e "LOJA 120": cadastros diferentes
+    bonus = 0.1 if len(a["telefone"]) >= 8 and a["telefone"] == b["telefone"] else 0.0
+    nota = 0.0
+    for texto_a, texto_b in {(a["texto"], b["texto"]), (a["ordenado"], b["ordenado"])}:
+        comparacao = SequenceMatcher(None, texto_a, texto_b)
+        # Os limites superiores baratos descartam a maioria dos pares do bloco antes do ratio()
+        if comparacao.real_quick_ratio() + bonus >= limiar and comparacao.quick_ratio() + bonus >= limiar:
+            nota = max(nota, comparacao.ratio())
+    return min(1.0, nota + bonus) if nota else 0.0
+
+
+def _dados_cliente(cliente_id, nome, cpf, telefone):
+    palavras = palavras_nome(nome)
+    return {"id": cliente_id, "nome": nome, "cpf": _cpf_real(cpf), "telefone": _digitos(telefone),
+            "texto": " ".join(palavras), "ordenado": " ".join(sorted(palavras)),
+            "numeros": sorted(palavra for palavra in palavras if palavra.isdigit())}
+
+
+def candidatos(limiar=LIMIAR_SEMELHANCA, max_bloco=MAX_BLOCO, limite=MAX_CANDIDATOS):
+    # Pares de clientes parecidos, do mais para o menos parecido: (DataFrame, blocos pulados).
+    # Rode atualizar_chaves antes, para incluir os clientes novos.
+    conn = banco.conexao_dbapi()
+    try:
+        # Um só percurso pelo índice (chave, cliente_id); blocos de 1 cliente nem saem do banco
+        linhas = conn.execute("""
+            SELECT k.chave, c.id, c.nome, c.cpf, c.telefone
+            FROM cliente_chave k JOIN Cliente c ON c.id = k.cliente_id
+            WHERE k.chave IN (SELECT chave FROM cliente_chave GROUP BY chave HAVING count(*) BETWEEN 2 AND ?)
+            ORDER BY k.chave
+        """, (max_bloco,)).fetchall()
+        pulados = conn.execute("""
+            SELECT count(*) FROM (SELECT 1 FROM cliente_chave GROUP BY chave HAVING count(*) > ?)
+        """, (max_bloco,)).fetchone()[0]
+
+        blocos = {}
+        for chave, cliente_id, nome, cpf, telefone in linhas:
+            blocos.setdefault(chave, []).append(_dados_cliente(cliente_id, nome, cpf, telefone))
+        pares, comparados = {}, set()
+        for clientes in blocos.values():
+            for i, a in enumerate(clientes):
+                for b in clientes[i + 1:]:
+                    par = (a["id"], b["id"]) if a["id"] < b["id"] else (b["id"], a["id"])
+                    if par in comparados: # Os dois também dividem a outra chave
+                        continue
+                    comparados.add(par)
+                    nota = semelhanca(a, b, limiar)
+                    if nota >= limiar:
+                        pares[par] = (nota, a, b) if a["id"] < b["id"] else (nota, b, a)
+        melhores = sorted(pares.values(), key=lambda item: (-item[0], item[1]["id"], item[2]["id"]))[:limite]
+
+        ids = sorted({cliente["id"] for _, a, b in melhores for cliente in (a, b)})
+        total_os = _contar_os(conn, ids)
+    finally:
+        conn.close()
+
+    df = pd.DataFrame([{
+        "semelhanca": round(nota, 3),
+        "id_a": a["id"], "nome_a": a["nome"], "cpf_a": a["cpf"], "os_a": total_os.get(a["id"], 0),
+        "id_b": b["id"], "nome_b": b["nome"], "cpf_b": b["cpf"], "os_b": total_os.get(b["id"], 0),
+    } for nota, a, b in melhores], columns=["semelhanca", "id_a", "nome_a", "cpf_a", "os_a",
+                                            "id_b", "nome_b", "cpf_b", "os_b"])
+    return df, pulados
+
+
+def _contar_os(conn, ids):
+    if not ids:
+        return {}
+    marcadores = ", ".join("?" for _ in ids)
+    total = {}
+    tabelas_os = ["main.OrdemDeServico"] + ([f"{arquivo_os.ALIAS}.OrdemDeServico"] if arquivo_os.anexado(conn) else [])
+    for tabela in tabelas_os: # idx_os_cliente / idx_arq_cliente
+        for cliente_id, quantidade in conn.execute(
+                f"SELECT cliente_id, count(*) FROM {tabela} WHERE cliente_id IN ({marcadores}) GROUP BY cliente_id", ids):
+            total[cliente_id] = total.get(cliente_id, 0) + quantidade
+    return total
+
+
+def agrupar(df_pares):
+    # Pares escolhidos -> ([(id mantido, [ids mesclados nele])], [pares recusados]). Pares encadeados
+    # (A~B, B~C) viram um grupo só, mas nunca juntando dois CPFs reais diferentes: cada par passa
+    # pela regra de semelhanca, a cadeia não (A com CPF, B sem, C com outro CPF). O par que juntaria
+    # os dois é recusado e volta como (id_a, id_b). Os pares vêm do mais para o menos parecido, então
+    # o mais parecido é o que fica. No grupo, fica o cliente com CPF real, depois o com mais OS,
+    # depois o mais antigo.
+    pai, cpfs = {}, {}
+    def raiz(cliente_id):
+        while pai.setdefault(cliente_id, cliente_id) != cliente_id:
+            cliente_id = pai[cliente_id]
+        return cliente_id
+
+    dados, recusados = {}, []
+    for par in df_pares.itertuples():
+        for cliente_id, cpf, total_os in ((par.id_a, par.cpf_a, par.os_a), (par.id_b, par.cpf_b, par.os_b)):
+            cpf = None if pd.isna(cpf) else _cpf_real(cpf)
+            if raiz(cliente_id) == cliente_id and cliente_id not in cpfs:
+                cpfs[cliente_id] = {cpf} if cpf else set()
+            dados.setdefault(cliente_id, (cpf, total_os))
+        raiz_a, raiz_b = raiz(par.id_a), raiz(par.id_b)
+        if raiz_a == raiz_b:
+            continue
+        if cpfs[raiz_a] and cpfs[raiz_b] and cpfs[raiz_a] != cpfs[raiz_b]:
+            recusados.append((int(par.id_a), int(par.id_b)))
+            continue
+        pai[raiz_b] = raiz_a
+        cpfs[raiz_a] |= cpfs.pop(raiz_b)
+
+    grupos = {}
+    for cliente_id in dados:
+        grupos.setdefault(raiz(cliente_id), []).append(cliente_id)
+    resultado = []
+    for membros in grupos.values():
+        if len(membros) < 2: # Só sobrou de um par recusado
+            continue
+        membros.sort(key=lambda cliente_id: (dados[cliente_id][0] is None, -dados[cliente_id][1], cliente_id))
+        resultado.append((int(membros[0]), [int(cliente_id) for cliente_id in membros[1:]]))
+    return resultado, recusados
+
+
+# --- Mesclagem ---
+
+def _mesclar_grupo(conn, manter_id, remover_ids):
+    marcadores = ", ".join("?" for _ in remover_ids)
+    tabelas_os = ["main.OrdemDeServico"] + ([f"{arquivo_os.ALIAS}.OrdemDeServico"] if arquivo_os.anexado(conn) else [])
+    movidas = 0
+    for tabela in tabelas_os:
+        movidas += conn.execute(f"UPDATE {tabela} SET cliente_id = ? WHERE cliente_id IN ({marcadores})",
+                                [manter_id] + remover_ids).rowcount
+
+    # CPF real e telefone que faltam no cliente mantido vêm dos mesclados (o CPF só depois de
+    # excluí-los, por causa do UNIQUE)
+    cpf_mantido, telefone_mantido = conn.execute("SELECT cpf, telefone FROM Cliente WHERE id = ?", (manter_id,)).fetchone()
+    removidos = conn.execute(f"SELECT cpf, telefone FROM Cliente WHERE id IN ({marcadores}) ORDER BY id", remover_ids).fetchall()
+    # Mesma garantia de agrupar, para grupos montados por outro caminho: CPFs reais diferentes são
+    # pessoas diferentes, e excluir o cliente apagaria o CPF dele
+    if len({_cpf_real(cpf) for cpf, _ in [(cpf_mantido, None)] + removidos} - {None}) > 1:
+        raise ValueError("o grupo tem clientes com CPFs diferentes.")
+    conn.execute(f"DELETE FROM Cliente WHERE id IN ({marcadores})", remover_ids)
+    if not _cpf_real(cpf_mantido):
+        cpf_mantido = next((cpf for cpf, _ in removidos if _cpf_real(cpf)), cpf_mantido)
+    if not telefone_mantido:
+        telefone_mantido = next((telefone for _, telefone in removidos if telefone), telefone_mantido)
+    conn.execute("UPDATE Cliente SET cpf = ?, telefone = ? WHERE id = ?", (cpf_mantido, telefone_mantido, manter_id))
+    return movidas
+
+
+def mesclar(grupos):
+    # Um job só na fila de escrita (uma transação); cada grupo no seu SAVEPOINT, então um grupo
+    # com erro não desfaz os outros. Retorna [(id mantido, ids mesclados, OS movidas, erro)].
+    def job(conn):
+        resultados = []
+        for manter_id, remover_ids in grupos:
+            conn.execute("SAVEPOINT mesclar")
+            try:
+                resultados.append((manter_id, remover_ids, _mesclar_grupo(conn, manter_id, remover_ids), None))
+            except Exception as e:
+                conn.execute("ROLLBACK TO mesclar")
+                resultados.append((manter_id, remover_ids, 0, e))
+            conn.execute("RELEASE mesclar")
+        return resultados
+    return db_pool.escrever(job)
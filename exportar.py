@@ -0,0 +1,82 @@
+import csv
+import io
+import tempfile
+from controllers import banco
+
+# --- Exportação de relatórios (CSV / XLSX) direto do cursor do banco ---
+# A consulta (select do SQLAlchemy) é compilada para o driver e roda num cursor comum; as linhas
+# são lidas com fetchmany, em lotes, e escritas direto no arquivo de saída: nada passa por DataFrame
+# nem pelas linhas do SQLAlchemy. O arquivo é montado num SpooledTemporaryFile (vai para o disco se crescer)
+# e só os bytes finais são entregues ao st.download_button — que recebe um callable, então
+# a exportação só roda quando o usuário clica.
+
+TAMANHO_LOTE = 5000
+LIMITE_MEMORIA_ARQUIVO = 8 * 1024 * 1024 # Acima disso o arquivo temporário vai para o disco
+
+MIME_CSV = "text/csv"
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def lotes_consulta(consulta, tamanho_lote=TAMANHO_LOTE):
+    # Gera primeiro a lista de colunas e depois listas de linhas (tuplas), um lote por vez
+    sql, params = banco.compilar(consulta)
+    conn = banco.conexao_dbapi()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        yield [coluna[0] for coluna in cursor.description]
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            yield linhas
+    finally:
+        conn.close()
+
+
+def _celula_csv(valor):
+    # Excel em pt-BR espera vírgula decimal (o separador de campos é ';')
+    return str(valor).replace(".", ",") if isinstance(valor, float) else valor
+
+
+def gerar_csv(consulta, tamanho_lote=TAMANHO_LOTE):
+    # Gera o CSV em pedaços de bytes, um por lote. O BOM no início faz o Excel abrir em UTF-8.
+    lotes = lotes_consulta(consulta, tamanho_lote)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=";")
+    escritor.writerow(next(lotes))
+    yield buffer.getvalue().encode("utf-8-sig")
+    for linhas in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows([_celula_csv(valor) for valor in linha] for linha in linhas)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _bytes_do_arquivo(arquivo):
+    with arquivo:
+        arquivo.seek(0)
+        return arquivo.read()
+
+
+def arquivo_csv(consulta):
+    arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_ARQUIVO)
+    for pedaco in gerar_csv(consulta):
+        arquivo.write(pedaco)
+    return _bytes_do_arquivo(arquivo)
+
+
+def arquivo_xlsx(consulta, nome_aba="Relatorio"):
+    # Workbook write_only: cada linha vai para o XML temporário do openpyxl assim que é adicionada
+    from openpyxl import Workbook # Só quem exporta XLSX paga o import do openpyxl
+
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(nome_aba)
+    lotes = lotes_consulta(consulta)
+    aba.append(next(lotes))
+    for linhas in lotes:
+        for linha in linhas:
+            aba.append(linha)
+    arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_ARQUIVO)
+    planilha.save(arquivo)
+    return _bytes_do_arquivo(arquivo)
@@ -0,0 +1,160 @@
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# --- Fila única de escrita ---
+# Uma thread dedicada é dona da ÚNICA conexão de escrita do app. As páginas enviam "jobs"
+# (funções que recebem a conexão e fazem INSERT/UPDATE/DELETE) e esperam o resultado; a thread
+# pega todos os jobs que já estão na fila (até MAX_JOBS_POR_TRANSACAO) e grava todos numa única
+# transação BEGIN IMMEDIATE, cada job no seu SAVEPOINT: o erro de um job desfaz só aquele job e
+# volta para quem o enviou. Como só esta conexão escreve, as sessões não disputam mais o lock
+# de escrita do SQLite ("database is locked") e cada commit (fsync) serve a vários jobs.
+#
+# Regras para os jobs: rodam em outra thread, então não chamam st.* nem usam a conexão fora
+# do job; não chamam commit()/rollback() (a fila faz isso); exceções sobem para quem enviou.
+
+MAX_JOBS_POR_TRANSACAO = 50
+TIMEOUT_PADRAO_S = 30 # Espera máxima na fila antes de o job começar a rodar
+AMOSTRAS_METRICAS = 1000 # Esperas/durações recentes guardadas para as estatísticas
+
+_PARAR = object()
+
+
+class FilaEscrita:
+
+    def __init__(self, abrir_conexao, preparar_conexao=None):
+        self._abrir_conexao = abrir_conexao # A conexão é aberta por quem envia o primeiro job
+        self._preparar_conexao = preparar_conexao # Chamada antes de cada transação, fora dela
+        self._fila = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._esperas_ms = deque(maxlen=AMOSTRAS_METRICAS)
+        self._duracoes_ms = deque(maxlen=AMOSTRAS_METRICAS) # Por transação, do BEGIN ao COMMIT
+        self.jobs_concluidos = 0
+        self.jobs_com_erro = 0
+        self.transacoes = 0
+        self.maior_lote = 0
+
+    def _garantir_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    # Aberta aqui para um erro de abertura chegar a quem chamou; daqui em diante
+                    # só a thread de escrita usa a conexão
+                    conn = self._abrir_conexao()
+                    self._thread = threading.Thread(target=self._rodar, args=(conn,), name="fila-escrita", daemon=True)
+                    self._thread.start()
+
+    def enviar(self, job):
+        # Enfileira e retorna um Future; quem não precisa esperar pode ignorá-lo
+        self._garantir_thread()
+        futuro = Future()
+        self._fila.put((job, futuro, time.perf_counter()))
+        return futuro
+
+    def executar(self, job, timeout_s=TIMEOUT_PADRAO_S):
+        # Enfileira e espera o resultado (ou a exceção do job). Se o job não começou dentro do
+        # timeout, é cancelado e levanta TimeoutError; se já começou, espera ele terminar (o
+        # chamador nunca recebe "falhou" de algo que acabou gravado).
+        futuro = self.enviar(job)
+        try:
+            return futuro.result(timeout=timeout_s)
+        except TimeoutError:
+            if futuro.cancel():
+                raise TimeoutError(f"A fila de escrita não atendeu em {timeout_s}s "
+                                   f"({self._fila.qsize()} job(s) na frente).") from None
+            return futuro.result()
+
+    def _proximo_lote(self):
+        lote = [self._fila.get()]
+        while len(lote) < MAX_JOBS_POR_TRANSACAO:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _rodar(self, conn):
+        try:
+            while True:
+                lote = self._proximo_lote()
+                parar = any(item is _PARAR for item in lote)
+                lote = [item for item in lote if item is not _PARAR and item[1].set_running_or_notify_cancel()]
+                if lote:
+                    self._gravar(conn, lote)
+                if parar:
+                    return
+        finally:
+            sqlite3.Connection.close(conn) # Fecha de fato, mesmo sendo uma conexão do pool
+
+    def _gravar(self, conn, lote):
+        inicio = time.perf_counter()
+        for _, _, enfileirado_em in lote:
+            self._esperas_ms.append((inicio - enfileirado_em) * 1000)
+        resultados = [] # (futuro, resultado, exceção)
+        try:
+            if self._preparar_conexao is not None:
+                self._preparar_conexao(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            for job, futuro, _ in lote:
+                conn.execute("SAVEPOINT job")
+                try:
+                    resultado = job(conn)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    resultados.append((futuro, None, e))
+                else:
+                    conn.execute("RELEASE job")
+                    resultados.append((futuro, resultado, None))
+            conn.commit()
+        except Exception as e:
+            # BEGIN ou COMMIT falhou (disco, lock de outro processo...): nenhum job foi gravado
+            if conn.in_transaction:
+                conn.rollback()
+            respondidos = {id(futuro) for futuro, _, _ in resultados}
+            resultados = [(futuro, None, erro if erro is not None else e) for futuro, _, erro in resultados]
+            resultados += [(futuro, None, e) for _, futuro, _ in lote if id(futuro) not in respondidos]
+        self._duracoes_ms.append((time.perf_counter() - inicio) * 1000)
+        self.transacoes += 1
+        self.maior_lote = max(self.maior_lote, len(lote))
+        # Só responde depois do COMMIT: quem recebe o resultado pode reler e ver o dado gravado
+        for futuro, resultado, erro in resultados:
+            if erro is None:
+                self.jobs_concluidos += 1
+                futuro.set_result(resultado)
+            else:
+                self.jobs_com_erro += 1
+                futuro.set_exception(erro)
+
+    def parar(self, timeout_s=None):
+        # Grava o que já está na fila, fecha a conexão e encerra a thread
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._fila.put(_PARAR)
+            thread.join(timeout_s)
+
+    def estatisticas(self):
+        esperas = sorted(self._esperas_ms)
+        duracoes = sorted(self._duracoes_ms)
+
+        def percentil(valores, p):
+            return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0.0
+
+        return {
+            "na_fila": self._fila.qsize(),
+            "jobs_concluidos": self.jobs_concluidos,
+            "jobs_com_erro": self.jobs_com_erro,
+            "transacoes": self.transacoes,
+            "jobs_por_transacao": (self.jobs_concluidos + self.jobs_com_erro) / self.transacoes if self.transacoes else 0.0,
+            "maior_lote": self.maior_lote,
+            "espera_p50_ms": percentil(esperas, 0.5),
+            "espera_p95_ms": percentil(esperas, 0.95),
+            "espera_max_ms": esperas[-1] if esperas else 0.0,
+            "transacao_p50_ms": percentil(duracoes, 0.5),
+            "transacao_p95_ms": percentil(duracoes, 0.95),
+        }
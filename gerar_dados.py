@@ -0,0 +1,195 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+import numpy as np
+from controllers import migracoes
+
+# --- Gerador de bancos sintéticos para medir desempenho ---
+# Cria um banco novo com o schema base (criar_banco_os.sql), insere consultores, clientes,
+# modelos e OS com distribuições parecidas com as da oficina e só então aplica as migrações,
+# que criam índices, FTS, resumos e triggers de uma vez (bem mais rápido que disparar os
+# triggers linha a linha). As máquinas (várias por modelo, um chassi cada) entram logo depois
+# da migração que cria Maquina e antes da que monta a última OS por máquina e a busca pelo chassi.
+# Mesma semente => mesmo banco, para comparar versões do app.
+#
+# Uso: python gerar_dados.py --ordens 100k --saida database/bench_100k.sqlite3
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_SQL = os.path.join(base_dir, "criar_banco_os.sql")
+
+TAMANHOS = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+LOTE_INSERCAO = 50_000
+
+# (nome, email, senha, permissao, peso): alguns consultores concentram boa parte das OS
+CONSULTORES = [
+    ("Admin Teste", "teste@teste.com", "123", "supervisor", 0.02),
+    ("Supervisor Geral", "supervisor@exemplo.com", "admin", "supervisor", 0.02),
+    ("Nadylla", "nadylla@exemplo.com", "123", "consultor", 0.22),
+    ("Tainara", "tainara@exemplo.com", "123", "consultor", 0.20),
+    ("222TAI221", "tainara2@exemplo.com", "senha", "consultor", 0.12),
+    ("216ANTO223", "antonio@exemplo.com", "senha", "consultor", 0.12),
+    ("223NADYLA", "nadylla2@exemplo.com", "senha", "consultor", 0.10),
+    ("Consultor 8", "consultor8@exemplo.com", "senha", "consultor", 0.08),
+    ("Consultor 9", "consultor9@exemplo.com", "senha", "consultor", 0.07),
+    ("Consultor 10", "consultor10@exemplo.com", "senha", "consultor", 0.05),
+]
+# Status das OS ainda em aberto (as faturadas ficam com 'Faturada', como faz o editor)
+STATUS_ABERTO = [("SUBMETIDA", 0.35), ("AGUARDANDO PEÇA", 0.25), ("APROVADA", 0.20),
+                 ("EM ANÁLISE", 0.12), ("RECUSADA", 0.08)]
+TIPOS_MAQUINA = [("Trator", 0.55), ("Colheitadeira", 0.15), ("Pulverizador", 0.12),
+                 ("Plantadeira", 0.10), ("Implemento", 0.08)]
+TIPOS_OS = [("Garantia", 0.8), ("Revisão", 0.15), ("Campanha", 0.05)]
+SERVICOS = ["Troca de filtro de óleo", "Revisão de 500 horas", "Vazamento no sistema hidráulico",
+            "Substituição da embreagem", "Falha no painel eletrônico", "Ajuste da plataforma de corte",
+            "Troca de rolamento do eixo dianteiro", "Recall do sensor de rotação"]
+NOMES = ["JOSE", "MARIA", "JOAO", "ANA", "ANTONIO", "FRANCISCA", "CARLOS", "PAULO", "LUCAS", "RAIMUNDO",
+         "PEDRO", "SANDRA", "MARCOS", "LUIZ", "FAZENDA", "AGROPECUARIA", "SITIO", "COOPERATIVA"]
+SOBRENOMES = ["SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "PEREIRA", "LIMA", "CARVALHO", "FERREIRA",
+              "RODRIGUES", "ALMEIDA", "COSTA", "GOMES", "NONATO", "BOA VISTA", "SAO JOSE", "DO VALE"]
+
+DIAS_HISTORICO = 3 * 365 # OS abertas nos últimos 3 anos
+OS_POR_MAQUINA = 4 # Em média, no histórico
+VERSAO_MAQUINA = 12 # Migração que cria Maquina e OrdemDeServico.maquina_id
+FRACAO_TEMP_CPF = 0.4 # Clientes cadastrados sem CPF (TEMP_CPF_...), como no formulário
+
+
+def _escolher(rng, opcoes, n):
+    valores, pesos = zip(*opcoes)
+    pesos = np.array(pesos) / sum(pesos)
+    return rng.choice(len(valores), size=n, p=pesos), list(valores)
+
+
+def _criar_dimensoes(conn, rng, total_clientes, total_modelos):
+    conn.executemany("INSERT INTO Consultor (nome, email, senha, permissao) VALUES (?, ?, ?, ?)",
+                     [linha[:4] for linha in CONSULTORES])
+    conn.executemany("INSERT INTO Status (descricao) VALUES (?)", [(s,) for s, _ in STATUS_ABERTO] + [("Faturada",)])
+    conn.executemany("INSERT INTO TipoMaquina (descricao) VALUES (?)", [(t,) for t, _ in TIPOS_MAQUINA])
+
+    tipos, _ = _escolher(rng, TIPOS_MAQUINA, total_modelos)
+    conn.executemany("INSERT INTO Modelo (nome_modelo, chassi, tipo_maquina_id) VALUES (?, ?, ?)",
+                     [(f"{TIPOS_MAQUINA[t][0].upper()} MODELO {i:04d}", f"9AGT{rng.integers(10**12, 10**13)}", int(t) + 1)
+                      for i, t in enumerate(tipos)])
+
+    carimbo = datetime(2024, 1, 1).strftime('%Y%m%d%H%M%S%f')
+    clientes = []
+    for i in range(total_clientes):
+        nome = f"{NOMES[rng.integers(len(NOMES))]} {SOBRENOMES[rng.integers(len(SOBRENOMES))]} {i}"
+        if rng.random() < FRACAO_TEMP_CPF:
+            cpf = f"TEMP_CPF_{nome.replace(' ', '_').upper()}_{carimbo}"
+            telefone = None
+        else:
+            cpf = f"{i:011d}"
+            telefone = f"(69) 9{rng.integers(10**7, 10**8)}"
+        clientes.append((nome, cpf, telefone))
+    conn.executemany("INSERT INTO Cliente (nome, cpf, telefone) VALUES (?, ?, ?)", clientes)
+
+
+def _criar_maquinas(conn, rng, total_maquinas, total_modelos):
+    # Cada modelo tem ao menos uma máquina; as demais se espalham pelos modelos ao acaso. Cada OS
+    # fica com uma das máquinas do seu modelo.
+    modelos = np.sort(np.concatenate([np.arange(1, total_modelos + 1),
+                                      rng.integers(1, total_modelos + 1, max(total_maquinas - total_modelos, 0))]))
+    conn.executemany("INSERT INTO Maquina (id, chassi, modelo_id) VALUES (?, ?, ?)",
+                     [(i + 1, f"9BWM{rng.integers(10**5, 10**6)}{i:07d}", int(modelo_id))
+                      for i, modelo_id in enumerate(modelos)])
+    primeira = np.searchsorted(modelos, np.arange(1, total_modelos + 2)) # Máquinas do modelo m: [primeira[m-1], primeira[m])
+    os_ids, os_modelos = np.array(conn.execute("SELECT id, modelo_id FROM OrdemDeServico ORDER BY id").fetchall()).T
+    quantidade = primeira[os_modelos] - primeira[os_modelos - 1]
+    maquinas = primeira[os_modelos - 1] + (rng.random(len(os_ids)) * quantidade).astype(int) + 1
+    conn.executemany("UPDATE OrdemDeServico SET maquina_id = ? WHERE id = ?",
+                     zip(maquinas.tolist(), os_ids.tolist()))
+
+
+def _gerar_lote_os(rng, inicio, n, total_clientes, total_modelos, hoje):
+    # Retorna as tuplas de UM lote de OS (vetorizado com numpy; só a montagem final é por linha)
+    consultores, _ = _escolher(rng, [(c[0], c[4]) for c in CONSULTORES], n)
+    tipos_os, nomes_tipos_os = _escolher(rng, TIPOS_OS, n)
+    # Mais OS recentes que antigas (oficina crescendo): idade ~ exponencial limitada ao histórico
+    idade_dias = np.minimum(rng.exponential(DIAS_HISTORICO / 3, n), DIAS_HISTORICO).astype(int)
+    abertura = np.datetime64(hoje) - idade_dias.astype("timedelta64[D]")
+    # Quanto mais antiga, maior a chance de já estar faturada; o faturamento leva de 2 a 90 dias
+    prazo = rng.integers(2, 91, n)
+    faturada = (idade_dias > prazo) & (rng.random(n) < np.clip(idade_dias / 60, 0, 0.97))
+    faturamento = abertura + prazo.astype("timedelta64[D]")
+    pagamento = faturamento + rng.integers(10, 60, n).astype("timedelta64[D]")
+    pago = faturada & (pagamento <= np.datetime64(hoje)) & (rng.random(n) < 0.8)
+    status_aberto, nomes_status = _escolher(rng, STATUS_ABERTO, n)
+    status_faturada_id = len(STATUS_ABERTO) + 1
+    valores = np.round(rng.lognormal(mean=7.5, sigma=1.0, size=n), 2) # ~R$ 1.800 de mediana
+    clientes = rng.integers(1, total_clientes + 1, n)
+    modelos = rng.integers(1, total_modelos + 1, n)
+    servicos = rng.integers(len(SERVICOS), size=n)
+
+    abertura_txt = abertura.astype(str)
+    faturamento_txt = faturamento.astype(str)
+    pagamento_txt = pagamento.astype(str)
+    return [
+        (f"{inicio + i + 1:07d}", nomes_tipos_os[tipos_os[i]], int(clientes[i]), int(modelos[i]),
+         int(consultores[i]) + 1, status_faturada_id if faturada[i] else int(status_aberto[i]) + 1,
+         SERVICOS[servicos[i]], abertura_txt[i],
+         faturamento_txt[i] if faturada[i] else None, pagamento_txt[i] if pago[i] else None,
+         float(valores[i]))
+        for i in range(n)
+    ]
+
+
+def gerar_banco(caminho, total_ordens, semente=42, hoje=None):
+    if os.path.exists(caminho):
+        raise FileExistsError(f"{caminho} já existe; escolha outro arquivo ou apague o atual.")
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    rng = np.random.default_rng(semente)
+    hoje = hoje or date.today()
+    total_clientes = max(total_ordens // 4, 10)
+    total_modelos = max(min(total_ordens // 200, 2000), 20)
+    total_maquinas = max(total_ordens // OS_POR_MAQUINA, total_modelos)
+
+    conn = sqlite3.connect(caminho)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF") # Banco descartável: carga rápida
+        with open(SCHEMA_SQL, encoding="utf-8") as arquivo:
+            conn.executescript(arquivo.read())
+
+        inicio = time.perf_counter()
+        _criar_dimensoes(conn, rng, total_clientes, total_modelos)
+        for lote_inicio in range(0, total_ordens, LOTE_INSERCAO):
+            n = min(LOTE_INSERCAO, total_ordens - lote_inicio)
+            conn.executemany("""
+                INSERT INTO OrdemDeServico
+                (numero_os, tipo_os, cliente_id, modelo_id, consultor_id, status_id, descricao_servico,
+                 data_abertura, data_faturamento, data_pagamento_fabrica, valor_liquido)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, _gerar_lote_os(rng, lote_inicio, n, total_clientes, total_modelos, hoje))
+            conn.commit()
+        tempo_carga = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        migracoes.aplicar_migracoes(conn, [m for m in migracoes.MIGRACOES if m[0] <= VERSAO_MAQUINA])
+        _criar_maquinas(conn, rng, total_maquinas, total_modelos)
+        conn.commit()
+        migracoes.aplicar_migracoes(conn)
+        tempo_migracoes = time.perf_counter() - inicio
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return {"ordens": total_ordens, "clientes": total_clientes, "modelos": total_modelos, "maquinas": total_maquinas,
+            "carga_s": round(tempo_carga, 2), "migracoes_s": round(tempo_migracoes, 2)}
+
+
+def _total_ordens(texto):
+    return TAMANHOS.get(texto.lower()) or int(texto)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um banco sintético de Ordens de Serviço.")
+    parser.add_argument("--ordens", default="10k", help="10k, 100k, 1m ou um número")
+    parser.add_argument("--saida", required=True, help="Arquivo .sqlite3 a criar (não pode existir)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--hoje", type=date.fromisoformat, default=None,
+                        help="Data de referência (AAAA-MM-DD); fixe-a para gerar exatamente o mesmo banco")
+    args = parser.parse_args()
+    resumo = gerar_banco(args.saida, _total_ordens(args.ordens), args.semente, args.hoje)
+    print(f"✅ Banco sintético criado em {args.saida}: {resumo}")
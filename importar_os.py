@@ -0,0 +1,356 @@
+import re
+import unicodedata
+from datetime import date, datetime
+import pandas as pd
+from controllers import db_pool
+from controllers import dinheiro
+from controllers import arquivo_os # Números de OS já arquivados também contam como existentes
+from controllers import consultas_maquinas # normalizar_chassi
+
+# --- Importação em lote de Ordens de Serviço (XLSX / CSV) ---
+# O arquivo é lido em lotes de tamanho fixo (openpyxl em modo read_only, ou read_csv com chunksize),
+# então a memória usada não cresce com o tamanho do arquivo. Para cada lote:
+#   1. valida as linhas de forma vetorizada (obrigatórios, datas, valores, consultor, OS repetida);
+#   2. resolve clientes, modelos, máquinas, tipos de máquina e status em lote (IN (...) + executemany),
+#      com a mesma regra dos db_utils.get_or_create_*;
+#   3. insere as OS com executemany, numa transação por lote (um job da fila de escrita).
+# Linhas com erro não são gravadas e voltam no relatório (número da linha no arquivo + motivo).
+
+TAMANHO_LOTE = 500
+MAX_ERROS_REPORTADOS = 1000 # O relatório guarda só os primeiros; o total vai no resumo
+
+TIPO_OS_PADRAO = "Garantia" # Mesmo padrão do formulário de nova OS
+TIPO_MAQUINA_PADRAO = "Trator"
+
+# Coluna canônica -> nomes aceitos no cabeçalho (já normalizados: minúsculas, sem acento, '_')
+COLUNAS = {
+    "numero_os": ["numero_os", "os", "n_os", "numero", "num_os"],
+    "cliente": ["cliente", "nome_cliente", "cliente_nome"],
+    "cpf": ["cpf", "cpf_cnpj", "cliente_cpf"],
+    "telefone": ["telefone", "fone", "cliente_telefone"],
+    "consultor": ["consultor", "nome_consultor", "consultor_nome"],
+    "modelo": ["modelo", "nome_modelo", "modelo_nome"],
+    "chassi": ["chassi"],
+    "tipo_maquina": ["tipo_maquina", "tipo"],
+    "status": ["status", "status_descricao"],
+    "data_abertura": ["data_abertura", "abertura"],
+    "data_faturamento": ["data_faturamento", "faturamento"],
+    "descricao_servico": ["descricao_servico", "descricao", "servico"],
+    "valor_liquido": ["valor_liquido", "valor"],
+    "tipo_os": ["tipo_os"],
+}
+OBRIGATORIAS = ["numero_os", "cliente", "consultor", "modelo", "chassi", "status", "data_abertura"]
+
+
+def _normalizar_cabecalho(nome):
+    texto = unicodedata.normalize("NFKD", str(nome or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"\W+", "_", texto.strip().lower()).strip("_")
+
+
+def _mapear_colunas(cabecalho):
+    # cabeçalho do arquivo -> coluna canônica; erro se faltar alguma obrigatória
+    apelidos = {apelido: coluna for coluna, lista in COLUNAS.items() for apelido in lista}
+    mapa = {}
+    for original in cabecalho:
+        coluna = apelidos.get(_normalizar_cabecalho(original))
+        if coluna and coluna not in mapa.values():
+            mapa[original] = coluna
+    ausentes = [coluna for coluna in OBRIGATORIAS if coluna not in mapa.values()]
+    if ausentes:
+        raise ValueError(f"Colunas obrigatórias ausentes no arquivo: {', '.join(ausentes)}")
+    return mapa
+
+
+def _texto_celula(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime("%Y-%m-%d")
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+# --- Leitura em lotes ---
+
+def _detectar_encoding(arquivo):
+    # Planilhas exportadas no Windows costumam vir em latin-1/cp1252; confere só o começo do arquivo
+    amostra = arquivo.read(65536)
+    arquivo.seek(0)
+    try:
+        amostra.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(amostra) - 3: # Erro no meio da amostra (não um caractere cortado no fim)
+            return "latin-1"
+    return "utf-8-sig"
+
+
+def _lotes_csv(arquivo, tamanho_lote):
+    arquivo.seek(0, 2)
+    tamanho = arquivo.tell() or 1
+    arquivo.seek(0)
+    leitor = pd.read_csv(arquivo, sep=None, engine="python", dtype=str, keep_default_na=False,
+                         encoding=_detectar_encoding(arquivo), chunksize=tamanho_lote)
+    with leitor:
+        for lote in leitor:
+            lote.index = lote.index + 2 # Linha no arquivo (1 = cabeçalho)
+            yield lote, min(arquivo.tell() / tamanho, 1.0)
+
+
+def _lotes_xlsx(arquivo, tamanho_lote):
+    from openpyxl import load_workbook # Só quem importa planilhas paga o import do openpyxl
+
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        aba = planilha.active
+        total_linhas = aba.max_row or 0
+        linhas = aba.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        colunas = [_texto_celula(valor) for valor in cabecalho]
+        largura = len(colunas)
+        valores, numeros = [], []
+        for numero, linha in enumerate(linhas, start=2):
+            celulas = [_texto_celula(valor) for valor in linha[:largura]]
+            if not any(celula.strip() for celula in celulas):
+                continue
+            valores.append(celulas + [""] * (largura - len(celulas)))
+            numeros.append(numero)
+            if len(valores) >= tamanho_lote:
+                yield pd.DataFrame(valores, columns=colunas, index=numeros), min(numero / total_linhas, 1.0) if total_linhas else 0.0
+                valores, numeros = [], []
+        if valores:
+            yield pd.DataFrame(valores, columns=colunas, index=numeros), 1.0
+    finally:
+        planilha.close()
+
+
+def ler_lotes(arquivo, nome_arquivo, tamanho_lote=TAMANHO_LOTE):
+    # Gera (DataFrame do lote com colunas canônicas, fração do arquivo já lida).
+    # O índice do DataFrame é o número da linha no arquivo, usado no relatório de erros.
+    if nome_arquivo.lower().endswith(".xlsx"):
+        lotes = _lotes_xlsx(arquivo, tamanho_lote)
+    elif nome_arquivo.lower().endswith(".csv"):
+        lotes = _lotes_csv(arquivo, tamanho_lote)
+    else:
+        raise ValueError("Formato não suportado. Use .xlsx ou .csv.")
+
+    mapa = None
+    for lote, fracao in lotes:
+        if mapa is None:
+            mapa = _mapear_colunas(lote.columns)
+        lote = lote[list(mapa)].rename(columns=mapa)
+        lote = lote.reindex(columns=list(COLUNAS), fill_value="").fillna("").astype(str)
+        yield lote.apply(lambda coluna: coluna.str.strip()), fracao
+
+
+# --- Validação e resolução das dimensões (por lote) ---
+
+def _parse_datas(serie):
+    iso = pd.to_datetime(serie.where(serie.str.match(r"\d{4}-")), format="ISO8601", errors="coerce")
+    br = pd.to_datetime(serie.where(serie.str.match(r"\d{1,2}/")), format="%d/%m/%Y", errors="coerce")
+    datas = iso.fillna(br)
+    invalidos = serie.ne("") & datas.isna()
+    return datas.dt.strftime("%Y-%m-%d").astype(object).where(datas.notna(), None), invalidos
+
+
+def _marcadores(valores):
+    return ", ".join("?" for _ in valores)
+
+
+def _obter_ou_criar(cursor, tabela, coluna, valores):
+    # Status / TipoMaquina: 'descricao' é UNIQUE, então INSERT OR IGNORE + SELECT resolve o lote todo
+    valores = list(dict.fromkeys(valores))
+    cursor.executemany(f"INSERT OR IGNORE INTO {tabela} ({coluna}) VALUES (?)", [(valor,) for valor in valores])
+    cursor.execute(f"SELECT {coluna}, id FROM {tabela} WHERE {coluna} IN ({_marcadores(valores)})", valores)
+    return dict(cursor.fetchall())
+
+
+def _resolver_consultores(cursor, nomes):
+    # Só busca (como get_consultor_id_by_name): consultor inexistente é erro da linha. Nome repetido: menor id.
+    nomes = list(dict.fromkeys(nomes))
+    cursor.execute(f"SELECT nome, MIN(id) FROM Consultor WHERE nome IN ({_marcadores(nomes)}) GROUP BY nome", nomes)
+    return dict(cursor.fetchall())
+
+
+def _resolver_modelos(cursor, lote, tipos_ids):
+    # Chave (nome_modelo, tipo_maquina_id) como em get_or_create_modelo. Um modelo novo guarda o
+    # chassi da última OS do lote; o de um modelo existente não muda (o chassi da OS fica na Maquina).
+    chaves = pd.DataFrame({"nome": lote["modelo"], "tipo": lote["tipo_maquina"].map(tipos_ids), "chassi": lote["chassi"]})
+    ultimos = chaves.drop_duplicates(["nome", "tipo"], keep="last")
+    nomes = ultimos["nome"].unique().tolist()
+
+    def carregar():
+        cursor.execute(f"SELECT nome_modelo, tipo_maquina_id, id FROM Modelo WHERE nome_modelo IN ({_marcadores(nomes)})", nomes)
+        return {(nome, tipo): id_ for nome, tipo, id_ in cursor.fetchall()}
+
+    modelos = carregar()
+    novos = [(nome, chassi, tipo) for nome, tipo, chassi in ultimos[["nome", "tipo", "chassi"]].itertuples(index=False)
+             if (nome, tipo) not in modelos]
+    if novos:
+        cursor.executemany("INSERT OR IGNORE INTO Modelo (nome_modelo, chassi, tipo_maquina_id) VALUES (?, ?, ?)", novos)
+        modelos = carregar()
+    return pd.Series([modelos.get(chave) for chave in zip(chaves["nome"], chaves["tipo"])], index=lote.index, dtype=object)
+
+
+def _resolver_maquinas(cursor, lote, modelo_ids):
+    # Mesma regra de get_or_create_maquina: o chassi identifica a máquina, e uma máquina nova fica
+    # com o modelo da primeira linha do lote com aquele chassi
+    chassis = lote["chassi"].map(consultas_maquinas.normalizar_chassi)
+    novas = pd.DataFrame({"chassi": chassis, "modelo_id": modelo_ids[lote.index]}).drop_duplicates("chassi")
+    cursor.executemany("INSERT OR IGNORE INTO Maquina (chassi, modelo_id) VALUES (?, ?)",
+                       [(chassi, int(modelo_id)) for chassi, modelo_id in novas.itertuples(index=False)])
+    unicos = novas["chassi"].tolist()
+    cursor.execute(f"SELECT chassi, id FROM Maquina WHERE chassi IN ({_marcadores(unicos)})", unicos)
+    return chassis.map(dict(cursor.fetchall()))
+
+
+def _resolver_clientes(cursor, lote):
+    # Mesma regra de get_or_create_cliente: com CPF, o CPF identifica o cliente; sem CPF, reaproveita
+    # o cliente de mesmo nome sem CPF (ou com TEMP_CPF_) ou cria um novo com TEMP_CPF_.
+    # Diferença: telefone vazio na planilha não apaga o telefone já cadastrado.
+    telefones = lote["telefone"].where(lote["telefone"].ne(""), None)
+    ids = pd.Series(None, index=lote.index, dtype=object)
+
+    com_cpf = lote["cpf"].ne("")
+    if com_cpf.any():
+        ultimos = pd.DataFrame({"cpf": lote["cpf"], "nome": lote["cliente"], "telefone": telefones})[com_cpf] \
+                    .drop_duplicates("cpf", keep="last")
+        cpfs = ultimos["cpf"].tolist()
+        cursor.execute(f"SELECT cpf, id FROM Cliente WHERE cpf IN ({_marcadores(cpfs)})", cpfs)
+        existentes = dict(cursor.fetchall())
+        cursor.executemany("UPDATE Cliente SET nome = ?, telefone = COALESCE(?, telefone) WHERE id = ?",
+                           [(nome, telefone, existentes[cpf]) for cpf, nome, telefone in ultimos.itertuples(index=False)
+                            if cpf in existentes])
+        cursor.executemany("INSERT INTO Cliente (nome, cpf, telefone) VALUES (?, ?, ?)",
+                           [(nome, cpf, telefone) for cpf, nome, telefone in ultimos.itertuples(index=False)
+                            if cpf not in existentes])
+        cursor.execute(f"SELECT cpf, id FROM Cliente WHERE cpf IN ({_marcadores(cpfs)})", cpfs)
+        ids[com_cpf] = lote.loc[com_cpf, "cpf"].map(dict(cursor.fetchall()))
+
+    sem_cpf = ~com_cpf
+    if sem_cpf.any():
+        ultimos = pd.DataFrame({"nome": lote["cliente"], "telefone": telefones})[sem_cpf].drop_duplicates("nome", keep="last")
+        nomes = ultimos["nome"].tolist()
+        consulta = f"""
+            SELECT nome, MIN(id) FROM Cliente
+            WHERE nome IN ({_marcadores(nomes)}) AND (cpf IS NULL OR cpf LIKE 'TEMP_CPF_%')
+            GROUP BY nome
+        """
+        cursor.execute(consulta, nomes)
+        existentes = dict(cursor.fetchall())
+        cursor.executemany("UPDATE Cliente SET telefone = COALESCE(?, telefone) WHERE id = ?",
+                           [(telefone, existentes[nome]) for nome, telefone in ultimos.itertuples(index=False)
+                            if nome in existentes])
+        # O carimbo é um só para o lote e nomes diferentes podem dar o mesmo texto ("Maria Souza" e
+        # "MARIA SOUZA"): a linha da planilha no fim deixa cada TEMP_CPF_ único
+        carimbo = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        cursor.executemany("INSERT INTO Cliente (nome, cpf, telefone) VALUES (?, ?, ?)",
+                           [(nome, f"TEMP_CPF_{nome.replace(' ', '_').upper()}_{carimbo}_{indice}", telefone)
+                            for indice, nome, telefone in ultimos.itertuples() if nome not in existentes])
+        cursor.execute(consulta, nomes)
+        ids[sem_cpf] = lote.loc[sem_cpf, "cliente"].map(dict(cursor.fetchall()))
+    return ids
+
+
+def _importar_lote(conn, lote):
+    # Retorna (OS inseridas, lista de erros {linha, numero_os, erro}) de UM lote, dentro da transação de quem chama
+    cursor = conn.cursor()
+    erros = pd.Series("", index=lote.index, dtype=object)
+
+    def marcar(mascara, mensagem):
+        novos = mascara & erros.eq("")
+        erros[novos] = mensagem if isinstance(mensagem, str) else mensagem[novos]
+
+    vazios = lote[OBRIGATORIAS].eq("")
+    if vazios.any(axis=None):
+        faltando = vazios.apply(lambda linha: ", ".join(linha.index[linha]), axis=1) # Só nomes das colunas
+        marcar(vazios.any(axis=1), "Campos obrigatórios vazios: " + faltando)
+
+    datas_abertura, abertura_invalida = _parse_datas(lote["data_abertura"])
+    marcar(abertura_invalida, "Data de abertura inválida (use AAAA-MM-DD ou DD/MM/AAAA).")
+    datas_faturamento, faturamento_invalido = _parse_datas(lote["data_faturamento"])
+    marcar(faturamento_invalido, "Data de faturamento inválida (use AAAA-MM-DD ou DD/MM/AAAA).")
+    centavos, valor_invalido = dinheiro.parse_brl(lote["valor_liquido"])
+    centavos.index = lote.index
+    valor_invalido.index = lote.index
+    marcar(valor_invalido, "Valor líquido inválido (ex: 123.45 ou 1.234,56).")
+
+    marcar(lote["numero_os"].duplicated(), "Número de OS repetido no arquivo.")
+    numeros = lote.loc[erros.eq(""), "numero_os"].tolist()
+    if numeros:
+        consulta = f"SELECT numero_os FROM OrdemDeServico WHERE numero_os IN ({_marcadores(numeros)})"
+        parametros = list(numeros)
+        if arquivo_os.anexado(conn):
+            consulta += f" UNION ALL SELECT numero_os FROM {arquivo_os.ALIAS}.OrdemDeServico WHERE numero_os IN ({_marcadores(numeros)})"
+            parametros += numeros
+        cursor.execute(consulta, parametros)
+        marcar(lote["numero_os"].isin([linha[0] for linha in cursor.fetchall()]), "Já existe uma OS com este número.")
+
+    validas = erros.eq("")
+    if validas.any():
+        consultores = lote.loc[validas, "consultor"].map(_resolver_consultores(cursor, lote.loc[validas, "consultor"]))
+        marcar(validas & lote.index.isin(consultores.index[consultores.isna()]),
+               "Consultor não encontrado (cadastre-o antes na página de Consultores).")
+
+    validas = erros.eq("")
+    if not validas.any():
+        return 0, _relatorio_erros(lote, erros)
+
+    ok = lote[validas].copy()
+    ok["tipo_maquina"] = ok["tipo_maquina"].mask(ok["tipo_maquina"].eq(""), TIPO_MAQUINA_PADRAO)
+    status_ids = ok["status"].map(_obter_ou_criar(cursor, "Status", "descricao", ok["status"]))
+    tipos_ids = _obter_ou_criar(cursor, "TipoMaquina", "descricao", ok["tipo_maquina"])
+    modelo_ids = _resolver_modelos(cursor, ok, tipos_ids)
+    marcar(lote.index.isin(modelo_ids.index[modelo_ids.isna()]), "Modelo já cadastrado com outro tipo de máquina.")
+    ok = ok[modelo_ids.notna()]
+    if ok.empty:
+        return 0, _relatorio_erros(lote, erros)
+    cliente_ids = _resolver_clientes(cursor, ok)
+    maquina_ids = _resolver_maquinas(cursor, ok, modelo_ids)
+
+    linhas = pd.DataFrame({
+        "numero_os": ok["numero_os"],
+        "tipo_os": ok["tipo_os"].mask(ok["tipo_os"].eq(""), TIPO_OS_PADRAO),
+        "cliente_id": cliente_ids,
+        "modelo_id": modelo_ids[ok.index],
+        "consultor_id": consultores[ok.index],
+        "status_id": status_ids[ok.index],
+        "descricao_servico": ok["descricao_servico"],
+        "data_abertura": datas_abertura[ok.index],
+        "data_faturamento": datas_faturamento[ok.index],
+        "valor_liquido_centavos": centavos[ok.index].astype(object).where(centavos[ok.index].notna(), None),
+        "maquina_id": maquina_ids,
+    }).astype(object)
+    cursor.executemany("""
+        INSERT INTO OrdemDeServico
+        (numero_os, tipo_os, cliente_id, modelo_id, consultor_id, status_id, descricao_servico,
+         data_abertura, data_faturamento, valor_liquido_centavos, maquina_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [tuple(None if pd.isna(valor) else (int(valor) if isinstance(valor, float) else valor) for valor in linha)
+          for linha in linhas.itertuples(index=False)])
+    return len(linhas), _relatorio_erros(lote, erros)
+
+
+def _relatorio_erros(lote, erros):
+    com_erro = erros.ne("")
+    return [{"linha": linha, "numero_os": numero_os, "erro": erro}
+            for linha, numero_os, erro in zip(lote.index[com_erro], lote.loc[com_erro, "numero_os"], erros[com_erro])]
+
+
+def importar_os(arquivo, nome_arquivo, tamanho_lote=TAMANHO_LOTE, ao_progredir=None):
+    # Importa o arquivo inteiro, um lote por transação. Lotes já gravados continuam gravados se um
+    # lote posterior falhar. 'ao_progredir(resumo, fracao)' é chamado após cada lote.
+    # Retorna (resumo, erros) — 'erros' limitado a MAX_ERROS_REPORTADOS.
+    resumo = {"lidas": 0, "inseridas": 0, "com_erro": 0}
+    erros = []
+    for lote, fracao in ler_lotes(arquivo, nome_arquivo, tamanho_lote):
+        inseridas, erros_lote = db_pool.escrever(lambda conn: _importar_lote(conn, lote))
+        resumo["lidas"] += len(lote)
+        resumo["inseridas"] += inseridas
+        resumo["com_erro"] += len(erros_lote)
+        erros.extend(erros_lote[:MAX_ERROS_REPORTADOS - len(erros)])
+        if ao_progredir:
+            ao_progredir(resumo, fracao)
+    return resumo, erros
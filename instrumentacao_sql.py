@@ -0,0 +1,226 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+
+# --- Instrumentação das consultas SQL ---
+# As conexões do db_pool criam cursores desta classe, então conn.execute, conn.executemany,
+# cursor.execute e pd.read_sql_query (que usa cursor() + execute + fetchall) passam por aqui.
+# Cada statement é agrupado pelo SQL normalizado (literais e listas IN viram '?') e acumula
+# execuções, tempo (execute + fetch) e linhas. Statements acima de LIMIAR_LENTA_MS vão para o
+# log de lentas junto com o EXPLAIN QUERY PLAN. Os números são do processo (servidor Streamlit),
+# somando todas as sessões, e zeram quando o servidor reinicia.
+
+ATIVO = os.environ.get("OS_SQL_INSTRUMENTACAO", "1") != "0" # "0" desliga (cursor padrão do sqlite3)
+LIMIAR_LENTA_MS = float(os.environ.get("OS_SQL_LENTA_MS", "250"))
+MAX_CONSULTAS_LENTAS = 100 # Entradas mantidas no log de lentas (as mais recentes)
+MAX_FORMATOS_PARAMS = 5 # Formatos de parâmetros distintos guardados por statement
+
+logger = logging.getLogger(__name__)
+
+_RE_LITERAL_OU_COMENTARIO = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.S)
+_RE_NUMERO = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+_RE_LISTA_PARAMS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACOS = re.compile(r"\s+")
+_RE_PARAM_NOMEADO = re.compile(r"(?<![:\w])[:@$]([A-Za-z_]\w*)")
+_COMANDOS_COM_PLANO = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_estatisticas = {} # sql normalizado -> dict com os acumulados
+_lentas = deque(maxlen=MAX_CONSULTAS_LENTAS)
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def normalizar(sql):
+    # "WHERE id IN (?, ?, ?) AND nome = 'X' LIMIT 50" -> "WHERE id IN (...) AND nome = ? LIMIT ?"
+    sql = _RE_LITERAL_OU_COMENTARIO.sub(lambda m: "?" if m.group(0).startswith("'") else " ", sql)
+    sql = _RE_NUMERO.sub("?", sql)
+    sql = _RE_LISTA_PARAMS.sub("(...)", sql)
+    return _RE_ESPACOS.sub(" ", sql).strip()
+
+
+def _formato_params(parametros, em_lote):
+    if em_lote:
+        return f"lote de {len(parametros)}" if hasattr(parametros, "__len__") else "lote"
+    if isinstance(parametros, dict):
+        return f"{len(parametros)} nomeados"
+    return f"{len(parametros)} posicionais" if parametros else "sem parâmetros"
+
+
+def _primeiro_conjunto(seq_parametros):
+    # executemany: o plano usa o primeiro conjunto do lote. Um iterador já foi consumido pela
+    # execução; aí não há conjunto (None) e _plano usa NULLs.
+    if isinstance(seq_parametros, (list, tuple)) and seq_parametros:
+        return seq_parametros[0]
+    return None
+
+
+def _parametros_nulos(sql):
+    # Um NULL por parâmetro do statement (o sqlite3 recusa EXPLAIN com parâmetros faltando:
+    # "Incorrect number of bindings"). NULL não muda a escolha de índices.
+    sem_literais = _RE_LITERAL_OU_COMENTARIO.sub(" ", sql)
+    nomeados = _RE_PARAM_NOMEADO.findall(sem_literais)
+    if nomeados:
+        return {nome: None for nome in nomeados}
+    return (None,) * sem_literais.count("?")
+
+
+def _plano(conn, sql, parametros):
+    # EXPLAIN QUERY PLAN com os mesmos parâmetros (num cursor comum, para não se medir de novo).
+    # parametros None (lote sem um conjunto disponível): NULL em cada parâmetro.
+    if not sql.lstrip().upper().startswith(_COMANDOS_COM_PLANO):
+        return None
+    if parametros is None:
+        parametros = _parametros_nulos(sql)
+    try:
+        linhas = conn.cursor(sqlite3.Cursor).execute(f"EXPLAIN QUERY PLAN {sql}", parametros or ()).fetchall()
+    except sqlite3.Error as e:
+        return f"(plano indisponível: {e})"
+    profundidade = {0: -1}
+    saida = []
+    for id_no, pai, _, detalhe in linhas:
+        profundidade[id_no] = profundidade.get(pai, -1) + 1
+        saida.append("  " * profundidade[id_no] + detalhe)
+    return "\n".join(saida)
+
+
+def _registrar(chave, formato, segundos, linhas, execucao, total_statement_s):
+    with _lock:
+        estat = _estatisticas.get(chave)
+        if estat is None:
+            estat = _estatisticas[chave] = {"sql": chave, "execucoes": 0, "tempo_total_s": 0.0,
+                                            "tempo_max_s": 0.0, "linhas": 0, "lentas": 0, "formatos": set()}
+        estat["execucoes"] += execucao
+        estat["tempo_total_s"] += segundos
+        estat["tempo_max_s"] = max(estat["tempo_max_s"], total_statement_s)
+        estat["linhas"] += linhas
+        if len(estat["formatos"]) < MAX_FORMATOS_PARAMS:
+            estat["formatos"].add(formato)
+        return estat
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    # Mede o statement atual do execute até o fim do fetch. Quem lê só a primeira linha
+    # (conn.execute(...).fetchone()) nunca "termina" o fetch, por isso a lentidão é verificada
+    # já no execute e de novo a cada fetch.
+    _medicao = None # {"chave", "sql", "parametros", "formato", "segundos", "linhas", "lenta"}
+
+    def _medir(self, metodo, sql, parametros, em_lote):
+        self._medicao = None
+        inicio = time.perf_counter()
+        try:
+            return metodo(sql, parametros)
+        finally:
+            segundos = time.perf_counter() - inicio
+            # SELECT: as linhas chegam no fetch; INSERT/UPDATE/DELETE: rowcount já é o total
+            linhas = 0 if self.description is not None else max(self.rowcount, 0)
+            medicao = {"chave": normalizar(sql), "sql": sql,
+                       "parametros": _primeiro_conjunto(parametros) if em_lote else parametros,
+                       "formato": _formato_params(parametros, em_lote), "segundos": segundos,
+                       "linhas": linhas, "lenta": None}
+            _registrar(medicao["chave"], medicao["formato"], segundos, linhas, 1, segundos)
+            self._verificar_lenta(medicao)
+            if self.description is not None:
+                self._medicao = medicao
+
+    def execute(self, sql, parameters=()):
+        return self._medir(super().execute, sql, parameters, False)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._medir(super().executemany, sql, seq_of_parameters, True)
+
+    def _contar_fetch(self, inicio, linhas, terminou):
+        medicao = self._medicao
+        if medicao is None:
+            return
+        segundos = time.perf_counter() - inicio
+        medicao["segundos"] += segundos
+        medicao["linhas"] += linhas
+        _registrar(medicao["chave"], medicao["formato"], segundos, linhas, 0, medicao["segundos"])
+        self._verificar_lenta(medicao)
+        if terminou:
+            self._medicao = None
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        linha = super().fetchone()
+        self._contar_fetch(inicio, 0 if linha is None else 1, linha is None)
+        return linha
+
+    def fetchmany(self, size=None):
+        tamanho = self.arraysize if size is None else size
+        inicio = time.perf_counter()
+        linhas = super().fetchmany(tamanho)
+        self._contar_fetch(inicio, len(linhas), len(linhas) < tamanho)
+        return linhas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        linhas = super().fetchall()
+        self._contar_fetch(inicio, len(linhas), True)
+        return linhas
+
+    def _verificar_lenta(self, medicao):
+        tempo_ms = medicao["segundos"] * 1000
+        entrada = medicao["lenta"]
+        if entrada is not None:
+            # Já está no log: só atualiza com o tempo e as linhas do fetch
+            entrada["tempo_ms"] = tempo_ms
+            entrada["linhas"] = medicao["linhas"]
+            return
+        if tempo_ms < LIMIAR_LENTA_MS:
+            return
+        plano = _plano(self.connection, medicao["sql"], medicao["parametros"])
+        entrada = medicao["lenta"] = {
+            "quando": datetime.now(),
+            "sql": medicao["chave"],
+            "parametros": medicao["formato"],
+            "tempo_ms": tempo_ms,
+            "linhas": medicao["linhas"],
+            "full_scan": plano is not None and re.search(r"\bSCAN (?!CONSTANT)", plano) is not None,
+            "plano": plano,
+        }
+        with _lock:
+            estat = _estatisticas.get(medicao["chave"])
+            if estat is not None:
+                estat["lentas"] += 1
+            _lentas.append(entrada)
+        logger.warning("Consulta lenta (%.0f ms, %s): %s", tempo_ms, medicao["formato"], medicao["chave"])
+
+
+def consultas_mais_lentas(limite=50):
+    # Statements ordenados pelo tempo total (o que mais pesa no servidor, somando as execuções)
+    with _lock:
+        copia = [dict(estat, formatos=", ".join(sorted(estat["formatos"]))) for estat in _estatisticas.values()]
+    linhas = []
+    for estat in sorted(copia, key=lambda e: e["tempo_total_s"], reverse=True)[:limite]:
+        execucoes = estat["execucoes"] or 1
+        linhas.append({
+            "sql": estat["sql"],
+            "execucoes": estat["execucoes"],
+            "tempo_total_ms": estat["tempo_total_s"] * 1000,
+            "tempo_medio_ms": estat["tempo_total_s"] * 1000 / execucoes,
+            "tempo_max_ms": estat["tempo_max_s"] * 1000,
+            "linhas": estat["linhas"],
+            "linhas_por_execucao": estat["linhas"] / execucoes,
+            "lentas": estat["lentas"],
+            "parametros": estat["formatos"],
+        })
+    return linhas
+
+
+def consultas_lentas():
+    # Log de lentas, da mais recente para a mais antiga
+    with _lock:
+        return [dict(entrada) for entrada in reversed(_lentas)]
+
+
+def zerar():
+    with _lock:
+        _estatisticas.clear()
+        _lentas.clear()
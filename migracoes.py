@@ -0,0 +1,607 @@
+import sqlite3
+import pandas as pd
+from datetime import datetime
+from controllers import db_pool
+from controllers import arquivo_os
+from controllers import busca_fts
+from controllers import dinheiro
+
+# --- Migrações versionadas do schema ---
+# Cada migração é (versao, descricao, passo). O passo é um script SQL ou uma função
+# que recebe a conexão. Migrações aplicadas NUNCA devem ser editadas: crie uma nova.
+# Por isso o SQL de cada passo fica aqui, congelado, e não nos módulos que usam as tabelas:
+# mudar uma constante de lá faria um banco novo sair diferente de um banco atualizado.
+
+MIGRACOES = [
+    (1, "Índices parciais para OS em aberto", """
+        CREATE INDEX IF NOT EXISTS idx_os_aberto_consultor_abertura
+            ON OrdemDeServico (consultor_id, data_abertura)
+            WHERE data_faturamento IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_os_aberto_abertura
+            ON OrdemDeServico (data_abertura)
+            WHERE data_faturamento IS NULL;
+    """),
+    (2, "Índices para OS faturadas", """
+        CREATE INDEX IF NOT EXISTS idx_os_faturamento
+            ON OrdemDeServico (data_faturamento)
+            WHERE data_faturamento IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_os_consultor_faturamento
+            ON OrdemDeServico (consultor_id, data_faturamento)
+            WHERE data_faturamento IS NOT NULL;
+    """),
+    (3, "Índices das chaves estrangeiras usadas nos JOINs", """
+        CREATE INDEX IF NOT EXISTS idx_os_cliente ON OrdemDeServico (cliente_id);
+        CREATE INDEX IF NOT EXISTS idx_os_modelo ON OrdemDeServico (modelo_id);
+        CREATE INDEX IF NOT EXISTS idx_os_status ON OrdemDeServico (status_id);
+        CREATE INDEX IF NOT EXISTS idx_modelo_tipo_maquina ON Modelo (tipo_maquina_id);
+    """),
+    (4, "Revisão por tabela mantida por triggers (invalidação de caches)",
+        lambda conn: _criar_revisoes(conn, [
+            ("Status", ["INSERT", "UPDATE", "DELETE"]),
+            ("TipoMaquina", ["INSERT", "UPDATE", "DELETE"]),
+            # Modelo.chassi é reescrito a cada nova OS; só nome/tipo afetam a chave do cache
+            ("Modelo", ["INSERT", "UPDATE OF nome_modelo, tipo_maquina_id", "DELETE"]),
+            ("Consultor", ["INSERT", "UPDATE OF nome", "DELETE"]),
+        ])),
+    (5, "Índice de busca textual (FTS5) de OS, clientes e chassis", lambda conn: _criar_indice_busca_os(conn)),
+    (6, "Resumo de OS em aberto por (consultor, status) mantido por triggers", """
+        CREATE TABLE IF NOT EXISTS resumo_os_aberto (
+            consultor_id INTEGER NOT NULL,
+            status_id INTEGER NOT NULL,
+            total_ordens INTEGER NOT NULL,
+            valor_total REAL NOT NULL,
+            PRIMARY KEY (consultor_id, status_id)
+        ) WITHOUT ROWID;
+
+        DELETE FROM resumo_os_aberto;
+        INSERT INTO resumo_os_aberto (consultor_id, status_id, total_ordens, valor_total)
+            SELECT consultor_id, status_id, COUNT(*), COALESCE(SUM(valor_liquido), 0)
+            FROM OrdemDeServico
+            WHERE data_faturamento IS NULL
+            GROUP BY consultor_id, status_id;
+
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_os_insert
+        AFTER INSERT ON OrdemDeServico WHEN new.data_faturamento IS NULL
+        BEGIN
+            INSERT INTO resumo_os_aberto (consultor_id, status_id, total_ordens, valor_total)
+                VALUES (new.consultor_id, new.status_id, 1, COALESCE(new.valor_liquido, 0))
+                ON CONFLICT (consultor_id, status_id) DO UPDATE SET
+                    total_ordens = total_ordens + 1,
+                    valor_total = valor_total + excluded.valor_total;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_os_delete
+        AFTER DELETE ON OrdemDeServico WHEN old.data_faturamento IS NULL
+        BEGIN
+            UPDATE resumo_os_aberto SET
+                total_ordens = total_ordens - 1,
+                valor_total = valor_total - COALESCE(old.valor_liquido, 0)
+            WHERE consultor_id = old.consultor_id AND status_id = old.status_id;
+            DELETE FROM resumo_os_aberto WHERE total_ordens <= 0;
+        END;
+
+        -- Update = retira a versão antiga (se estava em aberto) e soma a nova (se continua em aberto)
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_os_update_sai
+        AFTER UPDATE OF consultor_id, status_id, data_faturamento, valor_liquido ON OrdemDeServico
+        WHEN old.data_faturamento IS NULL
+        BEGIN
+            UPDATE resumo_os_aberto SET
+                total_ordens = total_ordens - 1,
+                valor_total = valor_total - COALESCE(old.valor_liquido, 0)
+            WHERE consultor_id = old.consultor_id AND status_id = old.status_id;
+            DELETE FROM resumo_os_aberto WHERE total_ordens <= 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_os_update_entra
+        AFTER UPDATE OF consultor_id, status_id, data_faturamento, valor_liquido ON OrdemDeServico
+        WHEN new.data_faturamento IS NULL
+        BEGIN
+            INSERT INTO resumo_os_aberto (consultor_id, status_id, total_ordens, valor_total)
+                VALUES (new.consultor_id, new.status_id, 1, COALESCE(new.valor_liquido, 0))
+                ON CONFLICT (consultor_id, status_id) DO UPDATE SET
+                    total_ordens = total_ordens + 1,
+                    valor_total = valor_total + excluded.valor_total;
+        END;
+    """),
+    (7, "Colunas geradas ano/mês de faturamento e índices de período", lambda conn: _criar_colunas_periodo(conn)),
+    (8, "Valores em centavos inteiros (valor_liquido -> valor_liquido_centavos)", lambda conn: _migrar_valores_para_centavos(conn)),
+    (9, "Revisões de Cliente e OrdemDeServico (cache de consultas versionado)",
+        lambda conn: _criar_revisoes(conn, [
+            ("Cliente", ["INSERT", "UPDATE", "DELETE"]),
+            ("OrdemDeServico", ["INSERT", "UPDATE", "DELETE"]),
+        ])),
+    (10, "Índice de clientes por nome e busca textual (FTS5) de clientes", lambda conn: _executar_script(conn, SQL_BUSCA_CLIENTES)),
+    (11, "Chaves de bloco para detectar clientes duplicados", lambda conn: _executar_script(conn, SQL_CHAVES_DUPLICADOS)),
+    (12, "Máquinas por chassi (Maquina, OrdemDeServico.maquina_id e última OS por máquina)", lambda conn: _executar_script(conn, SQL_MAQUINAS)),
+    (13, "Máquinas a partir do histórico e busca textual pelo chassi da máquina", lambda conn: _carregar_maquinas_do_historico(conn)),
+    (14, "Índice (modelo, chassi) do inventário de máquinas e revisão de Maquina", lambda conn: _indexar_inventario_maquinas(conn)),
+    (15, "OS arquivadas de volta na busca textual", lambda conn: _reindexar_arquivadas(conn)),
+    (16, "Última OS por máquina: OS nova ou alterada só substitui uma mais antiga", lambda conn: _executar_script(conn, SQL_ULTIMA_OS_MAIS_NOVA)),
+]
+
+
+def _criar_revisoes(conn, tabelas_eventos):
+    # Cria 'tabela_revisao' (se preciso) e um trigger por evento que troca a revisão da tabela.
+    # A revisão é um valor aleatório, não um contador: um rollback devolveria o contador a um
+    # valor já visto, e um cache tomaria dado desfeito como válido.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tabela_revisao (
+            tabela TEXT PRIMARY KEY,
+            revisao INTEGER NOT NULL
+        )
+    """)
+    for tabela, eventos in tabelas_eventos:
+        conn.execute("INSERT OR IGNORE INTO tabela_revisao (tabela, revisao) VALUES (?, random())", (tabela,))
+        for evento in eventos:
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_revisao_{tabela}_{evento.split()[0].lower()}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    UPDATE tabela_revisao SET revisao = random() WHERE tabela = '{tabela}';
+                END
+            """)
+
+
+# --- Passos congelados das migrações 5, 7 e 10 a 13 ---
+# Cópias do SQL como ele foi entregue em cada versão. Os módulos de consulta (busca_fts,
+# busca_clientes, consultas_maquinas...) leem essas tabelas, mas não as criam.
+
+# Tabela virtual 'busca_os' (colunas na ordem de busca_fts.COLUNAS_FTS) e o INSERT dos triggers
+SQL_TABELA_BUSCA_OS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS busca_os USING fts5(
+        numero_os, descricao_servico, cliente_nome, cliente_cpf,
+        cliente_telefone, modelo_nome, chassi, chassi_final,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+"""
+INSERT_BUSCA_OS = """INSERT INTO busca_os (rowid, numero_os, descricao_servico, cliente_nome, cliente_cpf,
+                                           cliente_telefone, modelo_nome, chassi, chassi_final)"""
+
+# Migração 5: o chassi vinha de Modelo
+SELECT_BUSCA_OS_V5 = """
+    SELECT os.id, os.numero_os, os.descricao_servico, c.nome,
+           CASE WHEN c.cpf LIKE 'TEMP_CPF_%' THEN NULL ELSE c.cpf END,
+           c.telefone, m.nome_modelo, m.chassi, substr(m.chassi, -6)
+    FROM OrdemDeServico os
+    LEFT JOIN Cliente c ON c.id = os.cliente_id
+    LEFT JOIN Modelo m ON m.id = os.modelo_id
+"""
+COLUNAS_OS_BUSCA_V5 = "numero_os, descricao_servico, cliente_id, modelo_id"
+RELACIONADAS_BUSCA_V5 = [("Cliente", "cliente_id", "nome, cpf, telefone"),
+                         ("Modelo", "modelo_id", "nome_modelo, chassi")]
+
+# Migração 13: o chassi vem da máquina da OS (o mesmo SELECT de busca_fts.SELECT_LINHAS_BUSCA)
+SELECT_BUSCA_OS_V13 = """
+    SELECT os.id, os.numero_os, os.descricao_servico, c.nome,
+           CASE WHEN c.cpf LIKE 'TEMP_CPF_%' THEN NULL ELSE c.cpf END,
+           c.telefone, m.nome_modelo, maq.chassi, substr(maq.chassi, -6)
+    FROM OrdemDeServico os
+    LEFT JOIN Cliente c ON c.id = os.cliente_id
+    LEFT JOIN Modelo m ON m.id = os.modelo_id
+    LEFT JOIN Maquina maq ON maq.id = os.maquina_id
+"""
+COLUNAS_OS_BUSCA_V13 = "numero_os, descricao_servico, cliente_id, modelo_id, maquina_id"
+RELACIONADAS_BUSCA_V13 = [("Cliente", "cliente_id", "nome, cpf, telefone"),
+                          ("Modelo", "modelo_id", "nome_modelo"),
+                          ("Maquina", "maquina_id", "chassi")]
+
+
+def _criar_indice_busca_os(conn, select_linhas=SELECT_BUSCA_OS_V5, colunas_os=COLUNAS_OS_BUSCA_V5,
+                           relacionadas=RELACIONADAS_BUSCA_V5):
+    # Migração 5 (e 13, com as linhas da V13): tabela virtual, triggers de sincronização e carga inicial
+    conn.execute(SQL_TABELA_BUSCA_OS)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_busca_os_insert AFTER INSERT ON OrdemDeServico
+        BEGIN
+            {INSERT_BUSCA_OS} {select_linhas} WHERE os.id = new.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_busca_os_update
+        AFTER UPDATE OF {colunas_os} ON OrdemDeServico
+        BEGIN
+            DELETE FROM busca_os WHERE rowid = old.id;
+            {INSERT_BUSCA_OS} {select_linhas} WHERE os.id = new.id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_busca_os_delete AFTER DELETE ON OrdemDeServico
+        BEGIN
+            DELETE FROM busca_os WHERE rowid = old.id;
+        END
+    """)
+    # Mudanças no cliente/modelo/máquina reindexam só as OS ligadas a ele (idx_os_cliente / idx_os_modelo / idx_os_maquina)
+    for tabela, coluna_fk, colunas in relacionadas:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_busca_os_{tabela.lower()}_update
+            AFTER UPDATE OF {colunas} ON {tabela}
+            BEGIN
+                DELETE FROM busca_os WHERE rowid IN (SELECT id FROM OrdemDeServico WHERE {coluna_fk} = new.id);
+                {INSERT_BUSCA_OS} {select_linhas} WHERE os.{coluna_fk} = new.id;
+            END
+        """)
+    conn.execute("DELETE FROM busca_os")
+    conn.execute(f"{INSERT_BUSCA_OS} {select_linhas}")
+
+
+def _criar_colunas_periodo(conn):
+    # Migração 7. ALTER TABLE não aceita IF NOT EXISTS para colunas, então confere antes.
+    colunas = {linha[1] for linha in conn.execute("PRAGMA table_xinfo(OrdemDeServico)")}
+    if "ano_faturamento" not in colunas:
+        conn.execute("""
+            ALTER TABLE OrdemDeServico ADD COLUMN ano_faturamento INTEGER
+            GENERATED ALWAYS AS (CAST(strftime('%Y', data_faturamento) AS INTEGER)) VIRTUAL
+        """)
+    if "mes_faturamento" not in colunas:
+        conn.execute("""
+            ALTER TABLE OrdemDeServico ADD COLUMN mes_faturamento INTEGER
+            GENERATED ALWAYS AS (CAST(strftime('%m', data_faturamento) AS INTEGER)) VIRTUAL
+        """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_os_faturamento_ano_mes
+            ON OrdemDeServico (ano_faturamento, mes_faturamento)
+            WHERE data_faturamento IS NOT NULL
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_os_faturamento_mes
+            ON OrdemDeServico (mes_faturamento, data_faturamento)
+            WHERE data_faturamento IS NOT NULL
+    """)
+
+
+# Migração 10. CPFs temporários (TEMP_CPF_...) não são indexados, como em busca_os.
+SQL_BUSCA_CLIENTES = """
+    CREATE INDEX IF NOT EXISTS idx_cliente_nome ON Cliente (nome);
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS busca_cliente USING fts5(
+        nome, cpf, telefone,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_busca_cliente_insert AFTER INSERT ON Cliente
+    BEGIN
+        INSERT INTO busca_cliente (rowid, nome, cpf, telefone)
+            VALUES (new.id, new.nome, CASE WHEN new.cpf LIKE 'TEMP_CPF_%' THEN NULL ELSE new.cpf END, new.telefone);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busca_cliente_update AFTER UPDATE OF nome, cpf, telefone ON Cliente
+    BEGIN
+        DELETE FROM busca_cliente WHERE rowid = old.id;
+        INSERT INTO busca_cliente (rowid, nome, cpf, telefone)
+            VALUES (new.id, new.nome, CASE WHEN new.cpf LIKE 'TEMP_CPF_%' THEN NULL ELSE new.cpf END, new.telefone);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busca_cliente_delete AFTER DELETE ON Cliente
+    BEGIN
+        DELETE FROM busca_cliente WHERE rowid = old.id;
+    END;
+
+    DELETE FROM busca_cliente;
+    INSERT INTO busca_cliente (rowid, nome, cpf, telefone)
+        SELECT c.id, c.nome, CASE WHEN c.cpf LIKE 'TEMP_CPF_%' THEN NULL ELSE c.cpf END, c.telefone FROM Cliente c;
+"""
+
+# Migração 11; as chaves são preenchidas por duplicados_clientes.atualizar_chaves
+SQL_CHAVES_DUPLICADOS = """
+    CREATE TABLE IF NOT EXISTS cliente_dedupe (
+        cliente_id INTEGER PRIMARY KEY, -- Sem FOREIGN KEY: órfãos são limpos em atualizar_chaves
+        nome TEXT NOT NULL -- Nome usado no cálculo das chaves
+    );
+    CREATE TABLE IF NOT EXISTS cliente_chave (
+        chave TEXT NOT NULL,
+        cliente_id INTEGER NOT NULL,
+        PRIMARY KEY (chave, cliente_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_cliente_chave_cliente ON cliente_chave (cliente_id);
+"""
+
+# Migração 12. O ALTER TABLE roda uma vez só: a migração e o registro da versão são uma transação.
+SQL_MAQUINAS = """
+    CREATE TABLE IF NOT EXISTS Maquina (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chassi TEXT NOT NULL, -- Sem espaços nas pontas e em maiúsculas (normalizar_chassi)
+        modelo_id INTEGER NOT NULL,
+        FOREIGN KEY (modelo_id) REFERENCES Modelo(id)
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_maquina_chassi ON Maquina (chassi);
+    CREATE INDEX IF NOT EXISTS idx_maquina_modelo ON Maquina (modelo_id);
+
+    ALTER TABLE OrdemDeServico ADD COLUMN maquina_id INTEGER REFERENCES Maquina(id);
+    -- Parcial: as OS antigas sem chassi conhecido (maquina_id nulo) ficam fora do índice
+    CREATE INDEX IF NOT EXISTS idx_os_maquina ON OrdemDeServico (maquina_id, data_abertura, id)
+        WHERE maquina_id IS NOT NULL;
+
+    CREATE TABLE IF NOT EXISTS maquina_ultima_os (
+        maquina_id INTEGER PRIMARY KEY,
+        os_id INTEGER NOT NULL,
+        cliente_id INTEGER NOT NULL,
+        data_abertura DATE,
+        data_faturamento DATE
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_maquina_ultima_os_insert
+    AFTER INSERT ON OrdemDeServico
+    WHEN new.maquina_id IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+            SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento FROM OrdemDeServico
+            WHERE maquina_id = new.maquina_id ORDER BY data_abertura DESC, id DESC LIMIT 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_maquina_ultima_os_update
+    AFTER UPDATE OF maquina_id, cliente_id, data_abertura, data_faturamento ON OrdemDeServico
+    BEGIN
+        DELETE FROM maquina_ultima_os WHERE maquina_id = old.maquina_id AND os_id = old.id;
+        INSERT OR REPLACE INTO maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+            SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento FROM OrdemDeServico
+            WHERE maquina_id = old.maquina_id ORDER BY data_abertura DESC, id DESC LIMIT 1;
+        INSERT OR REPLACE INTO maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+            SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento FROM OrdemDeServico
+            WHERE maquina_id = new.maquina_id ORDER BY data_abertura DESC, id DESC LIMIT 1;
+    END;
+
+    -- Só troca a linha se a OS excluída era a última e a máquina ainda tem outra OS
+    CREATE TRIGGER IF NOT EXISTS trg_maquina_ultima_os_delete
+    AFTER DELETE ON OrdemDeServico
+    WHEN old.maquina_id IS NOT NULL
+    BEGIN
+        DELETE FROM maquina_ultima_os WHERE maquina_id = old.maquina_id AND os_id = old.id
+            AND EXISTS (SELECT 1 FROM OrdemDeServico WHERE maquina_id = old.maquina_id);
+        INSERT OR IGNORE INTO maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+            SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento FROM OrdemDeServico
+            WHERE maquina_id = old.maquina_id ORDER BY data_abertura DESC, id DESC LIMIT 1;
+    END;
+"""
+
+
+def _carregar_maquinas_do_historico(conn):
+    # Migração 13. Modelo.chassi guarda só o chassi da última OS gravada do modelo: ele vira uma
+    # máquina, ligada a essa OS (a de maior id do modelo, no banco principal ou no arquivo). O
+    # chassi das OS anteriores foi sobrescrito e não é reconstruível; elas ficam sem máquina em vez
+    # de ficar com um chassi que não era o delas.
+    conn.execute("""
+        INSERT OR IGNORE INTO Maquina (chassi, modelo_id)
+        SELECT upper(trim(chassi)), id FROM Modelo WHERE trim(coalesce(chassi, '')) <> '' ORDER BY id
+    """)
+    bancos_os = ["main"] + ([arquivo_os.ALIAS] if arquivo_os.anexado(conn) else [])
+    todas_os = " UNION ALL ".join(f"SELECT id, modelo_id FROM {nome}.OrdemDeServico" for nome in bancos_os)
+    for nome in bancos_os:
+        conn.execute(f"""
+            UPDATE {nome}.OrdemDeServico SET maquina_id = (
+                SELECT maq.id FROM Modelo m JOIN Maquina maq ON maq.chassi = upper(trim(m.chassi))
+                WHERE m.id = OrdemDeServico.modelo_id)
+            WHERE id IN (SELECT max(id) FROM ({todas_os}) GROUP BY modelo_id)
+        """)
+    # Última OS de cada máquina de uma vez (os triggers já cuidaram das do banco principal; aqui entram
+    # também as máquinas cuja única OS está no arquivo)
+    todas_os = " UNION ALL ".join(
+        f"SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento FROM {nome}.OrdemDeServico"
+        " WHERE maquina_id IS NOT NULL" for nome in bancos_os)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+        SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento FROM (
+            SELECT *, row_number() OVER (PARTITION BY maquina_id ORDER BY data_abertura DESC, id DESC) AS posicao
+            FROM ({todas_os}))
+        WHERE posicao = 1
+    """)
+    # O chassi da busca passa a vir da máquina da OS. CREATE TRIGGER IF NOT EXISTS não substitui
+    # os triggers da migração 5: saem antes.
+    for sufixo in ["insert", "update", "delete", "cliente_update", "modelo_update"]:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_busca_os_{sufixo}")
+    _criar_indice_busca_os(conn, SELECT_BUSCA_OS_V13, COLUNAS_OS_BUSCA_V13, RELACIONADAS_BUSCA_V13)
+
+
+def _indexar_inventario_maquinas(conn):
+    # O novo índice começa por modelo_id, então substitui idx_maquina_modelo. A revisão de Maquina
+    # invalida a distribuição por tipo em cache na página de Máquinas.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_maquina_modelo_chassi ON Maquina (modelo_id, chassi)")
+    conn.execute("DROP INDEX IF EXISTS idx_maquina_modelo")
+    _criar_revisoes(conn, [("Maquina", ["INSERT", "UPDATE OF chassi, modelo_id", "DELETE"])])
+
+
+def _reindexar_arquivadas(conn):
+    # Migração 15. As OS arquivadas antes desta versão tinham saído da busca (trg_busca_os_delete).
+    # A conexão das migrações já anexou o arquivo, se ele existe.
+    if not arquivo_os.anexado(conn):
+        return
+    do_arquivo = SELECT_BUSCA_OS_V13.replace("FROM OrdemDeServico os", f"FROM {arquivo_os.ALIAS}.OrdemDeServico os")
+    conn.execute(f"DELETE FROM busca_os WHERE rowid IN (SELECT id FROM {arquivo_os.ALIAS}.OrdemDeServico)")
+    conn.execute(f"{INSERT_BUSCA_OS} {do_arquivo}")
+
+
+# Migração 16. A linha de maquina_ultima_os pode apontar para uma OS arquivada (arquivo_os), que os
+# triggers da migração 12 não enxergam: recalcular pelo banco principal a trocava por uma OS mais
+# antiga. Agora a OS inserida ou alterada só entra no lugar de uma mais antiga, na mesma ordem de
+# idx_os_maquina (data_abertura, id).
+SQL_ULTIMA_OS_MAIS_NOVA = """
+    DROP TRIGGER IF EXISTS trg_maquina_ultima_os_insert;
+    DROP TRIGGER IF EXISTS trg_maquina_ultima_os_update;
+
+    CREATE TRIGGER trg_maquina_ultima_os_insert
+    AFTER INSERT ON OrdemDeServico
+    WHEN new.maquina_id IS NOT NULL
+    BEGIN
+        INSERT INTO maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+            VALUES (new.maquina_id, new.id, new.cliente_id, new.data_abertura, new.data_faturamento)
+            ON CONFLICT (maquina_id) DO UPDATE SET
+                os_id = excluded.os_id, cliente_id = excluded.cliente_id,
+                data_abertura = excluded.data_abertura, data_faturamento = excluded.data_faturamento
+            WHERE (coalesce(excluded.data_abertura, ''), excluded.os_id)
+                >= (coalesce(maquina_ultima_os.data_abertura, ''), maquina_ultima_os.os_id);
+    END;
+
+    -- Se a linha era desta OS, é recalculada pelo banco principal; se era de outra (talvez
+    -- arquivada), fica, e a OS alterada só entra no lugar dela se for mais nova
+    CREATE TRIGGER trg_maquina_ultima_os_update
+    AFTER UPDATE OF maquina_id, cliente_id, data_abertura, data_faturamento ON OrdemDeServico
+    BEGIN
+        DELETE FROM maquina_ultima_os WHERE maquina_id = old.maquina_id AND os_id = old.id;
+        INSERT OR IGNORE INTO maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+            SELECT maquina_id, id, cliente_id, data_abertura, data_faturamento FROM OrdemDeServico
+            WHERE maquina_id = old.maquina_id ORDER BY data_abertura DESC, id DESC LIMIT 1;
+        INSERT INTO maquina_ultima_os (maquina_id, os_id, cliente_id, data_abertura, data_faturamento)
+            SELECT new.maquina_id, new.id, new.cliente_id, new.data_abertura, new.data_faturamento
+            WHERE new.maquina_id IS NOT NULL
+            ON CONFLICT (maquina_id) DO UPDATE SET
+                os_id = excluded.os_id, cliente_id = excluded.cliente_id,
+                data_abertura = excluded.data_abertura, data_faturamento = excluded.data_faturamento
+            WHERE (coalesce(excluded.data_abertura, ''), excluded.os_id)
+                >= (coalesce(maquina_ultima_os.data_abertura, ''), maquina_ultima_os.os_id);
+    END;
+"""
+
+
+SQL_RESUMO_OS_ABERTO_CENTAVOS = """
+    CREATE TABLE resumo_os_aberto (
+        consultor_id INTEGER NOT NULL,
+        status_id INTEGER NOT NULL,
+        total_ordens INTEGER NOT NULL,
+        valor_total_centavos INTEGER NOT NULL,
+        PRIMARY KEY (consultor_id, status_id)
+    ) WITHOUT ROWID;
+
+    INSERT INTO resumo_os_aberto (consultor_id, status_id, total_ordens, valor_total_centavos)
+        SELECT consultor_id, status_id, COUNT(*), COALESCE(SUM(valor_liquido_centavos), 0)
+        FROM OrdemDeServico
+        WHERE data_faturamento IS NULL
+        GROUP BY consultor_id, status_id;
+
+    CREATE TRIGGER trg_resumo_os_insert
+    AFTER INSERT ON OrdemDeServico WHEN new.data_faturamento IS NULL
+    BEGIN
+        INSERT INTO resumo_os_aberto (consultor_id, status_id, total_ordens, valor_total_centavos)
+            VALUES (new.consultor_id, new.status_id, 1, COALESCE(new.valor_liquido_centavos, 0))
+            ON CONFLICT (consultor_id, status_id) DO UPDATE SET
+                total_ordens = total_ordens + 1,
+                valor_total_centavos = valor_total_centavos + excluded.valor_total_centavos;
+    END;
+
+    CREATE TRIGGER trg_resumo_os_delete
+    AFTER DELETE ON OrdemDeServico WHEN old.data_faturamento IS NULL
+    BEGIN
+        UPDATE resumo_os_aberto SET
+            total_ordens = total_ordens - 1,
+            valor_total_centavos = valor_total_centavos - COALESCE(old.valor_liquido_centavos, 0)
+        WHERE consultor_id = old.consultor_id AND status_id = old.status_id;
+        DELETE FROM resumo_os_aberto WHERE total_ordens <= 0;
+    END;
+
+    CREATE TRIGGER trg_resumo_os_update_sai
+    AFTER UPDATE OF consultor_id, status_id, data_faturamento, valor_liquido_centavos ON OrdemDeServico
+    WHEN old.data_faturamento IS NULL
+    BEGIN
+        UPDATE resumo_os_aberto SET
+            total_ordens = total_ordens - 1,
+            valor_total_centavos = valor_total_centavos - COALESCE(old.valor_liquido_centavos, 0)
+        WHERE consultor_id = old.consultor_id AND status_id = old.status_id;
+        DELETE FROM resumo_os_aberto WHERE total_ordens <= 0;
+    END;
+
+    CREATE TRIGGER trg_resumo_os_update_entra
+    AFTER UPDATE OF consultor_id, status_id, data_faturamento, valor_liquido_centavos ON OrdemDeServico
+    WHEN new.data_faturamento IS NULL
+    BEGIN
+        INSERT INTO resumo_os_aberto (consultor_id, status_id, total_ordens, valor_total_centavos)
+            VALUES (new.consultor_id, new.status_id, 1, COALESCE(new.valor_liquido_centavos, 0))
+            ON CONFLICT (consultor_id, status_id) DO UPDATE SET
+                total_ordens = total_ordens + 1,
+                valor_total_centavos = valor_total_centavos + excluded.valor_total_centavos;
+    END;
+"""
+
+
+def _migrar_valores_para_centavos(conn):
+    # O resumo e seus triggers referenciam valor_liquido: saem antes do DROP COLUMN e voltam em centavos
+    for trigger in ["trg_resumo_os_insert", "trg_resumo_os_delete", "trg_resumo_os_update_sai", "trg_resumo_os_update_entra"]:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS resumo_os_aberto")
+
+    conn.execute("ALTER TABLE OrdemDeServico ADD COLUMN valor_liquido_centavos INTEGER")
+    # Valores numéricos convertem no próprio SQLite...
+    conn.execute("""
+        UPDATE OrdemDeServico SET valor_liquido_centavos = CAST(ROUND(valor_liquido * 100) AS INTEGER)
+        WHERE typeof(valor_liquido) IN ('integer', 'real')
+    """)
+    # ...e textos legados ('R$ 1.234,56') passam pelo parse vetorizado. Texto inválido vira NULL.
+    linhas_texto = conn.execute("SELECT id, valor_liquido FROM OrdemDeServico WHERE typeof(valor_liquido) = 'text'").fetchall()
+    if linhas_texto:
+        ids = [id_ for id_, _ in linhas_texto]
+        centavos, _ = dinheiro.parse_brl([valor for _, valor in linhas_texto])
+        conn.executemany("UPDATE OrdemDeServico SET valor_liquido_centavos = ? WHERE id = ?",
+                         [(None if pd.isna(c) else int(c), id_) for c, id_ in zip(centavos, ids)])
+    conn.execute("ALTER TABLE OrdemDeServico DROP COLUMN valor_liquido")
+
+    _executar_script(conn, SQL_RESUMO_OS_ABERTO_CENTAVOS)
+
+
+def _executar_script(conn, script):
+    # Executa statement por statement (executescript faria COMMIT no meio da transação)
+    statement = ""
+    for linha in script.splitlines(keepends=True):
+        statement += linha
+        if sqlite3.complete_statement(statement):
+            if statement.strip():
+                conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        conn.execute(statement)
+
+
+def _garantir_tabela_versao(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def versao_atual(conn):
+    _garantir_tabela_versao(conn)
+    resultado = conn.execute("SELECT MAX(versao) FROM schema_version").fetchone()
+    return resultado[0] or 0
+
+
+def aplicar_migracoes(conn, migracoes=MIGRACOES):
+    # Aplica, em ordem, as migrações ainda não registradas. Idempotente: pode rodar a cada startup.
+    aplicadas = []
+    for versao, descricao, passo in sorted(migracoes, key=lambda m: m[0]):
+        if versao <= versao_atual(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Outro processo pode ter aplicado enquanto esperávamos o lock
+            ja_aplicada = conn.execute("SELECT 1 FROM schema_version WHERE versao = ?", (versao,)).fetchone()
+            if not ja_aplicada:
+                if callable(passo):
+                    passo(conn)
+                else:
+                    _executar_script(conn, passo)
+                conn.execute("INSERT INTO schema_version (versao, descricao, aplicada_em) VALUES (?, ?, ?)",
+                             (versao, descricao, datetime.now().isoformat(timespec='seconds')))
+                aplicadas.append(versao)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if aplicadas and arquivo_os.anexado(conn):
+        # Triggers TEMP do arquivo na busca (não são schema): ao anexar, esta conexão talvez ainda
+        # não tivesse o índice da migração 13
+        busca_fts.criar_triggers_arquivo(conn)
+    return aplicadas
+
+
+def garantir_schema():
+    # Chamado no startup do app (uma vez por processo). O schema de um servidor (OS_DATABASE_URL)
+    # é mantido fora do app: estas migrações são do SQLite.
+    if not db_pool.BANCO_SQLITE:
+        return []
+    conn = db_pool.conectar()
+    try:
+        return aplicar_migracoes(conn)
+    finally:
+        conn.close()
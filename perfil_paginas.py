@@ -0,0 +1,205 @@
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import statistics
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# --- Perfil de cada rerun das páginas (opcional) ---
+# O app.py chama perfilar() no lugar de pagina() quando o supervisor liga o perfil na barra
+# lateral ou quando o servidor sobe com OS_PERFIL_PAGINAS=1 (aí vale para todas as sessões).
+# Cada rerun roda sob cProfile; o tempo próprio de cada função é somado por seção conforme o
+# pacote de onde ela vem (SQL, pandas/numpy, plotly, Streamlit) e as seções são expressas em ms
+# do tempo de parede. Os perfis ficam num histórico por página, exportáveis como .pstats
+# (snakeviz, pstats) ou JSON do speedscope.
+#
+# Só a thread do script é perfilada: as consultas que consultas_paralelas roda nas threads do
+# pool aparecem como espera, não como tempo de SQL. No Python 3.12+ só um cProfile pode estar
+# ativo por processo; o rerun que encontra outro ativo (outra sessão sendo perfilada) roda sem
+# perfil e só é contado.
+
+ATIVO_AMBIENTE = os.environ.get("OS_PERFIL_PAGINAS") == "1"
+HISTORICO_POR_PAGINA = 20
+MIN_AMOSTRA_SPEEDSCOPE_S = 0.0001 # Caminhos abaixo disso ficam fora do flame graph
+PROFUNDIDADE_MAXIMA = 64
+
+# (seção, trechos do caminho do arquivo ou do nome da função embutida); a primeira que casar vence
+SECOES = [
+    ("consulta", ("sqlite3", "instrumentacao_sql", "CursorInstrumentado", "db_pool")),
+    ("gráfico", ("/plotly/",)),
+    ("transformação", ("/pandas/", "/numpy/", "pandas.", "numpy.")),
+    ("widgets", ("/streamlit/", "/pyarrow/", "/google/protobuf/", "pyarrow.")),
+]
+SECAO_OUTROS = "outros" # Código das próprias páginas, stdlib etc.
+
+_historico = {} # título da página -> deque de execuções (mais antiga primeiro)
+_sem_perfil = {} # título da página -> reruns que rodaram sem perfil (outro perfil ativo)
+_lock = threading.Lock()
+
+
+def _secao(funcao):
+    arquivo, _, nome = funcao
+    texto = nome if arquivo == "~" else arquivo.replace("\\", "/")
+    for secao, trechos in SECOES:
+        if any(trecho in texto for trecho in trechos):
+            return secao
+    return SECAO_OUTROS
+
+
+def _secoes_ms(stats, total_ms):
+    # Tempo próprio (tottime) por seção, proporcional ao tempo de parede do rerun
+    por_secao = {}
+    for funcao, (_, _, tempo_proprio, _, _) in stats.items():
+        secao = _secao(funcao)
+        por_secao[secao] = por_secao.get(secao, 0.0) + tempo_proprio
+    soma = sum(por_secao.values()) or 1.0
+    return {secao: total_ms * tempo / soma for secao, tempo in por_secao.items()}
+
+
+def perfilar(titulo, pagina, usuario=None):
+    # Roda a página sob cProfile. StopException/RerunException do Streamlit (st.stop, st.rerun)
+    # passam adiante normalmente; o perfil do que rodou até ali é guardado do mesmo jeito.
+    perfil = cProfile.Profile()
+    inicio = time.perf_counter()
+    try:
+        perfil.enable()
+    except ValueError: # "Another profiling tool is already active" (Python 3.12+)
+        with _lock:
+            _sem_perfil[titulo] = _sem_perfil.get(titulo, 0) + 1
+        return pagina()
+    try:
+        return pagina()
+    finally:
+        perfil.disable()
+        total_ms = (time.perf_counter() - inicio) * 1000
+        stats = pstats.Stats(perfil).stats
+        execucao = {
+            "pagina": titulo,
+            "quando": datetime.now(),
+            "usuario": usuario,
+            "total_ms": total_ms,
+            "secoes_ms": _secoes_ms(stats, total_ms),
+            "stats": marshal.dumps(stats), # Compacto; reaberto só para exibir/exportar
+        }
+        with _lock:
+            _historico.setdefault(titulo, deque(maxlen=HISTORICO_POR_PAGINA)).append(execucao)
+
+
+def historico(titulo):
+    # Execuções da página, da mais recente para a mais antiga
+    with _lock:
+        return list(reversed(_historico.get(titulo, ())))
+
+
+def resumo():
+    # Uma linha por página: reruns guardados, mediana/p95/máximo e média de cada seção
+    with _lock:
+        copia = {titulo: list(execucoes) for titulo, execucoes in _historico.items()}
+        sem_perfil = dict(_sem_perfil)
+    linhas = []
+    for titulo, execucoes in copia.items():
+        tempos = sorted(e["total_ms"] for e in execucoes)
+        linha = {
+            "pagina": titulo,
+            "reruns": len(tempos),
+            "reruns_sem_perfil": sem_perfil.get(titulo, 0),
+            "mediana_ms": statistics.median(tempos),
+            "p95_ms": tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))],
+            "max_ms": tempos[-1],
+        }
+        for secao in [s for s, _ in SECOES] + [SECAO_OUTROS]:
+            linha[f"{secao}_ms"] = sum(e["secoes_ms"].get(secao, 0.0) for e in execucoes) / len(execucoes)
+        linhas.append(linha)
+    return sorted(linhas, key=lambda linha: linha["p95_ms"], reverse=True)
+
+
+def limpar():
+    with _lock:
+        _historico.clear()
+        _sem_perfil.clear()
+
+
+def _stats(execucao):
+    return marshal.loads(execucao["stats"])
+
+
+class _PerfilSalvo:
+    # O pstats.Stats aceita qualquer objeto com create_stats() e .stats (como o cProfile.Profile)
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def texto_top_funcoes(execucao, limite=30, ordem="cumulative"):
+    # Mesmo relatório do 'python -m pstats', para ler direto na página
+    saida = io.StringIO()
+    pstats.Stats(_PerfilSalvo(_stats(execucao)), stream=saida).sort_stats(ordem).print_stats(limite)
+    return saida.getvalue()
+
+
+def exportar_pstats(execucao):
+    # Mesmo formato do Stats.dump_stats: abre com pstats.Stats(arquivo), snakeviz etc.
+    return execucao["stats"]
+
+
+def _amostras(stats):
+    # O cProfile guarda só pares chamador -> chamado, não pilhas completas. Cada função tem seu
+    # tempo próprio dividido entre os chamadores na proporção do tempo acumulado de cada aresta,
+    # subindo até as raízes: as pilhas resultantes são uma aproximação boa para o flame graph.
+    def subir(funcao, segundos, pilha):
+        if segundos < MIN_AMOSTRA_SPEEDSCOPE_S:
+            return
+        pilha = pilha + (funcao,)
+        chamadores = {c: aresta for c, aresta in stats[funcao][4].items() if c not in pilha and c in stats}
+        peso_total = sum(aresta[3] for aresta in chamadores.values())
+        if not chamadores or peso_total <= 0 or len(pilha) >= PROFUNDIDADE_MAXIMA:
+            yield pilha[::-1], segundos
+            return
+        for chamador, aresta in chamadores.items():
+            yield from subir(chamador, segundos * aresta[3] / peso_total, pilha)
+
+    for funcao, (_, _, tempo_proprio, _, _) in stats.items():
+        yield from subir(funcao, tempo_proprio, ())
+
+
+def exportar_speedscope(execucao):
+    # JSON no formato do https://www.speedscope.app (perfil "sampled", pesos em segundos)
+    stats = _stats(execucao)
+    indices = {}
+    frames = []
+    amostras = []
+    pesos = []
+    for pilha, segundos in _amostras(stats):
+        linha_amostra = []
+        for funcao in pilha:
+            if funcao not in indices:
+                arquivo, linha, nome = funcao
+                indices[funcao] = len(frames)
+                frames.append({"name": nome, "file": arquivo, "line": linha} if arquivo != "~" else {"name": nome})
+            linha_amostra.append(indices[funcao])
+        amostras.append(linha_amostra)
+        pesos.append(segundos)
+    nome = f"{execucao['pagina']} {execucao['quando'].strftime('%Y-%m-%d %H:%M:%S')}"
+    documento = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": nome,
+        "exporter": "perfil_paginas",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": nome,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(pesos),
+            "samples": amostras,
+            "weights": pesos,
+        }],
+    }
+    return json.dumps(documento, ensure_ascii=False).encode("utf-8")
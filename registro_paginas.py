@@ -0,0 +1,42 @@
+import importlib
+import sys
+import threading
+import time
+
+# --- Registro das páginas, importadas sob demanda ---
+# O app.py roda a cada interação; importar todas as páginas no topo carregava plotly, pandas e
+# as dependências de cada página antes mesmo da tela de login. Aqui cada página só é importada
+# quando é aberta pela primeira vez no processo (depois fica em sys.modules).
+
+PAGINAS = {
+    "📊 Dashboard Geral": "app_pages.Dashboard",
+    "📝 Gerenciar Ordens de Serviço": "app_pages.Ordens", # Página de cadastro de novas OS
+    "✅ Faturadas": "app_pages.Faturadas",
+    "👤 Clientes": "app_pages.Clientes",
+    "🧑‍💼 Consultores": "app_pages.Consultores",
+    "🔧 Máquinas": "app_pages.Maquinas",
+    "⚙️ Configurações": "app_pages.Config",
+    "🔎 Buscar": "app_pages.Busca",
+    "🩺 Diagnóstico": "app_pages.Diagnostico", # Apenas supervisor
+}
+
+TEMPOS_IMPORTACAO = {} # módulo -> segundos gastos na primeira importação
+_lock = threading.Lock()
+
+
+def carregar_pagina(titulo):
+    # Retorna a função app() da página, importando o módulo só na primeira vez
+    modulo = PAGINAS[titulo]
+    if modulo in sys.modules:
+        return sys.modules[modulo].app
+    with _lock:
+        inicio = time.perf_counter()
+        pagina = importlib.import_module(modulo)
+        if modulo not in TEMPOS_IMPORTACAO:
+            TEMPOS_IMPORTACAO[modulo] = time.perf_counter() - inicio
+    return pagina.app
+
+
+def tempos_importacao():
+    # Lista (módulo, segundos), da importação mais lenta para a mais rápida
+    return sorted(TEMPOS_IMPORTACAO.items(), key=lambda item: item[1], reverse=True)
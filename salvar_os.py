@@ -0,0 +1,118 @@
+import pandas as pd
+from controllers import db_utils
+from controllers import dinheiro
+
+# --- Pipeline de salvamento do editor de OS em aberto ---
+# 1. preparar_alteracoes: compara (vetorizado) a página exibida com a editada, chaveada por id,
+#    e valida datas/valores em bloco, SEM tocar no banco.
+# 2. aplicar_alteracoes: resolve os status distintos e grava tudo com executemany,
+#    dentro da transação do chamador (um job da fila de escrita).
+
+COLUNAS_EDITAVEIS = ['status_descricao', 'data_faturamento', 'data_pagamento_fabrica', 'descricao_servico']
+COLUNAS_SUPERVISOR = ['tipo_os', 'valor_liquido']
+COLUNAS_DATA = ['data_faturamento', 'data_pagamento_fabrica']
+
+# Coluna do editor -> coluna de OrdemDeServico
+COLUNA_DB = {
+    'status_descricao': 'status_id',
+    'data_faturamento': 'data_faturamento',
+    'data_pagamento_fabrica': 'data_pagamento_fabrica',
+    'descricao_servico': 'descricao_servico',
+    'tipo_os': 'tipo_os',
+    'valor_liquido': 'valor_liquido_centavos',
+}
+
+
+def _normalizar(df):
+    # None/NaN viram '' e tudo é comparado como texto sem espaços nas pontas
+    return df.fillna('').astype(str).apply(lambda col: col.str.strip())
+
+
+def _parse_datas(serie):
+    datas = pd.to_datetime(serie, format='%d/%m/%Y', errors='coerce')
+    invalidas = serie.ne('') & datas.isna()
+    return datas.dt.strftime('%Y-%m-%d').astype(object).where(datas.notna(), None), invalidas
+
+
+def _parse_valores(serie):
+    centavos, invalidos = dinheiro.parse_brl(serie)
+    return centavos.astype(object).where(centavos.notna(), None), invalidos
+
+
+def preparar_alteracoes(df_original, df_editado, pode_editar_financeiro):
+    # Retorna (alteracoes, erros). Cada alteração: {'id', 'numero_os', 'campos': {coluna_editor: valor}}
+    colunas = COLUNAS_EDITAVEIS + (COLUNAS_SUPERVISOR if pode_editar_financeiro else [])
+    ids = df_original['id'].astype(int)
+
+    original = _normalizar(df_original[colunas]).set_axis(ids, axis=0)
+    editado = _normalizar(df_editado.loc[df_original.index, colunas]).set_axis(ids, axis=0)
+
+    mudou = original.ne(editado)
+    linhas_alteradas = mudou.any(axis=1)
+    if not linhas_alteradas.any():
+        return [], []
+
+    mudou = mudou[linhas_alteradas]
+    editado = editado[linhas_alteradas]
+    numeros_os = df_original['numero_os'].set_axis(ids, axis=0)[linhas_alteradas]
+
+    # --- Validação em bloco ---
+    erros = []
+    valores = editado.astype(object).where(editado.ne(''), None)
+    for col in COLUNAS_DATA:
+        convertidas, invalidas = _parse_datas(editado[col])
+        valores[col] = convertidas
+        for numero_os in numeros_os[invalidas & mudou[col]]:
+            erros.append(f"Erro no formato da coluna '{col}' para OS {numero_os}. Use DD/MM/YYYY.")
+    if pode_editar_financeiro:
+        convertidos, invalidos = _parse_valores(editado['valor_liquido'])
+        valores['valor_liquido'] = convertidos
+        for numero_os in numeros_os[invalidos & mudou['valor_liquido']]:
+            erros.append(f"Erro no formato do Valor Líquido para OS {numero_os}. Use um formato numérico válido (ex: 123.45 ou 1.234,56).")
+    if erros:
+        return [], erros
+
+    alteracoes = []
+    for os_id, flags in mudou.iterrows(): # Só as linhas alteradas (poucas), não a página inteira
+        alteracoes.append({
+            'id': int(os_id),
+            'numero_os': numeros_os[os_id],
+            'campos': {col: valores.at[os_id, col] for col in colunas if flags[col]},
+            # Status e data de faturamento digitados alimentam a regra de transição para 'Faturada'
+            'status_digitado': valores.at[os_id, 'status_descricao'],
+            'data_faturamento': valores.at[os_id, 'data_faturamento'],
+        })
+    return alteracoes, []
+
+
+def aplicar_alteracoes(conn, alteracoes):
+    # Executa na transação aberta pelo chamador. Retorna os números das OS movidas para 'Faturada'.
+    cursor = conn.cursor()
+
+    # Status distintos resolvidos uma vez por salvamento, não uma vez por linha
+    status_digitados = {a['campos']['status_descricao'] for a in alteracoes if 'status_descricao' in a['campos']}
+    status_ids = {desc: db_utils.get_or_create_status(cursor, desc) for desc in status_digitados}
+    status_faturada_id = None
+
+    grupos = {} # Colunas alteradas -> parâmetros (um executemany por combinação de colunas)
+    faturadas = []
+    for alteracao in alteracoes:
+        campos = {COLUNA_DB[col]: valor for col, valor in alteracao['campos'].items()}
+        if 'status_id' in campos:
+            campos['status_id'] = status_ids[campos['status_id']]
+
+        status_digitado = alteracao['status_digitado']
+        if status_digitado and status_digitado.lower() == 'faturada' and alteracao['data_faturamento'] is not None:
+            if status_faturada_id is None:
+                status_faturada_id = db_utils.get_or_create_status(cursor, "Faturada")
+            campos['status_id'] = status_faturada_id
+            faturadas.append(alteracao['numero_os'])
+
+        colunas = tuple(sorted(campos))
+        grupos.setdefault(colunas, []).append([campos[c] for c in colunas] + [alteracao['id']])
+
+    for colunas, params in grupos.items():
+        set_clauses = ", ".join(f"{coluna} = ?" for coluna in colunas)
+        cursor.executemany(f"UPDATE OrdemDeServico SET {set_clauses} WHERE id = ?", params)
+
+    return faturadas
@@ -0,0 +1,114 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Date, ForeignKey
+
+# --- Tabelas do banco para as consultas em SQLAlchemy Core (ver banco) ---
+# Só descrevem as colunas usadas nas consultas. No SQLite o schema continua sendo criado pelo
+# criar_banco_os.sql + migracoes (índices parciais, triggers, FTS5 e colunas geradas ficam lá).
+
+# As datas são gravadas como texto ISO ('YYYY-MM-DD') no SQLite: continuam chegando como texto,
+# como no sqlite3 puro; num servidor são DATE de verdade
+DataISO = Date().with_variant(String(), "sqlite")
+
+metadata = MetaData()
+
+consultor = Table(
+    "Consultor", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("email", String, nullable=False, unique=True),
+    Column("senha", String, nullable=False),
+    Column("permissao", String, nullable=False),
+)
+
+cliente = Table(
+    "Cliente", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("cpf", String, unique=True), # 'TEMP_CPF_...' quando o cliente não tem CPF
+    Column("telefone", String),
+)
+
+tipo_maquina = Table(
+    "TipoMaquina", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("descricao", String, nullable=False, unique=True),
+)
+
+modelo = Table(
+    "Modelo", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("nome_modelo", String, nullable=False, unique=True),
+    Column("chassi", String),
+    Column("tipo_maquina_id", Integer, ForeignKey("TipoMaquina.id")),
+)
+
+# Uma máquina por chassi (migração 12); o chassi de Modelo ficou só como dado legado do cadastro
+maquina = Table(
+    "Maquina", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("chassi", String, nullable=False, unique=True),
+    Column("modelo_id", Integer, ForeignKey("Modelo.id"), nullable=False),
+)
+
+status = Table(
+    "Status", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("descricao", String, nullable=False, unique=True),
+)
+
+ordem_servico = Table(
+    "OrdemDeServico", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("numero_os", String, nullable=False, unique=True),
+    Column("tipo_os", String, nullable=False),
+    Column("cliente_id", Integer, ForeignKey("Cliente.id"), nullable=False),
+    Column("modelo_id", Integer, ForeignKey("Modelo.id"), nullable=False),
+    Column("consultor_id", Integer, ForeignKey("Consultor.id"), nullable=False),
+    Column("status_id", Integer, ForeignKey("Status.id"), nullable=False),
+    Column("descricao_servico", String),
+    Column("data_abertura", DataISO),
+    Column("data_faturamento", DataISO),
+    Column("data_pagamento_fabrica", DataISO),
+    Column("valor_liquido_centavos", Integer), # Migração 8
+    Column("maquina_id", Integer, ForeignKey("Maquina.id")), # Migração 12; nulo nas OS antigas sem chassi conhecido
+    # Colunas geradas a partir de data_faturamento (migração 7), indexadas para os filtros de período
+    Column("ano_faturamento", Integer),
+    Column("mes_faturamento", Integer),
+)
+
+
+def _colunas_faturadas():
+    # Colunas de OrdemDeServico lidas pelos relatórios de faturadas, sem as chaves estrangeiras
+    return [Column(coluna.name, coluna.type, primary_key=coluna.primary_key) for coluna in ordem_servico.columns]
+
+
+# OS faturadas movidas para o banco de arquivo, anexado como 'arquivo' (ver arquivo_os)
+ordem_servico_arquivo = Table("OrdemDeServico", metadata, *_colunas_faturadas(), schema="arquivo")
+
+# View TEMP das conexões com o arquivo anexado: faturadas do banco principal UNION ALL as do arquivo
+os_faturadas_todas = Table("os_faturadas_todas", metadata, *_colunas_faturadas())
+
+# Mantida por triggers (migração 6): OS em aberto por (consultor, status)
+resumo_os_aberto = Table(
+    "resumo_os_aberto", metadata,
+    Column("consultor_id", Integer, primary_key=True),
+    Column("status_id", Integer, primary_key=True),
+    Column("total_ordens", Integer, nullable=False),
+    Column("valor_total_centavos", Integer, nullable=False),
+)
+
+# Mantida por triggers (migração 12): a OS mais recente de cada máquina
+maquina_ultima_os = Table(
+    "maquina_ultima_os", metadata,
+    Column("maquina_id", Integer, primary_key=True),
+    Column("os_id", Integer, nullable=False),
+    Column("cliente_id", Integer, nullable=False),
+    Column("data_abertura", DataISO),
+    Column("data_faturamento", DataISO),
+)
+
+# Mantida por triggers (migrações 4 e 9): revisão por tabela, para os caches
+tabela_revisao = Table(
+    "tabela_revisao", metadata,
+    Column("tabela", String, primary_key=True),
+    Column("revisao", Integer, nullable=False),
+)
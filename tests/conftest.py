@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+import pytest
+
+# --- Banco de teste ---
+# Cada teste roda numa cópia de um banco sintético pequeno (gerar_dados, já com todas as migrações),
+# apontada pelo OS_DB_PATH. O db_pool lê a variável na importação; depois os testes trocam de
+# banco com db_pool.usar_banco, como o benchmark.
+os.environ["OS_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="os_testes_"), "db.sqlite3")
+os.environ.pop("OS_DATABASE_URL", None) # Sempre SQLite
+os.environ.pop("OS_ARQUIVO_PATH", None) # Arquivo ao lado de cada banco de teste
+
+from controllers import db_pool
+from controllers import cache_consultas
+from controllers import cache_dimensoes
+import gerar_dados
+
+TOTAL_ORDENS = 400
+HOJE = date(2026, 1, 15) # Data fixa: o mesmo banco em qualquer dia
+
+
+@pytest.fixture(scope="session")
+def banco_modelo(tmp_path_factory):
+    caminho = str(tmp_path_factory.mktemp("modelo") / "db.sqlite3")
+    gerar_dados.gerar_banco(caminho, TOTAL_ORDENS, semente=7, hoje=HOJE)
+    return caminho
+
+
+@pytest.fixture
+def banco_teste(banco_modelo, tmp_path):
+    # Cópia só deste teste; os caches são globais do processo e não podem atravessar bancos
+    caminho = str(tmp_path / "db.sqlite3")
+    shutil.copy(banco_modelo, caminho)
+    db_pool.usar_banco(caminho)
+    cache_consultas.invalidar_tudo()
+    cache_dimensoes.invalidar_tudo()
+    yield caminho
+    db_pool.usar_banco(os.environ["OS_DB_PATH"]) # Fecha as conexões e a fila de escrita deste banco
+
+
+def escalar(sql, parametros=()):
+    conn = db_pool.conectar()
+    try:
+        return conn.execute(sql, parametros).fetchone()[0]
+    finally:
+        conn.close()
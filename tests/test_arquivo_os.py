@@ -0,0 +1,80 @@
+from controllers import arquivo_os
+from controllers import busca_fts
+from controllers import db_pool
+from conftest import escalar
+
+DATA_CORTE = "2025-07-01"
+
+
+def _buscar(termo):
+    conn = db_pool.conectar()
+    try:
+        return busca_fts.contar_resultados(conn, termo), busca_fts.buscar_os(conn, termo)
+    finally:
+        conn.close()
+
+
+def test_arquivar_move_as_faturadas_antigas(banco_teste):
+    antigas = escalar("SELECT count(*) FROM OrdemDeServico WHERE data_faturamento < ?", (DATA_CORTE,))
+    total = escalar("SELECT count(*) FROM OrdemDeServico")
+    assert antigas > 0
+
+    assert arquivo_os.arquivar(DATA_CORTE, tamanho_lote=50) == antigas
+    assert escalar("SELECT count(*) FROM main.OrdemDeServico") == total - antigas
+    assert escalar(f"SELECT count(*) FROM {arquivo_os.ALIAS}.OrdemDeServico") == antigas
+    assert escalar("SELECT count(*) FROM os_faturadas_todas WHERE data_faturamento < ?", (DATA_CORTE,)) == antigas
+    assert arquivo_os.arquivar(DATA_CORTE) == 0 # Nada mais a mover
+
+
+def test_arquivadas_continuam_na_busca(banco_teste):
+    numero_os = escalar("SELECT numero_os FROM OrdemDeServico WHERE data_faturamento < ? LIMIT 1", (DATA_CORTE,))
+    arquivo_os.arquivar(DATA_CORTE)
+    assert escalar("SELECT count(*) FROM busca_os") == escalar("SELECT count(*) FROM main.OrdemDeServico") + \
+        escalar(f"SELECT count(*) FROM {arquivo_os.ALIAS}.OrdemDeServico")
+
+    total, df = _buscar(numero_os)
+    assert total == 1
+    assert df[["numero_os", "situacao"]].values.tolist() == [[numero_os, "Arquivada"]]
+
+
+def test_busca_acompanha_cliente_de_os_arquivada(banco_teste):
+    os_id = escalar("SELECT id FROM OrdemDeServico WHERE data_faturamento < ? LIMIT 1", (DATA_CORTE,))
+    cliente_id = escalar("SELECT cliente_id FROM OrdemDeServico WHERE id = ?", (os_id,))
+    arquivo_os.arquivar(DATA_CORTE)
+    db_pool.escrever(lambda conn: conn.execute("UPDATE Cliente SET nome = 'ZEFERINO ARQUIVADO' WHERE id = ?", (cliente_id,)))
+
+    total, df = _buscar("zeferino arquivado")
+    assert total == escalar(f"""SELECT (SELECT count(*) FROM main.OrdemDeServico WHERE cliente_id = ?)
+                                     + (SELECT count(*) FROM {arquivo_os.ALIAS}.OrdemDeServico WHERE cliente_id = ?)""",
+                            (cliente_id, cliente_id))
+    assert "Arquivada" in set(df["situacao"])
+    assert escalar("SELECT count(*) FROM busca_os WHERE rowid = ? AND cliente_nome = 'ZEFERINO ARQUIVADO'", (os_id,)) == 1
+
+
+def test_os_arquivada_continua_como_ultima_da_maquina(banco_teste):
+    # Máquina com uma OS antiga ainda em aberto (cliente 1) e uma mais nova, faturada antes do corte (cliente 2)
+    def criar(conn):
+        maquina_id = conn.execute("INSERT INTO Maquina (chassi, modelo_id) VALUES ('CH-ARQ-1', 1)").lastrowid
+        for numero_os, cliente_id, abertura, faturamento in [("ARQ-1", 1, "2025-01-10", None),
+                                                             ("ARQ-2", 2, "2025-03-01", "2025-03-20")]:
+            conn.execute("""
+                INSERT INTO OrdemDeServico (numero_os, tipo_os, cliente_id, modelo_id, consultor_id, status_id,
+                                            data_abertura, data_faturamento, valor_liquido_centavos, maquina_id)
+                VALUES (?, 'Cliente', ?, 1, 1, 1, ?, ?, 1000, ?)
+            """, (numero_os, cliente_id, abertura, faturamento, maquina_id))
+        return maquina_id
+    maquina_id = db_pool.escrever(criar)
+    arquivada = escalar("SELECT id FROM OrdemDeServico WHERE numero_os = 'ARQ-2'")
+
+    def ultima():
+        return escalar("SELECT os_id || ':' || cliente_id FROM maquina_ultima_os WHERE maquina_id = ?", (maquina_id,))
+
+    assert ultima() == f"{arquivada}:2"
+    arquivo_os.arquivar(DATA_CORTE)
+    assert escalar("SELECT count(*) FROM main.OrdemDeServico WHERE id = ?", (arquivada,)) == 0
+    assert ultima() == f"{arquivada}:2"
+
+    # Faturar a OS antiga, que ficou no banco principal, não faz o cliente atual voltar para o 1
+    db_pool.escrever(lambda conn: conn.execute(
+        "UPDATE OrdemDeServico SET data_faturamento = '2026-01-10' WHERE numero_os = 'ARQ-1'"))
+    assert ultima() == f"{arquivada}:2"
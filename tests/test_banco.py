@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+from sqlalchemy import select, literal, null
+from controllers import banco
+
+
+def _valor(expressao):
+    return banco.escalar(select(expressao))
+
+
+def test_data_br(banco_teste):
+    assert _valor(banco.data_br(literal("2026-01-05"))) == "05/01/2026"
+    assert _valor(banco.data_br(null())) == ""
+
+
+def test_valor_br(banco_teste):
+    assert _valor(banco.valor_br(literal(123456))) == "1234,56"
+    assert _valor(banco.valor_br(literal(7))) == "0,07"
+    assert _valor(banco.valor_br(literal(-1505))) == "-15,05"
+    assert _valor(banco.valor_br(null())) == ""
+
+
+def test_ano_mes(banco_teste):
+    assert _valor(banco.ano_mes(literal(2026), literal(3))) == "2026-03"
+
+
+def test_agora_mais(banco_teste):
+    # Mesmo formato das datas gravadas: compara como texto com data_abertura
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    menos_30 = datetime.fromisoformat(_valor(banco.agora_mais("-30 days")))
+    assert abs((agora - menos_30).days - 30) <= 1
+    assert _valor(banco.agora_mais("-30 days") < "2999-01-01") == 1
+
+
+def test_compilacao_sqlite():
+    sql, _ = banco.compilar(select(banco.data_br(literal("2026-01-05"))))
+    assert "strftime('%d/%m/%Y'" in sql
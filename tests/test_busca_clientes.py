@@ -0,0 +1,9 @@
+from controllers import busca_clientes
+
+
+def test_nome_novo_cliente_exige_letras():
+    assert busca_clientes.nome_novo_cliente("  Maria Souza ") == "Maria Souza"
+    assert busca_clientes.nome_novo_cliente("Fazenda 3 Irmãos") == "Fazenda 3 Irmãos"
+    for termo in ["123.456.789-00", "(69) 99999-0000", "12345678900", "   ", None]:
+        assert busca_clientes.nome_novo_cliente(termo) is None
+
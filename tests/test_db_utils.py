@@ -0,0 +1,55 @@
+import sqlite3
+from controllers import db_pool
+from controllers import db_utils
+from conftest import escalar
+
+
+def _com_cursor(funcao, *args):
+    return db_pool.escrever(lambda conn: funcao(conn.cursor(), *args))
+
+
+def test_insert_devolve_id_por_returning(banco_teste):
+    maquina_id = _com_cursor(db_utils.get_or_create_maquina, " ch-novo-1 ", 1)
+    assert escalar("SELECT id FROM Maquina WHERE chassi = 'CH-NOVO-1'") == maquina_id
+    assert _com_cursor(db_utils.get_or_create_maquina, "CH-NOVO-1", 2) == maquina_id # Mantém o modelo
+    assert escalar("SELECT modelo_id FROM Maquina WHERE id = ?", (maquina_id,)) == 1
+
+
+def test_cliente_por_cpf_e_sem_cpf(banco_teste):
+    com_cpf = _com_cursor(db_utils.get_or_create_cliente, "Ana Lima", "98765432100", None)
+    assert _com_cursor(db_utils.get_or_create_cliente, "Ana Lima Souza", "98765432100", "(69) 3333-0000") == com_cpf
+    assert escalar("SELECT nome FROM Cliente WHERE id = ?", (com_cpf,)) == "Ana Lima Souza"
+
+    sem_cpf = _com_cursor(db_utils.get_or_create_cliente, "Beto Ramos", None, None)
+    assert escalar("SELECT cpf FROM Cliente WHERE id = ?", (sem_cpf,)).startswith("TEMP_CPF_BETO_RAMOS_")
+    assert _com_cursor(db_utils.get_or_create_cliente, "Beto Ramos", "", None) == sem_cpf
+
+
+def test_dimensoes_criadas_uma_vez(banco_teste):
+    status_id = _com_cursor(db_utils.get_or_create_status, "AGUARDANDO PECA")
+    assert _com_cursor(db_utils.get_or_create_status, "AGUARDANDO PECA") == status_id
+    tipo_id = _com_cursor(db_utils.get_or_create_tipo_maquina, "Pulverizador")
+    modelo_id = _com_cursor(db_utils.get_or_create_modelo, "PV 3000", "CH-PV", tipo_id)
+    assert _com_cursor(db_utils.get_or_create_modelo, "PV 3000", "OUTRO", tipo_id) == modelo_id
+    assert escalar("SELECT count(*) FROM Modelo WHERE nome_modelo = 'PV 3000'") == 1
+
+
+def test_delete_record_respeita_chave_estrangeira(banco_teste):
+    cliente_id = escalar("SELECT cliente_id FROM OrdemDeServico LIMIT 1")
+    assert isinstance(db_utils.delete_record("Cliente", cliente_id), sqlite3.IntegrityError)
+    os_id = escalar("SELECT id FROM OrdemDeServico WHERE data_faturamento IS NULL LIMIT 1")
+    assert db_utils.delete_record("OrdemDeServico", os_id) is None
+    assert escalar("SELECT count(*) FROM OrdemDeServico WHERE id = ?", (os_id,)) == 0
+
+
+def test_excluir_registros_num_commit_com_erro_por_id(banco_teste):
+    com_os = escalar("SELECT cliente_id FROM OrdemDeServico LIMIT 1")
+    sem_os = [_com_cursor(db_utils.get_or_create_cliente, nome, None, None) for nome in ["Caio Prado", "Dora Lins"]]
+    concluidos = db_pool.get_pool().fila.jobs_concluidos
+
+    erros = db_utils.excluir_registros("Cliente", [sem_os[0], com_os, sem_os[1]])
+    assert db_pool.get_pool().fila.jobs_concluidos == concluidos + 1
+    assert erros[sem_os[0]] is None and erros[sem_os[1]] is None
+    assert isinstance(erros[com_os], sqlite3.IntegrityError)
+    # A falha do cliente com OS não desfaz as outras exclusões
+    assert escalar(f"SELECT count(*) FROM Cliente WHERE id IN ({com_os}, {sem_os[0]}, {sem_os[1]})") == 1
@@ -0,0 +1,35 @@
+import pytest
+from controllers import dinheiro
+
+
+@pytest.mark.parametrize("texto, centavos", [
+    ("R$ 1.234,56", 123456),
+    ("1234,5", 123450),
+    ("12.345,6", 1234560),
+    ("-15,05", -1505),
+    ("0,01", 1),
+    ("123.45", 12345),
+    ("99.9", 9990),
+    ("1.234", 123400),
+    ("1.234.567", 123456700),
+    ("1234", 123400),
+])
+def test_formatos_aceitos(texto, centavos):
+    assert dinheiro.parse_brl_valor(texto) == centavos
+
+
+@pytest.mark.parametrize("texto", ["1,234.56", "1.2.3", "0,005", "12,3456", "1.2345", "12.34.567", "abc", "1,2,3"])
+def test_formatos_ambiguos_sao_invalidos(texto):
+    with pytest.raises(ValueError):
+        dinheiro.parse_brl_valor(texto)
+
+
+def test_vazios_nao_sao_invalidos():
+    centavos, invalidos = dinheiro.parse_brl(["", None, "  ", "1,2,3"])
+    assert centavos.isna().all()
+    assert invalidos.tolist() == [False, False, False, True]
+
+
+def test_formatar_brl():
+    assert dinheiro.formatar_brl([123456, -1505, None]).tolist() == ["R$ 1.234,56", "-R$ 15,05", ""]
+    assert dinheiro.formatar_brl_valor(7, prefixo="") == "0,07"
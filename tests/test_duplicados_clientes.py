@@ -0,0 +1,70 @@
+import pandas as pd
+from controllers import db_pool
+from controllers import duplicados_clientes
+from conftest import escalar
+
+
+def _inserir_cliente(nome, cpf, telefone=None):
+    return db_pool.escrever(lambda conn: conn.execute(
+        "INSERT INTO Cliente (nome, cpf, telefone) VALUES (?, ?, ?)", (nome, cpf, telefone)).lastrowid)
+
+
+def _pares(*pares):
+    return pd.DataFrame([{"id_a": a, "cpf_a": cpf_a, "os_a": 0, "id_b": b, "cpf_b": cpf_b, "os_b": 0}
+                         for a, cpf_a, b, cpf_b in pares])
+
+
+def test_agrupar_junta_pares_encadeados():
+    grupos, recusados = duplicados_clientes.agrupar(_pares((1, "11111111111", 2, None), (2, None, 3, None)))
+    assert grupos == [(1, [2, 3])]
+    assert recusados == []
+
+
+def test_agrupar_recusa_cadeia_com_cpfs_reais_diferentes():
+    # A (CPF real) ~ B (sem CPF) ~ C (outro CPF real): A e C nunca podem cair no mesmo grupo
+    grupos, recusados = duplicados_clientes.agrupar(_pares(
+        (1, "11111111111", 2, "TEMP_CPF_X"), (2, "TEMP_CPF_X", 3, "22222222222")))
+    assert grupos == [(1, [2])]
+    assert recusados == [(2, 3)]
+
+
+def test_mesclar_recusa_grupo_com_cpfs_reais_diferentes(banco_teste):
+    a = _inserir_cliente("JOSE ANTONIO PEREIRA", "11111111111")
+    c = _inserir_cliente("JOSE ANTONIO PERERA", "22222222222")
+    [(_, _, movidas, erro)] = duplicados_clientes.mesclar([(a, [c])])
+    assert erro is not None and movidas == 0
+    assert escalar("SELECT count(*) FROM Cliente WHERE id IN (?, ?)", (a, c)) == 2
+
+
+def test_pares_sugeridos_nao_apagam_cpf(banco_teste):
+    # O caso real: os dois pares aparecem na lista, o usuário marca os dois e manda mesclar
+    a = _inserir_cliente("JOSE ANTONIO PEREIRA", "11111111111")
+    b = _inserir_cliente("JOSE ANTONIO PEREIRA", "TEMP_CPF_JOSE_ANTONIO_PEREIRA_20260101000000000000")
+    c = _inserir_cliente("JOSE ANTONIO PERERA", "22222222222")
+    duplicados_clientes.atualizar_chaves()
+    df, _ = duplicados_clientes.candidatos()
+    ids = {a, b, c}
+    escolhidos = df[df["id_a"].isin(ids) & df["id_b"].isin(ids)]
+    assert len(escolhidos) == 2 # A~B e B~C; A~C não (CPFs diferentes)
+
+    grupos, recusados = duplicados_clientes.agrupar(escolhidos)
+    assert grupos == [(a, [b])]
+    assert len(recusados) == 1
+    resultados = duplicados_clientes.mesclar(grupos)
+    assert [erro for *_, erro in resultados] == [None]
+    assert escalar("SELECT count(*) FROM Cliente WHERE cpf IN ('11111111111', '22222222222')") == 2
+    assert escalar("SELECT count(*) FROM Cliente WHERE id = ?", (b,)) == 0
+
+
+def test_mesclar_move_os_e_herda_cpf(banco_teste):
+    mantido = _inserir_cliente("MARIA DAS DORES", "TEMP_CPF_MARIA_DAS_DORES_1")
+    removido = _inserir_cliente("MARIA DAS DORES", "33333333333", "(69) 99999-0000")
+    total_os = escalar("SELECT count(*) FROM OrdemDeServico WHERE cliente_id = 1")
+    db_pool.escrever(lambda conn: conn.execute("UPDATE OrdemDeServico SET cliente_id = ? WHERE cliente_id = 1", (removido,)))
+
+    [(_, _, movidas, erro)] = duplicados_clientes.mesclar([(mantido, [removido])])
+    assert erro is None and movidas == total_os > 0
+    assert escalar("SELECT cpf FROM Cliente WHERE id = ?", (mantido,)) == "33333333333"
+    assert escalar("SELECT telefone FROM Cliente WHERE id = ?", (mantido,)) == "(69) 99999-0000"
+    assert escalar("SELECT count(*) FROM OrdemDeServico WHERE cliente_id = ?", (mantido,)) == total_os
+    assert escalar("SELECT count(*) FROM Cliente WHERE id = ?", (removido,)) == 0
@@ -0,0 +1,54 @@
+import io
+from controllers import importar_os
+from conftest import escalar
+
+CABECALHO = "numero_os;cliente;cpf;consultor;modelo;chassi;status;data_abertura;valor_liquido\n"
+
+
+def _importar(linhas, tamanho_lote=importar_os.TAMANHO_LOTE):
+    arquivo = io.BytesIO((CABECALHO + "".join(linha + "\n" for linha in linhas)).encode("utf-8"))
+    return importar_os.importar_os(arquivo, "os.csv", tamanho_lote=tamanho_lote)
+
+
+def test_clientes_sem_cpf_com_mesmo_nome_normalizado(banco_teste):
+    # "Maria Souza" e "MARIA SOUZA" viravam o mesmo TEMP_CPF_ e o lote inteiro caía no UNIQUE
+    resumo, erros = _importar([
+        "IMP-1;Maria Souza;;Nadylla;MOD TESTE;CH-1;SUBMETIDA;01/02/2026;100,00",
+        "IMP-2;MARIA SOUZA;;Nadylla;MOD TESTE;CH-2;SUBMETIDA;02/02/2026;200,00",
+    ])
+    assert erros == []
+    assert resumo == {"lidas": 2, "inseridas": 2, "com_erro": 0}
+    assert escalar("SELECT count(DISTINCT cpf) FROM Cliente WHERE upper(nome) = 'MARIA SOUZA'") == 2
+
+
+def test_cliente_sem_cpf_reaproveitado_pelo_nome(banco_teste):
+    _importar(["IMP-1;Joana Lima;;Nadylla;MOD TESTE;CH-1;SUBMETIDA;01/02/2026;"])
+    _importar(["IMP-2;Joana Lima;;Nadylla;MOD TESTE;CH-2;SUBMETIDA;02/02/2026;"])
+    assert escalar("SELECT count(*) FROM Cliente WHERE nome = 'Joana Lima'") == 1
+    assert escalar("""SELECT count(DISTINCT cliente_id) FROM OrdemDeServico
+                      WHERE numero_os IN ('IMP-1', 'IMP-2')""") == 1
+
+
+def test_erros_por_linha_nao_derrubam_o_lote(banco_teste):
+    existente = escalar("SELECT numero_os FROM OrdemDeServico LIMIT 1")
+    resumo, erros = _importar([
+        "IMP-1;Cliente Um;11122233344;Nadylla;MOD TESTE;CH-1;SUBMETIDA;01/02/2026;1.234,56",
+        f"{existente};Cliente Dois;;Nadylla;MOD TESTE;CH-2;SUBMETIDA;01/02/2026;",
+        "IMP-3;Cliente Tres;;Ninguem;MOD TESTE;CH-3;SUBMETIDA;01/02/2026;",
+        "IMP-4;Cliente Quatro;;Nadylla;MOD TESTE;CH-4;SUBMETIDA;31/02/2026;",
+        "IMP-5;;;Nadylla;MOD TESTE;CH-5;SUBMETIDA;01/02/2026;",
+    ])
+    assert resumo == {"lidas": 5, "inseridas": 1, "com_erro": 4}
+    assert [erro["numero_os"] for erro in erros] == [existente, "IMP-3", "IMP-4", "IMP-5"]
+    assert escalar("SELECT valor_liquido_centavos FROM OrdemDeServico WHERE numero_os = 'IMP-1'") == 123456
+
+
+def test_maquina_pelo_chassi_normalizado(banco_teste):
+    _importar([
+        "IMP-1;Cliente Um;;Nadylla;MOD TESTE;  ch-77 ;SUBMETIDA;01/02/2026;",
+        "IMP-2;Cliente Um;;Nadylla;MOD TESTE;CH-77;SUBMETIDA;05/02/2026;",
+    ], tamanho_lote=1)
+    assert escalar("SELECT count(*) FROM Maquina WHERE chassi = 'CH-77'") == 1
+    assert escalar("""SELECT o.numero_os FROM maquina_ultima_os u
+                      JOIN Maquina m ON m.id = u.maquina_id JOIN OrdemDeServico o ON o.id = u.os_id
+                      WHERE m.chassi = 'CH-77'""") == "IMP-2"
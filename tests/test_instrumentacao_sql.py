@@ -0,0 +1,45 @@
+import pytest
+from controllers import db_pool
+from controllers import instrumentacao_sql
+
+
+@pytest.fixture
+def tudo_lento(banco_teste, monkeypatch):
+    # Limiar zero: todo statement vai para o log de lentas, com o plano
+    monkeypatch.setattr(instrumentacao_sql, "LIMIAR_LENTA_MS", 0)
+    instrumentacao_sql.zerar()
+    conn = db_pool.conectar()
+    yield conn
+    conn.rollback()
+    conn.close()
+    instrumentacao_sql.zerar()
+
+
+def _plano_do_ultimo():
+    return instrumentacao_sql.consultas_lentas()[0]["plano"]
+
+
+def test_plano_de_execute_com_parametros(tudo_lento):
+    tudo_lento.execute("SELECT numero_os FROM OrdemDeServico WHERE id = ?", (1,)).fetchall()
+    assert "USING INTEGER PRIMARY KEY" in _plano_do_ultimo()
+
+
+def test_plano_de_executemany_com_lista(tudo_lento):
+    tudo_lento.executemany("UPDATE OrdemDeServico SET descricao_servico = ? WHERE id = ?", [("A", 1), ("B", 2)])
+    plano = _plano_do_ultimo()
+    assert not plano.startswith("(plano indisponível")
+    assert "USING INTEGER PRIMARY KEY" in plano
+
+
+def test_plano_de_executemany_com_iterador(tudo_lento):
+    # O iterador é consumido pela execução: o plano sai com NULL em cada parâmetro
+    tudo_lento.executemany("UPDATE OrdemDeServico SET descricao_servico = ? WHERE id = ?",
+                           ((texto, id_) for texto, id_ in [("A", 1), ("B", 2)]))
+    assert "USING INTEGER PRIMARY KEY" in _plano_do_ultimo()
+    tudo_lento.executemany("UPDATE Cliente SET telefone = :telefone WHERE id = :id", iter([{"telefone": None, "id": 1}]))
+    assert "USING INTEGER PRIMARY KEY" in _plano_do_ultimo()
+
+
+def test_parametros_nulos():
+    assert instrumentacao_sql._parametros_nulos("SELECT '?', x FROM t WHERE a = ? AND b IN (?, ?) -- ?") == (None,) * 3
+    assert instrumentacao_sql._parametros_nulos("UPDATE t SET a = :a WHERE id = :id AND h = '12:30'") == {"a": None, "id": None}
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+from controllers import db_pool
+from controllers import migracoes
+import gerar_dados
+from conftest import escalar
+
+
+def test_banco_novo_recebe_todas_as_migracoes(tmp_path):
+    caminho = str(tmp_path / "db.sqlite3")
+    conn = sqlite3.connect(caminho)
+    with open(gerar_dados.SCHEMA_SQL, encoding="utf-8") as arquivo:
+        conn.executescript(arquivo.read())
+    conn.close()
+
+    db_pool.usar_banco(caminho)
+    try:
+        versoes = [versao for versao, _, _ in migracoes.MIGRACOES]
+        assert migracoes.garantir_schema() == sorted(versoes)
+        assert migracoes.garantir_schema() == [] # Idempotente
+        assert escalar("SELECT MAX(versao) FROM schema_version") == max(versoes)
+        conn = db_pool.conectar()
+        colunas = {linha[1] for linha in conn.execute("PRAGMA table_xinfo(OrdemDeServico)")}
+        conn.close()
+        assert {"valor_liquido_centavos", "maquina_id", "ano_faturamento", "mes_faturamento"} <= colunas
+        assert "valor_liquido" not in colunas
+    finally:
+        db_pool.usar_banco(os.environ["OS_DB_PATH"]) # Fecha as conexões deste banco
+
+
+def _esquema(conn):
+    return {(nome, " ".join((sql or "").split())) for nome, sql in conn.execute("SELECT name, sql FROM sqlite_master")}
+
+
+def test_banco_parado_numa_versao_antiga_termina_igual_a_um_novo(tmp_path):
+    # As migrações não dependem do código atual dos módulos: a 5 ainda indexa o chassi de Modelo
+    conexoes = []
+    for nome in ["antigo", "novo"]:
+        conn = sqlite3.connect(str(tmp_path / f"{nome}.sqlite3"), isolation_level=None)
+        with open(gerar_dados.SCHEMA_SQL, encoding="utf-8") as arquivo:
+            conn.executescript(arquivo.read())
+        conexoes.append(conn)
+    antigo, novo = conexoes
+
+    migracoes.aplicar_migracoes(antigo, [m for m in migracoes.MIGRACOES if m[0] <= 5])
+    trigger = antigo.execute("SELECT sql FROM sqlite_master WHERE name = 'trg_busca_os_modelo_update'").fetchone()[0]
+    assert "nome_modelo, chassi ON Modelo" in trigger and "m.chassi" in trigger
+
+    migracoes.aplicar_migracoes(antigo)
+    migracoes.aplicar_migracoes(novo)
+    assert _esquema(antigo) == _esquema(novo)
+    for conn in conexoes:
+        conn.close()
+
+
+def test_dados_derivados_batem_com_as_os(banco_teste):
+    # Tabelas mantidas por triggers (ou carregadas pelas migrações) contra a contagem direta
+    assert escalar("SELECT count(*) FROM busca_os") == escalar("SELECT count(*) FROM OrdemDeServico")
+    assert escalar("SELECT COALESCE(SUM(total_ordens), 0) FROM resumo_os_aberto") == \
+        escalar("SELECT count(*) FROM OrdemDeServico WHERE data_faturamento IS NULL")
+    assert escalar("SELECT COALESCE(SUM(valor_total_centavos), 0) FROM resumo_os_aberto") == \
+        escalar("SELECT COALESCE(SUM(valor_liquido_centavos), 0) FROM OrdemDeServico WHERE data_faturamento IS NULL")
+    assert escalar("SELECT count(*) FROM maquina_ultima_os") == \
+        escalar("SELECT count(DISTINCT maquina_id) FROM OrdemDeServico WHERE maquina_id IS NOT NULL")
+    assert escalar("""SELECT count(*) FROM maquina_ultima_os u WHERE os_id <> (
+                          SELECT id FROM OrdemDeServico WHERE maquina_id = u.maquina_id
+                          ORDER BY data_abertura DESC, id DESC LIMIT 1)""") == 0
+
+
+def test_resumo_acompanha_insercao_e_faturamento(banco_teste):
+    abertas = escalar("SELECT COALESCE(SUM(total_ordens), 0) FROM resumo_os_aberto")
+    os_id = db_pool.escrever(lambda conn: conn.execute("""
+        INSERT INTO OrdemDeServico (numero_os, tipo_os, cliente_id, modelo_id, consultor_id, status_id,
+                                    data_abertura, valor_liquido_centavos)
+        VALUES ('MIG-1', 'Cliente', 1, 1, 1, 1, '2026-01-10', 1050)
+    """).lastrowid)
+    assert escalar("SELECT SUM(total_ordens) FROM resumo_os_aberto") == abertas + 1
+    db_pool.escrever(lambda conn: conn.execute(
+        "UPDATE OrdemDeServico SET data_faturamento = '2026-01-12' WHERE id = ?", (os_id,)))
+    assert escalar("SELECT SUM(total_ordens) FROM resumo_os_aberto") == abertas
@@ -0,0 +1,62 @@
+from controllers import banco
+from controllers import consultas_os
+from controllers import db_pool
+from controllers import salvar_os
+from conftest import escalar
+
+
+def _pagina():
+    with banco.conectar() as conexao:
+        df, _ = consultas_os.query_os_aberto_pagina(conexao, 10)
+    return df
+
+
+def _salvar(df, editado, pode_editar_financeiro=True):
+    alteracoes, erros = salvar_os.preparar_alteracoes(df, editado, pode_editar_financeiro)
+    assert erros == []
+    return alteracoes, db_pool.escrever(lambda conn: salvar_os.aplicar_alteracoes(conn, alteracoes))
+
+
+def test_sem_alteracoes(banco_teste):
+    df = _pagina()
+    assert salvar_os.preparar_alteracoes(df, df.copy(), True) == ([], [])
+
+
+def test_grava_so_as_celulas_alteradas(banco_teste):
+    df = _pagina()
+    editado = df.copy()
+    editado.loc[0, "descricao_servico"] = "TROCA DO FILTRO"
+    editado.loc[1, "valor_liquido"] = "1.234,56"
+    alteracoes, faturadas = _salvar(df, editado)
+
+    assert [a["campos"] for a in alteracoes] == [{"descricao_servico": "TROCA DO FILTRO"},
+                                                 {"valor_liquido": 123456}]
+    assert faturadas == []
+    assert escalar("SELECT descricao_servico FROM OrdemDeServico WHERE id = ?", (int(df.loc[0, "id"]),)) == "TROCA DO FILTRO"
+    assert escalar("SELECT valor_liquido_centavos FROM OrdemDeServico WHERE id = ?", (int(df.loc[1, "id"]),)) == 123456
+
+
+def test_status_faturada_com_data_move_para_faturadas(banco_teste):
+    df = _pagina()
+    editado = df.copy()
+    editado.loc[0, "status_descricao"] = "Faturada"
+    editado.loc[0, "data_faturamento"] = "10/01/2026"
+    _, faturadas = _salvar(df, editado)
+
+    assert faturadas == [df.loc[0, "numero_os"]]
+    assert escalar("""SELECT s.descricao || ' ' || o.data_faturamento FROM OrdemDeServico o
+                      JOIN Status s ON s.id = o.status_id WHERE o.id = ?""", (int(df.loc[0, "id"]),)) == "Faturada 2026-01-10"
+
+
+def test_erros_de_formato_e_permissao(banco_teste):
+    df = _pagina()
+    editado = df.copy()
+    editado.loc[0, "data_faturamento"] = "2026-01-10"
+    editado.loc[1, "valor_liquido"] = "doze reais"
+    alteracoes, erros = salvar_os.preparar_alteracoes(df, editado, True)
+    assert alteracoes == [] and len(erros) == 2
+
+    # Consultor: o valor não entra na comparação
+    editado = df.copy()
+    editado.loc[1, "valor_liquido"] = "999,00"
+    assert salvar_os.preparar_alteracoes(df, editado, False) == ([], [])